@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+'''
+-*- coding: utf-8 -*-
+title           : bench_parser.py
+description     : Micro-benchmark and parity check of packet-tracer output parsing
+usage           : ./benchmarks/bench_parser.py --help
+=======================================================================
+'''
+
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes.structuredata import ASAPolicyTest
+from classes.offline import RunningConfig, OfflineASA
+from classes import parser as textfsm_parser
+
+
+def LoadCorpus(count=None):
+    '''
+    Returns the outputs in benchmarks/corpus/*.txt keyed by filename.
+    With count, returns a list of count outputs cycling through the corpus.
+    '''
+
+    outputs = {}
+    for filename in sorted(glob.glob('{}/benchmarks/corpus/*.txt'.format(script_dir))):
+        with open(filename, 'r') as f:
+            outputs[os.path.basename(filename)] = f.read()
+
+    if count is None:
+        return outputs
+
+    outputs = list(outputs.values())
+    return [outputs[index % len(outputs)] for index in range(count)]
+
+
+def GenerateCorpus(count, seed=1):
+    '''
+    Returns a list of count outputs, half of them the corpus files, half rendered by OfflineASA
+    from benchmarks/running-config.txt for random flows, so NAT, drops and egress interfaces vary parse to parse.
+    The same seed gives the same outputs.
+    '''
+
+    with open('{}/benchmarks/running-config.txt'.format(script_dir), 'r') as f:
+        asa = OfflineASA(RunningConfig(f.read()))
+
+    files = list(LoadCorpus().values())
+    rng = random.Random(seed)
+    addresses = ('192.168.1.10', '192.168.1.77', '10.1.1.1', '10.1.1.15', '10.1.2.9', '10.99.4.4',
+                 '172.16.1.10', '172.16.1.11', '203.0.113.10', '203.0.113.2', '8.8.8.8', '198.51.100.7')
+    ports = (21, 22, 53, 80, 161, 443, 8080, 8050, 9999, 33000)
+
+    outputs = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            outputs.append(rng.choice(files))
+            continue
+
+        interface = rng.choice(('INSIDE', 'OUTSIDE', 'DMZ', 'SPARE', 'NOPE'))
+        source, destination = rng.choice(addresses), rng.choice(addresses)
+        protocol = rng.choice(('tcp', 'tcp', 'udp', 'icmp', 'esp'))
+        if protocol == 'icmp':
+            command = 'packet-tracer input {} icmp {} {} 0 {} detail'.format(
+                interface, source, rng.choice((0, 8)), destination)
+        elif protocol == 'esp':
+            command = 'packet-tracer input {} raw {} 50 {} detail'.format(interface, source, destination)
+        else:
+            command = 'packet-tracer input {} {} {} {} {} {} detail'.format(
+                interface, protocol, source, rng.randint(1024, 65535), destination, rng.choice(ports))
+        outputs.append(asa.send_command(command))
+
+    return outputs
+
+
+def Uncached(cli_output):
+    '''
+    The previous behaviour, template read from disk and compiled on every parse.
+    '''
+
+    textfsm_parser._template_texts.clear()
+    textfsm_parser._compiled_templates.tables = {}
+    return ASAPolicyTest(script_dir, cli_output).TestResult()
+
+
+def Cached(cli_output):
+    return ASAPolicyTest(script_dir, cli_output).TestResult()
+
+
+def Native(cli_output):
+    return ASAPolicyTest(script_dir, cli_output, 'native').TestResult()
+
+
+def Parity(outputs=None):
+    '''
+    Compares the native parser to the TextFSM template on every corpus output, or the outputs given.
+    Each output is also checked with trailing lines removed, so partial outputs agree too.
+    '''
+
+    failed = 0
+    checked = 0
+    if outputs is None:
+        outputs = LoadCorpus()
+    for filename, cli_output in outputs.items():
+        lines = cli_output.splitlines(True)
+        for length in range(len(lines), -1, -1):
+            partial = ''.join(lines[:length])
+            checked += 1
+            if Cached(partial) != Native(partial):
+                failed += 1
+                print('MISMATCH {} first {} lines'.format(filename, length))
+                print('  textfsm: {}'.format(Cached(partial)))
+                print('  native:  {}'.format(Native(partial)))
+
+    print('parity     {} outputs checked, {} mismatched'.format(checked, failed))
+    return failed == 0
+
+
+def Timed(name, function, corpus):
+    start = time.perf_counter()
+    for cli_output in corpus:
+        function(cli_output)
+    elapsed = time.perf_counter() - start
+
+    print('{:<10} {:>8} parses {:>10.3f} s {:>10.1f} us/parse'.format(
+        name, len(corpus), elapsed, elapsed / len(corpus) * 1000000))
+    return elapsed
+
+
+if __name__ == "__main__":
+
+    args = argparse.ArgumentParser(
+        description='Micro-benchmark and parity check of packet-tracer output parsing')
+    args.add_argument('-c', '--count', type=int, default=5000,
+                      help='number of outputs to parse.')
+    args.add_argument('-g', '--generate', action='store_true',
+                      help='parse a mix of the corpus files and outputs rendered offline for random flows.')
+    args = args.parse_args()
+
+    if args.generate:
+        corpus = GenerateCorpus(args.count)
+        outputs = dict(('generated {}'.format(index), cli_output) for index, cli_output in enumerate(corpus))
+    else:
+        corpus = LoadCorpus(args.count)
+        outputs = None
+
+    if not Parity(outputs):
+        sys.exit(1)
+
+    uncached = Timed('uncached', Uncached, corpus)
+    cached = Timed('cached', Cached, corpus)
+    native = Timed('native', Native, corpus)
+    print('speedup    cached {:.1f}x, native {:.1f}x'.format(
+        uncached / cached, uncached / native))
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+'''
+-*- coding: utf-8 -*-
+title           : bench_suite.py
+description     : Throughput benchmark of testset construction, parsing, execution and reporting
+usage           : ./benchmarks/bench_suite.py --help
+notes           : runs against synthetic YAML and the outputs in benchmarks/corpus, no ASA required
+=======================================================================
+'''
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+
+import logzero
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes.structuredata import ASAPolicyTest
+from classes.testcontrol import TestControl
+from classes.report import GenerateReport
+from benchmarks.bench_parser import LoadCorpus
+
+# bump when the benchmarks or the generated suite change, results of different versions do not compare
+FORMAT_VERSION = 1
+
+
+def GenerateSuite(interfaces=4, rows=100, fanout=2, seed=1):
+    '''
+    Returns a synthetic YAML context, rows rows on each of interfaces interfaces.
+    With fanout above 1, source_ip, destination_ip and destination_port are lists of fanout values,
+    so a tcp or udp row expands to fanout ** 3 testlets and an icmp row to fanout ** 2.
+    The same arguments always generate the same suite.
+    '''
+
+    generator = random.Random(seed)
+
+    def _addresses(network):
+        addresses = ['10.{}.{}.{}'.format(network, generator.randint(0, 255), generator.randint(1, 254))
+                     for _ in range(fanout)]
+        return addresses if fanout > 1 else addresses[0]
+
+    def _ports():
+        ports = generator.sample([22, 25, 53, 80, 123, 137, 443, 445, 1443, 3389, 8080, 8443], min(fanout, 12))
+        return ports if fanout > 1 else ports[0]
+
+    context = OrderedDict()
+    for number in range(interfaces):
+        interface = 'IF{}'.format(number)
+        context[interface] = []
+
+        for _ in range(rows):
+            protocol = generator.choice(['tcp', 'tcp', 'tcp', 'udp', 'icmp'])
+            icmp = protocol == 'icmp'
+            context[interface].append({
+                'protocol': protocol,
+                'icmp_type': 8 if icmp else None,
+                'icmp_code': 0 if icmp else None,
+                'source_ip': _addresses(number),
+                'source_port': None if icmp else generator.randint(1025, 65535),
+                'destination_ip': _addresses(100 + number),
+                'destination_port': None if icmp else _ports(),
+                'expected_result': generator.choice(['allow', 'drop']),
+            })
+
+    return context
+
+
+class CorpusASA(object):
+
+    '''
+    Stands in for a netmiko session, each command is answered with a corpus output chosen by its checksum,
+    so a suite gets the same mix of allow, drop, NAT and no route outputs on every run.
+    Outputs without a result, such as the invalid input error, are left out.
+    '''
+
+    def __init__(self, outputs):
+        self.outputs = [outputs[name] for name in sorted(outputs)
+                        if ASAPolicyTest(script_dir, outputs[name], 'native').TestResult() != None]
+        self.commands = 0
+
+    def send_command(self, command):
+        self.commands += 1
+        return self.outputs[zlib.crc32(command.encode('utf-8')) % len(self.outputs)]
+
+    def disconnect(self):
+        pass
+
+
+def Measure(function, repeat):
+    '''
+    Runs function repeat times, returns the seconds of each run and the last return value.
+    Setup that should not be timed is done by function's caller, not inside it.
+    '''
+
+    times = []
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = function()
+        times.append(time.perf_counter() - started)
+    return times, value
+
+
+def Result(times, items):
+    return OrderedDict([
+        ('items', items),
+        ('best_s', round(min(times), 6)),
+        ('median_s', round(statistics.median(times), 6)),
+        ('us_per_item', round(min(times) / items * 1000000, 3) if items else None),
+    ])
+
+
+def Benchmark(workdir, context, repeat, parse_count, parsers, report_formats):
+    '''
+    Times each stage on its own, returns {benchmark name: Result}.
+    workdir stands in for the script directory, retry files and reports are written there.
+    '''
+
+    results = OrderedDict()
+    corpus = LoadCorpus()
+
+    # testset construction, a fresh TestControl each run as tester.py does
+    times, testset = Measure(lambda: TestControl(workdir, context).construct_testset(), repeat)
+    results['construct'] = Result(times, len(testset))
+
+    # parsing alone, cycling through the corpus
+    outputs = LoadCorpus(parse_count)
+    for parser in parsers:
+        times, _ = Measure(lambda: [ASAPolicyTest(workdir, cli_output, parser).TestResult()
+                                    for cli_output in outputs], repeat)
+        results['parse_{}'.format(parser)] = Result(times, len(outputs))
+
+    # execute against the corpus, testlets are built before the clock starts
+    jinja2_results = None
+    for parser in parsers:
+        times = []
+        for _ in range(repeat):
+            test_control = TestControl(workdir, context, parser=parser)
+            testset = test_control.construct_testset()
+            connect = CorpusASA(corpus)
+            run_times, jinja2_results = Measure(lambda: test_control.execute(testset, connect), 1)
+            times.extend(run_times)
+        results['execute_{}'.format(parser)] = Result(times, len(testset))
+
+    # the main report and one per interface, as a single device run writes them
+    generated = datetime.datetime.now().strftime("%d/%m/%Y @ %H:%M:%S")
+    for report_format in report_formats:
+        report = GenerateReport(jinja2_results, workdir, generated, 'bench', report_format=report_format)
+        times, _ = Measure(report.gen_report, repeat)
+        results['report_{}'.format(report_format)] = Result(times, len(testset))
+
+    return results
+
+
+def Revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=script_dir,
+                                       stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except Exception:
+        return None
+
+
+def Compare(results, baseline):
+    '''
+    Prints the change of each benchmark's best time against an earlier results file.
+    '''
+
+    if baseline['suite'] != results['suite'] or baseline['format'] != results['format']:
+        print('baseline ran a different suite, not compared')
+        return
+
+    print('\nagainst {} ({})'.format(baseline.get('revision'), baseline.get('date')))
+    for name, result in results['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is None:
+            print('{:<16} new'.format(name))
+            continue
+        print('{:<16} {:>10.3f} s -> {:>10.3f} s {:>+8.1f}%'.format(
+            name, before['best_s'], result['best_s'], (result['best_s'] / before['best_s'] - 1) * 100))
+
+
+if __name__ == "__main__":
+
+    args = argparse.ArgumentParser(
+        description='Throughput benchmark of testset construction, parsing, execution and reporting')
+    args.add_argument('-i', '--interfaces', type=int, default=4,
+                      help='interfaces in the generated suite.')
+    args.add_argument('-m', '--rows', type=int, default=100,
+                      help='YAML rows per interface.')
+    args.add_argument('-f', '--fanout', type=int, default=2,
+                      help='values in each source_ip, destination_ip and destination_port list.')
+    args.add_argument('-r', '--repeat', type=int, default=3,
+                      help='runs of each benchmark, the best is compared.')
+    args.add_argument('-c', '--count', type=int, default=5000,
+                      help='outputs parsed by the parse benchmarks.')
+    args.add_argument('-R', '--report_format', choices=['table', 'compact'], action='append',
+                      help='report formats to time, both by default.')
+    args.add_argument('-o', '--output', required=False,
+                      help='write the results as JSON to this file.')
+    args.add_argument('-b', '--baseline', required=False,
+                      help='JSON results of an earlier run to compare against.')
+    args = args.parse_args()
+
+    # per testlet logging would dominate the timings, failed tests are logged as errors
+    logzero.loglevel(logging.CRITICAL)
+
+    suite = OrderedDict([('interfaces', args.interfaces), ('rows', args.rows), ('fanout', args.fanout)])
+    context = GenerateSuite(args.interfaces, args.rows, args.fanout)
+
+    # a throwaway script directory, the templates are shared and reports and retry files land in it
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    try:
+        for directory in ('jinja2_templates', 'templates_textfsm'):
+            os.symlink(os.path.join(script_dir, directory), os.path.join(workdir, directory))
+        os.mkdir(os.path.join(workdir, 'reports'))
+        os.mkdir(os.path.join(workdir, 'tests'))
+
+        benchmarks = Benchmark(workdir, context, args.repeat, args.count, ['textfsm', 'native'],
+                               args.report_format or ['table', 'compact'])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = OrderedDict([
+        ('format', FORMAT_VERSION),
+        ('revision', Revision()),
+        ('date', datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+        ('python', platform.python_version()),
+        ('suite', suite),
+        ('repeat', args.repeat),
+        ('benchmarks', benchmarks),
+    ])
+
+    print('suite      {} interfaces, {} rows, fan-out {}'.format(args.interfaces, args.rows, args.fanout))
+    for name, result in benchmarks.items():
+        print('{:<16} {:>8} items {:>10.3f} s {:>10.1f} us/item'.format(
+            name, result['items'], result['best_s'], result['us_per_item']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print('results written to "{}"'.format(args.output))
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            Compare(results, json.load(f))
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+'''
+-*- coding: utf-8 -*-
+title           : mock_asa.py
+description     : Local SSH stand-in for a Cisco ASA, answers packet-tracer from a rule file
+usage           : ./benchmarks/mock_asa.py --help
+notes           : netmiko's cisco_asa driver logs in with any username and password
+=======================================================================
+'''
+
+import argparse
+import glob
+import os
+import queue
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import paramiko
+import yaml
+from logzero import logger
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+def LoadRules(rules_file=None, corpus_dir=None):
+    '''
+    Returns a list of (compiled regex, output) rules and the default output.
+
+    The rule file is YAML:
+      default: allow_nat.txt
+      rules:
+        - {match: 'packet-tracer input \\S+ tcp .* 443 detail', output: allow_nat.txt}
+        - {match: 'packet-tracer input OUTSIDE', output: drop_acl.txt, context: ctx1}
+
+    Outputs name files in the corpus directory, the first matching rule wins.
+    A rule with a context only matches in that security context, see --contexts.
+    Without a rule file every packet-tracer command gets the default output.
+    '''
+
+    corpus_dir = corpus_dir if corpus_dir != None else '{}/corpus'.format(script_dir)
+
+    def _output(name):
+        with open(os.path.join(corpus_dir, name), 'r') as f:
+            return f.read()
+
+    rules = []
+    default = 'allow_nat.txt'
+
+    if rules_file != None:
+        with open(rules_file, 'r') as yml:
+            data = yaml.safe_load(yml)
+        default = data.get('default', default)
+        for rule in data.get('rules', []):
+            rules.append((re.compile(rule['match']), _output(rule['output']), rule.get('context')))
+
+    return rules, _output(default)
+
+
+class MockASAServer(paramiko.ServerInterface):
+
+    '''
+    paramiko server interface, accepts any password and a single interactive shell.
+    '''
+
+    def __init__(self):
+        self.shell = threading.Event()
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell.set()
+        return True
+
+
+class MockASASession(object):
+
+    '''
+    Emulates the ASA CLI on one channel: echo, prompt, config mode, and canned packet-tracer output.
+    '''
+
+    def __init__(self, channel, hostname, rules, default, latency=0.0, jitter=0.0, checksum='00000000 00000000 00000000 00000000',
+                 rtt=0.0, contexts=None):
+
+        self.channel = channel
+        self.hostname = hostname
+        self.rules = rules
+        self.default = default
+        self.latency = latency
+        self.jitter = jitter
+        self.checksum = checksum
+        self.config_mode = False
+
+        # security contexts in multiple-context mode, sessions start in the system context where packet-tracer is refused
+        self.contexts = contexts
+        self.context = None
+
+        # output is delivered rtt seconds after it is written, like a slow link, without holding up the CLI
+        self.rtt = rtt
+        if rtt > 0:
+            self.delayed = queue.Queue()
+            threading.Thread(target=self._deliver, daemon=True).start()
+
+    def prompt(self):
+        hostname = '{}/{}'.format(self.hostname, self.context) if self.context != None else self.hostname
+        return '{}(config)# '.format(hostname) if self.config_mode else '{}# '.format(hostname)
+
+    def write(self, text):
+        text = text.replace('\r\n', '\n').replace('\n', '\r\n')
+        if self.rtt > 0:
+            self.delayed.put((time.time() + self.rtt, text))
+        else:
+            self.channel.sendall(text)
+
+    def _deliver(self):
+        while True:
+            due, text = self.delayed.get()
+            time.sleep(max(0, due - time.time()))
+            try:
+                self.channel.sendall(text)
+            except Exception:
+                break
+
+    def packet_tracer(self, command):
+        # simulate the time the ASA takes to run the trace
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        for regex, output, context in self.rules:
+            if (context is None or context == self.context) and regex.search(command):
+                return output
+        return self.default
+
+    def changeto(self, words):
+        if words == ['system']:
+            self.context = None
+            return ''
+        if len(words) == 2 and words[0] == 'context':
+            if words[1] in self.contexts:
+                self.context = words[1]
+                return ''
+            return "ERROR: Context '{}' does not exist\n".format(words[1])
+        return "ERROR: % Invalid input detected at '^' marker.\n"
+
+    def respond(self, command):
+        '''
+        Returns the output for one command line, None closes the session.
+        '''
+
+        if command in ('exit', 'quit', 'logout'):
+            if self.config_mode:
+                self.config_mode = False
+                return ''
+            return None
+
+        if command.startswith('changeto') and self.contexts != None:
+            return self.changeto(command.split()[1:])
+        if command.startswith('packet-tracer') and (self.contexts is None or self.context != None):
+            return self.packet_tracer(command)
+        if command == 'show curpriv':
+            return 'Username : admin\nCurrent privilege level : 15\nCurrent Mode/s : P_PRIV\n'
+        if command == 'show checksum':
+            return 'Cryptochecksum: {}\n'.format(self.checksum)
+        if command in ('configure terminal', 'conf t'):
+            self.config_mode = True
+            return ''
+        if command == 'end':
+            self.config_mode = False
+            return ''
+        if command == '' or command in ('login', 'enable') or command.startswith('terminal '):
+            return ''
+
+        return "ERROR: % Invalid input detected at '^' marker.\n"
+
+    def run(self):
+        self.write('Type help or \'?\' for a list of available commands.\n{}'.format(self.prompt()))
+
+        buffer = ''
+        while True:
+            data = self.channel.recv(4096)
+            if not data:
+                break
+            buffer += data.decode('utf-8', 'replace')
+
+            # echo and answer every complete line
+            while True:
+                match = re.search(r'\r\n|\n|\r', buffer)
+                if not match:
+                    break
+                command, buffer = buffer[:match.start()], buffer[match.end():]
+
+                output = self.respond(command.strip())
+                if output is None:
+                    self.write('{}\n\nLogoff\n'.format(command))
+                    return
+                self.write('{}\n{}{}'.format(command, output, self.prompt()))
+
+
+def ServeClient(client, host_key, args, rules, default):
+    transport = paramiko.Transport(client)
+    try:
+        transport.add_server_key(host_key)
+        server = MockASAServer()
+        transport.start_server(server=server)
+
+        channel = transport.accept(30)
+        if channel is None:
+            return
+        server.shell.wait(10)
+
+        MockASASession(channel, args.hostname, rules, default,
+                       args.latency, args.jitter, args.checksum, args.rtt,
+                       args.contexts.split(',') if args.contexts else None).run()
+        channel.close()
+    except Exception:
+        logger.error('{}: {}'.format(sys.exc_info()[0], sys.exc_info()[1:]))
+    finally:
+        transport.close()
+
+
+def Serve(args):
+    rules, default = LoadRules(args.rules, args.corpus)
+    host_key = paramiko.RSAKey.generate(2048)
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.listen, args.port))
+    listener.listen(100)
+    logger.info('Mock ASA "{}" listening on {}:{}'.format(args.hostname, args.listen, args.port))
+
+    while True:
+        client, address = listener.accept()
+        threading.Thread(target=ServeClient, args=(client, host_key, args, rules, default),
+                         daemon=True).start()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Local SSH stand-in for a Cisco ASA')
+    parser.add_argument('-l', '--listen', default='127.0.0.1',
+                        help='address to listen on.')
+    parser.add_argument('-p', '--port', type=int, default=2222,
+                        help='port to listen on.')
+    parser.add_argument('-n', '--hostname', default='mockasa',
+                        help='hostname shown in the prompt.')
+    parser.add_argument('-r', '--rules', required=False,
+                        help='YAML rule file mapping packet-tracer commands to outputs.')
+    parser.add_argument('-c', '--corpus', required=False,
+                        help='directory holding the outputs, defaults to benchmarks/corpus.')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds each packet-tracer takes.')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random +/- seconds added to the latency.')
+    parser.add_argument('--rtt', type=float, default=0.0,
+                        help='seconds added to every reply, emulates a high latency link.')
+    parser.add_argument('--checksum', default='00000000 00000000 00000000 00000000',
+                        help='value returned by "show checksum".')
+
+    parser.add_argument('--contexts', required=False,
+                        help='comma separated security contexts, runs in multiple-context mode.')
+
+    Serve(parser.parse_args())
@@ -0,0 +1,268 @@
+from logzero import logger
+from collections import deque
+from .pipeline import PromptPattern, TakeOutput, NormalizeLines
+import asyncio
+import re
+import threading
+import time
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+
+# one event loop runs every asyncssh session in the process, started on first use
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def SharedLoop():
+    '''
+    Returns the event loop the asyncssh sessions run on, it runs in a daemon thread.
+    '''
+
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='asyncssh', daemon=True).start()
+
+    return _loop
+
+
+class AsyncASASession(object):
+
+    '''
+    One interactive ASA CLI session over asyncssh, the coroutine counterpart of a netmiko session.
+    '''
+
+    PROMPT = re.compile(r'(?:^|\n)([\w.\-/@()]+[#>])\s*$')
+
+    def __init__(self, device, timeout=60, context=None):
+        self.device = device
+        self.timeout = timeout
+        self.context = context
+        self.connection = None
+        self.process = None
+        self.state = {'buffer': '', 'prompt': None}
+
+    async def _read(self):
+        data = await self.process.stdout.read(65536)
+        if not data:
+            raise EOFError('Session to {} closed'.format(self.device['ip']))
+        self.state['buffer'] += NormalizeLines(data)
+
+    async def _find_prompt(self):
+        self.process.stdin.write('\n')
+        while True:
+            match = self.PROMPT.search(self.state['buffer'])
+            if match:
+                self.state['buffer'] = ''
+                return match.group(1)
+            await self._read()
+
+    async def open(self):
+        device = self.device
+        self.connection = await asyncio.wait_for(asyncssh.connect(
+            device['ip'], port=device.get('port') or 22, username=device['username'],
+            password=device['password'], known_hosts=None), self.timeout)
+        self.process = await self.connection.create_process(term_type='vt100', term_size=(511, 24))
+
+        prompt = await asyncio.wait_for(self._find_prompt(), self.timeout)
+
+        # privileged mode, as netmiko's enable() does
+        if prompt.endswith('>') and device.get('secret'):
+            self.process.stdin.write('enable\n')
+            while 'assword' not in self.state['buffer']:
+                await asyncio.wait_for(self._read(), self.timeout)
+            self.process.stdin.write('{}\n'.format(device['secret']))
+            self.state['buffer'] = ''
+            prompt = await asyncio.wait_for(self._find_prompt(), self.timeout)
+
+        # security context of a multiple-context ASA, its prompt replaces the system prompt
+        if self.context != None:
+            prompt = await asyncio.wait_for(self._changeto(self.context), self.timeout)
+
+        self.state['prompt'] = PromptPattern(prompt)
+
+        # same session preparation as netmiko's cisco_asa driver
+        await self.send_command('terminal pager 0')
+
+    async def _changeto(self, context):
+        '''
+        Returns the context's prompt, read after the echo of the command so a late system prompt is skipped.
+        '''
+
+        command = 'changeto context {}'.format(context)
+        self.process.stdin.write(command + '\n')
+        while True:
+            echo = self.state['buffer'].find(command)
+            match = self.PROMPT.search(self.state['buffer'], echo) if echo >= 0 else None
+            if match:
+                break
+            await self._read()
+
+        output = self.state['buffer'][echo + len(command):match.start()]
+        self.state['buffer'] = ''
+        if 'ERROR' in output:
+            raise ValueError('Unable to change to context "{}": {}'.format(context, output.strip()))
+        return match.group(1)
+
+    async def send_command(self, command):
+        async def _send():
+            self.process.stdin.write(command + '\n')
+            while True:
+                output = TakeOutput(self.state, command)
+                if output is not None:
+                    return output
+                await self._read()
+
+        return await asyncio.wait_for(_send(), self.timeout)
+
+    async def close(self):
+        if self.connection != None:
+            self.connection.close()
+            try:
+                await asyncio.wait_for(self.connection.wait_closed(), self.timeout)
+            except Exception:
+                pass
+            self.connection = None
+
+
+class AsyncSessionPool(object):
+
+    '''
+    Runs a device's packet-tracer commands over asyncssh sessions on the shared event loop.
+    It has the same send_command and send_commands methods as a netmiko session or SessionPool,
+    so TestControl, the result cache and minimize use it unchanged from their own thread.
+    The sessions of a device take commands from one queue, so no more than sessions commands run on it at once,
+    logins across every device are bounded by the logins semaphore.
+    '''
+
+    # concurrent logins across all devices
+    LOGINS = 32
+    _logins = None
+
+    def __init__(self, device, sessions=1, timeout=60, context=None):
+        '''
+        Takes the netmiko device dictionary, timeout bounds each login and each command.
+        With context every session changes to that security context after login.
+        '''
+
+        if asyncssh is None:
+            raise ImportError('asyncssh is required for the asyncssh transport')
+
+        self.device = device
+        self.sessions = sessions if sessions > 0 else 1
+        self.timeout = timeout
+        self.context = context
+        self.loop = SharedLoop()
+        self.connections = []
+        self.idle = None
+
+        # seconds the command whose output send_commands last yielded took on its session
+        self.last_latency = None
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def _open(self):
+        if AsyncSessionPool._logins is None:
+            AsyncSessionPool._logins = asyncio.Semaphore(self.LOGINS)
+
+        async def _connect(number):
+            session = AsyncASASession(self.device, self.timeout, self.context)
+            async with AsyncSessionPool._logins:
+                try:
+                    await session.open()
+                except BaseException:
+                    # a session that logged in but failed to prepare, such as an unknown context, is still open
+                    await session.close()
+                    raise
+            logger.info('Session {} connected to {}'.format(number, self.device['ip']))
+            return session
+
+        results = await asyncio.gather(*[_connect(number) for number in range(1, self.sessions + 1)],
+                                       return_exceptions=True)
+        self.connections = [result for result in results if isinstance(result, AsyncASASession)]
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await self._close()
+            raise errors[0]
+
+        self.idle = asyncio.Queue()
+        for session in self.connections:
+            self.idle.put_nowait(session)
+
+    async def _send(self, command):
+        '''
+        Returns the output and the seconds the command took once it had a session.
+        '''
+
+        session = await self.idle.get()
+        started = time.time()
+        try:
+            return await session.send_command(command), time.time() - started
+        finally:
+            # a late answer to a timed out command is dropped by its echo, the session can be reused
+            self.idle.put_nowait(session)
+
+    async def _close(self):
+        await asyncio.gather(*[session.close() for session in self.connections], return_exceptions=True)
+        self.connections = []
+
+    def open(self):
+        '''
+        Opens every session, a failed login fails the whole pool.
+        '''
+
+        self._run(self._open()).result()
+        return self
+
+    def disconnect(self):
+        self._run(self._close()).result()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disconnect()
+
+    def send_command(self, command):
+        if not self.connections:
+            self.open()
+
+        return self._run(self._send(command)).result()[0]
+
+    def send_commands(self, commands):
+        '''
+        Generator, yields the outputs in the order the commands were given, None for a None command.
+        At most two commands per session are in flight or waiting to be collected.
+        '''
+
+        if not self.connections:
+            self.open()
+
+        window = len(self.connections) * 2
+        pending = deque()
+
+        def _result(future):
+            output, self.last_latency = future.result() if future is not None else (None, None)
+            return output
+
+        try:
+            for command in commands:
+                pending.append(self._run(self._send(command)) if command is not None else None)
+                while len(pending) >= window:
+                    yield _result(pending.popleft())
+
+            while pending:
+                yield _result(pending.popleft())
+
+        finally:
+            for future in pending:
+                if future is not None:
+                    future.cancel()
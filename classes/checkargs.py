@@ -7,9 +7,16 @@ def CheckArgs(args=None):
 
     parser = argparse.ArgumentParser(
         description='TextFSM parser for Cisco command putputs')
-    parser.add_argument('-i', '--host', required=True,
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('-i', '--host',
                         help='IP Address or hostname of Cisco ASA.')
 
+    target.add_argument('-I', '--inventory',
+                        help='YAML inventory of Cisco ASAs to test concurrently.')
+
+    target.add_argument('-o', '--offline',
+                        help='saved "show running-config" to evaluate the tests against without an ASA.')
+
     parser.add_argument('-u', '--username', required=True,
                         help='Priv 15 Username.')
 
@@ -17,7 +24,7 @@ def CheckArgs(args=None):
                         help='SSH port.', type=int, default=22)
 
     parser.add_argument('-y', '--yaml', required=True,
-                        help='YAML file with tests.')
+                        help='YAML file with tests, or a directory or glob of them, under tests/.')
 
     parser.add_argument('-p', '--password', action='store_true', dest='password',
                         help='hidden password prompt')
@@ -31,11 +38,61 @@ def CheckArgs(args=None):
     parser.add_argument('-r', '--reportname', required=False,
                         help='optional report name flag')
 
+    parser.add_argument('-n', '--sessions', required=False, type=int, default=1,
+                        help='number of parallel SSH sessions to the ASA.')
+
+    parser.add_argument('-m', '--max_devices', required=False, type=int, default=8,
+                        help='number of inventory devices, or security contexts with -G, tested at once.')
+
+    parser.add_argument('-P', '--parser', required=False, choices=['textfsm', 'native'], default='textfsm',
+                        help='packet-tracer output parser.')
+
+    parser.add_argument('-c', '--cache', required=False,
+                        help='path to the result cache, reuses results while the ASA configuration is unchanged.')
+
+    parser.add_argument('-x', '--max_expansion', required=False, type=int, default=65536,
+                        help='most testlets one YAML row may expand to, larger rows are skipped.')
+
+    parser.add_argument('-M', '--minimize', action='store_true', dest='minimize',
+                        help='run one flow plus boundary flows per ACE equivalence class, infer the rest.')
+
+    parser.add_argument('-R', '--report_format', required=False, choices=['auto', 'table', 'compact'], default='auto',
+                        help='HTML report format, compact renders the rows in the browser and suits 100k+ rows. auto picks compact above 20000 rows.')
+
+    parser.add_argument('-J', '--jsonl', required=False,
+                        help='also stream results to this JSON Lines file, one record per testlet.')
+
+    parser.add_argument('-X', '--junit', required=False,
+                        help='also stream results to this JUnit XML file, one testcase per testlet.')
+
+    parser.add_argument('-C', '--csv', required=False,
+                        help='also stream results to this CSV file, one row per testlet.')
+
+    parser.add_argument('-z', '--resume', action='store_true', dest='resume',
+                        help='resume an interrupted run from its journal, testlets already journaled are not run again.')
+
+    parser.add_argument('-k', '--pipeline', required=False, type=int, default=1,
+                        help='packet-tracer commands kept in flight on a single SSH session, helps on high latency links.')
+
+    parser.add_argument('-T', '--transport', required=False, choices=['netmiko', 'asyncssh'], default='netmiko',
+                        help='SSH transport, asyncssh runs every session on one event loop for large fleets.')
+
+    parser.add_argument('-t', '--compile', action='store_true', dest='compile',
+                        help='keep the expanded, resolved testset next to the YAML and reuse it while the YAML and hostfile are unchanged.')
+
+    parser.add_argument('-G', '--contexts', action='store_true', dest='contexts',
+                        help='the suite is grouped by security context, each context runs on its own sessions after "changeto context".')
 
     results = parser.parse_args(args)
 
+    # contexts are switched on a live session
+    if results.contexts and not results.host:
+        parser.error('-G/--contexts needs a single ASA, given with -i')
+
     if results.password:
         password = getpass()
+    else:
+        password = None
 
     if results.enable_password:
         enable_password = getpass()
@@ -51,4 +108,21 @@ def CheckArgs(args=None):
         enable_password,
         results.hostfile,
         results.reportname,
+        results.sessions,
+        results.inventory,
+        results.max_devices,
+        results.parser,
+        results.cache,
+        results.offline,
+        results.max_expansion,
+        results.minimize,
+        results.report_format,
+        results.jsonl,
+        results.junit,
+        results.csv,
+        results.resume,
+        results.pipeline,
+        results.transport,
+        results.compile,
+        results.contexts,
     )
@@ -0,0 +1,195 @@
+from logzero import logger
+from .records import Testlet
+from .suite import SuiteFiles
+import hashlib
+import json
+import os
+import re
+
+
+def FileDigest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def CompiledPath(directory, suite):
+    '''
+    Where the compiled testset of the suite path is kept, path separators and glob characters become underscores.
+    '''
+
+    return '{}/{}.testset'.format(directory, re.sub(r'[^\w.\-]+', '_', suite).strip('_'))
+
+
+class CompiledTestset(object):
+
+    '''
+    Saved copy of a suite's expanded, resolved testlets, an unchanged suite is read back from it
+    instead of parsing the YAML, resolving names and expanding rows again.
+
+    It is keyed by the suite's files, the hostfile mtime and the expansion limit,
+    and only used while every YAML file it was built from, includes too, has the same content hash.
+    Any change rebuilds it. DNS answers are kept as they were when it was built.
+
+    The file is JSON lines, the key, then chunks of YAML rows and testlet lists, then the files read and their hashes.
+    Only plain values are read back, never objects, so the file is trusted no more than the YAML it came from.
+    It starts with the offset of the hashes as a fixed width line, so they are checked before any testlet is read.
+    While the testset is built it goes to a partial file, which replaces the compiled testset once complete.
+    '''
+
+    VERSION = 3
+    OFFSET = '{:020d}\n'
+
+    def __init__(self, path, suite, hostfile=None, max_expansion=65536, chunk=10000):
+        '''
+        suite is the TestSuite the testset is built from.
+        '''
+
+        self.path = path
+        self.partial = '{}.partial'.format(path)
+        self.suite = suite
+        self.chunk = chunk
+
+        hostfile_mtime = os.path.getmtime(hostfile) if hostfile and os.path.isfile(hostfile) else None
+        self.key = [self.VERSION, suite.files, hostfile_mtime, max_expansion]
+
+        # set by load() when the compiled testset matches the suite
+        self.loaded = False
+        self.offset = None
+
+        self.reader = None
+        self.writer = None
+        self.rows = []
+        self.row = None
+        self.row_count = 0
+        self.buffer = []
+        self.count = 0
+
+    def load(self):
+        '''
+        Returns True when the compiled testset matches the suite, testlets() then reads it back.
+        '''
+
+        if not os.path.isfile(self.path):
+            return False
+
+        try:
+            self.reader = open(self.path, 'rb')
+            self.offset = int(self.reader.readline())
+            key = self._read()
+            start = self.reader.tell()
+            self.reader.seek(self.offset)
+            sources = self._read()
+            self.reader.seek(start)
+        except Exception:
+            logger.error('Compiled testset "{}" is unreadable, rebuilding it'.format(self.path))
+            self.close()
+            return False
+
+        if key != self.key or not self._unchanged(sources):
+            logger.info('Suite changed since "{}" was compiled, rebuilding it'.format(self.path))
+            self.close()
+            return False
+
+        self.loaded = True
+        logger.info('Loading the compiled testset "{}"'.format(self.path))
+        return True
+
+    def _read(self):
+        return json.loads(self.reader.readline().decode('utf-8'))
+
+    def _write(self, value):
+        self.writer.write(json.dumps(value, separators=(',', ':'), default=str).encode('utf-8') + b'\n')
+
+    def _unchanged(self, sources):
+        for pattern, base, files in sources['includes']:
+            if SuiteFiles(pattern, base) != files:
+                return False
+
+        for filename, digest in sources['files']:
+            if not os.path.isfile(filename) or FileDigest(filename) != digest:
+                return False
+
+        return True
+
+    def testlets(self, values):
+        '''
+        Generator, yields the compiled testlets, their shared strings come from values.
+        '''
+
+        shared = values.shared
+        rows = []
+        while self.reader.tell() < self.offset:
+            new_rows, chunk = self._read()
+            rows.extend(new_rows)
+
+            for (row, interface, index, protocol, source_ip, source_port, icmp_type, icmp_code, destination_ip,
+                 destination_port, expected_result, execute, command, duplicate, inferred) in chunk:
+                yield Testlet(shared(interface), index, shared(protocol), source_ip, source_port,
+                              icmp_type, icmp_code, destination_ip, destination_port,
+                              shared(expected_result), execute, rows[row], command, duplicate, inferred)
+                self.count += 1
+
+        logger.info('{} testlets loaded from the compiled testset'.format(self.count))
+        self.close()
+
+    def create(self):
+        self.writer = open(self.partial, 'wb')
+        self.writer.write(self.OFFSET.format(0).encode('ascii'))
+        self._write(self.key)
+
+    def add(self, testlet):
+        # a row's testlets arrive together, each YAML row is written once with the first of them
+        if testlet.yaml_row is not self.row:
+            self.row = testlet.yaml_row
+            self.rows.append(self.row)
+            self.row_count += 1
+
+        self.buffer.append((self.row_count - 1, testlet.interface, testlet.index, testlet.protocol,
+                            testlet.source_ip, testlet.source_port, testlet.icmp_type, testlet.icmp_code,
+                            testlet.destination_ip, testlet.destination_port, testlet.expected_result,
+                            testlet.execute, testlet.command, testlet.duplicate, testlet.inferred))
+        if len(self.buffer) >= self.chunk:
+            self._flush()
+
+    def _flush(self):
+        self._write([self.rows, self.buffer])
+        self.count += len(self.buffer)
+        self.rows = []
+        self.buffer = []
+
+    def complete(self):
+        '''
+        Called once every testlet was added, the partial file becomes the compiled testset.
+        '''
+
+        self._flush()
+
+        offset = self.writer.tell()
+        self._write({'files': [(filename, FileDigest(filename)) for filename in self.suite.read],
+                     'includes': self.suite.includes})
+        self.writer.seek(0)
+        self.writer.write(self.OFFSET.format(offset).encode('ascii'))
+
+        self.writer.close()
+        self.writer = None
+        os.replace(self.partial, self.path)
+        logger.info('{} testlets compiled to "{}"'.format(self.count, self.path))
+
+    def close(self):
+        '''
+        Closes any open file, an incomplete partial file is removed.
+        '''
+
+        if self.reader != None:
+            self.reader.close()
+            self.reader = None
+        if self.writer != None:
+            self.writer.close()
+            self.writer = None
+            try:
+                os.unlink(self.partial)
+            except OSError:
+                pass
@@ -0,0 +1,149 @@
+from logzero import logger
+from netmiko import ConnectHandler
+from .testcontrol import TestControl
+from .sessionpool import SessionPool, ChangeTo
+from .resultcache import ResultCache
+from .journal import ResultJournal
+from .pipeline import PipelinedSession
+from .asyncsession import AsyncSessionPool
+from .fleet import CombinedResults, DeviceFileName
+from .timing import timer
+import threading
+import queue
+import sys
+
+
+class ContextControl(object):
+
+    '''
+    Class to run a suite grouped by security context against one multiple-context ASA.
+    Every context gets its own sessions, switched over with "changeto context", and its own TestControl,
+    so contexts are built and executed concurrently.
+    '''
+
+    def __init__(self, script_dir, contexts, device, hostfile_status=False, hostfile_list=None,
+                 max_contexts=8, sessions=1, parser='textfsm', cache=None, writers=None, resume=False,
+                 pipeline=1, transport='netmiko', max_expansion=65536, minimize=False):
+        '''
+        contexts is the OrderedDict returned by TestSuite.contexts().
+        device is the netmiko device dictionary of the ASA, sessions are opened per context.
+        cache is the optional result cache path, entries are kept per context.
+        writers are the streaming outputs shared by every context, rows carry "<host>/<context>".
+        resume replays each context's journal from an interrupted run.
+        '''
+
+        self.script_dir = script_dir
+        self.contexts = contexts
+        self.device = device
+        self.hostfile_status = hostfile_status
+        self.hostfile_list = hostfile_list
+        self.max_contexts = max_contexts if max_contexts > 0 else 1
+        self.sessions = sessions
+        self.parser = parser
+        self.cache = cache
+        self.writers = writers
+        self.resume = resume
+        self.pipeline = pipeline
+        self.transport = transport
+        self.max_expansion = max_expansion
+        self.minimize = minimize
+
+        # per context jinja2_results, keyed by context name
+        self.results = {}
+
+        # context names end up in file names, two that clean up to the same name would share their files
+        filenames = {}
+        for name in contexts:
+            other = filenames.setdefault(DeviceFileName(name), name)
+            if other != name:
+                raise ValueError('Contexts "{}" and "{}" would share the file name "{}"'.format(
+                    other, name, DeviceFileName(name)))
+
+    def _connect(self, name):
+        '''
+        Opens the context's sessions, each one already changed to the context.
+        '''
+
+        if self.transport == 'asyncssh':
+            return AsyncSessionPool(self.device, self.sessions, context=name).open()
+        if self.sessions > 1:
+            return SessionPool(self.device, self.sessions, context=name).open()
+
+        connect = ConnectHandler(**self.device)
+        try:
+            ChangeTo(connect, name)
+        except Exception:
+            connect.disconnect()
+            raise
+
+        if self.pipeline > 1:
+            connect = PipelinedSession(connect, self.pipeline)
+        return connect
+
+    def _execute_context(self, name, suite):
+        '''
+        Builds and runs one context's testset and stores its jinja2_results.
+        '''
+
+        host = '{}/{}'.format(self.device['ip'], name)
+        filename = DeviceFileName(name)
+
+        try:
+            # every context gets its own result store and retry file
+            test_control = TestControl(self.script_dir, suite, self.hostfile_status, self.hostfile_list,
+                                       retry_name='retry_{}.yml'.format(filename), parser=self.parser,
+                                       result_cache=ResultCache(self.cache, host) if self.cache else None,
+                                       max_expansion=self.max_expansion)
+
+            logger.info('Attempting connection to {} for context "{}"'.format(self.device['ip'], name))
+            with timer.stage('connect'):
+                connect = self._connect(name)
+
+            try:
+                if self.minimize:
+                    test_control.minimize(connect)
+
+                with ResultJournal('{}/tests/journal_{}.jsonl'.format(self.script_dir, filename), self.resume) as journal:
+                    self.results[name] = test_control.execute(test_control.iter_testset(), connect,
+                                                              writers=self.writers, host=host, journal=journal)
+            finally:
+                connect.disconnect()
+
+        except Exception:
+            logger.error('{}: {}: {}'.format(
+                host, sys.exc_info()[0], sys.exc_info()[1:]))
+
+    def execute(self):
+        '''
+        Hands each context to a bounded set of workers, at most max_contexts run at once.
+        Returns the per context results, contexts that failed are omitted.
+        '''
+
+        work = queue.Queue()
+        for name, suite in self.contexts.items():
+            work.put((name, suite))
+
+        def _worker():
+            while True:
+                try:
+                    name, suite = work.get_nowait()
+                except queue.Empty:
+                    break
+                self._execute_context(name, suite)
+
+        threads = [threading.Thread(target=_worker)
+                   for _ in range(min(self.max_contexts, len(self.contexts)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return self.results
+
+    def combined_results(self):
+        '''
+        Merges the per context results into one jinja2_results style dictionary, see CombinedResults.
+        '''
+
+        # keep the suite's context order in the report
+        return CombinedResults(self.results, list(self.contexts))
@@ -0,0 +1,109 @@
+from ipaddr import IPAddress, IPNetwork
+import re
+
+
+def ParsePortRange(value):
+    '''
+    Returns (first, last) for a "8000-8100" style string, otherwise None.
+    '''
+
+    if not isinstance(value, str):
+        return None
+
+    match = re.match(r'^\s*(\d+)\s*-\s*(\d+)\s*$', value)
+    if not match:
+        return None
+
+    return int(match.group(1)), int(match.group(2))
+
+
+def ParsePrefix(value):
+    '''
+    Returns the IPNetwork for a "10.1.0.0/28" style string, otherwise None.
+    '''
+
+    if not isinstance(value, str) or '/' not in value:
+        return None
+
+    try:
+        return IPNetwork(value.strip())
+    except ValueError:
+        return None
+
+
+def ValidPort(port):
+    return isinstance(port, int) and port <= 65535 and port >= 0
+
+
+class PortRange(object):
+
+    '''
+    Inclusive range of ports, yields the same {'valid', 'port'} dictionaries as a listed port.
+    '''
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+        self.valid = ValidPort(first) and ValidPort(last) and first <= last
+
+    def size(self):
+        return self.last - self.first + 1 if self.valid else 1
+
+    def __iter__(self):
+        if not self.valid:
+            yield {'valid': False, 'port': '{}-{}'.format(self.first, self.last)}
+            return
+
+        for port in range(self.first, self.last + 1):
+            yield {'valid': True, 'port': port}
+
+
+class PrefixHosts(object):
+
+    '''
+    Host addresses of a prefix, yields the same {'result', 'ip_address'} dictionaries as Lookup.get_ip.
+    The network and broadcast addresses are left out, except for /31 and /32 prefixes.
+    size() rather than len(), an IPv6 /64 holds more hosts than len() can return.
+    '''
+
+    def __init__(self, network):
+        self.network = network
+        self.version = network.version
+
+        first = int(network.network)
+        last = int(network.broadcast)
+        if last - first > 1:
+            first, last = first + 1, last - 1
+
+        self.first = first
+        self.last = last
+
+    def size(self):
+        return self.last - self.first + 1
+
+    def __iter__(self):
+        for address in range(self.first, self.last + 1):
+            yield {'result': True, 'ip_address': str(IPAddress(address, self.version))}
+
+
+class Expansion(object):
+
+    '''
+    Re-iterable sequence over a mix of single items and lazy PortRange or PrefixHosts parts.
+    size() is worked out without expanding anything, so a row can be checked against the cap first.
+    '''
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def size(self):
+        return sum(part.size() if isinstance(part, (PortRange, PrefixHosts)) else 1
+                   for part in self.parts)
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, (PortRange, PrefixHosts)):
+                for item in part:
+                    yield item
+            else:
+                yield part
@@ -0,0 +1,189 @@
+from logzero import logger
+from netmiko import ConnectHandler
+from .testcontrol import TestControl
+from .sessionpool import SessionPool
+from .resultcache import ResultCache
+from .journal import ResultJournal
+from .pipeline import PipelinedSession
+from .asyncsession import AsyncSessionPool
+from .timing import timer
+import threading
+import queue
+import yaml
+import sys
+import re
+
+
+def LoadInventory(inventory):
+    '''
+    Loads the YAML inventory file.
+    Each entry is either a host string or a dictionary with "host" and optional "ssh_port".
+    A device is named by its host, "<host>:<ssh_port>" when a port is given, the same device may only be listed once.
+    '''
+
+    with open(inventory, 'r') as yml:
+        entries = yaml.safe_load(yml)
+
+    devices = []
+    names = set()
+    for entry in entries:
+        if isinstance(entry, dict):
+            device = {'host': str(entry['host']), 'ssh_port': entry.get('ssh_port')}
+        else:
+            device = {'host': str(entry), 'ssh_port': None}
+
+        device['name'] = device['host'] if device['ssh_port'] == None else \
+            '{}:{}'.format(device['host'], device['ssh_port'])
+        if device['name'] in names:
+            raise ValueError('Inventory lists {} more than once'.format(device['name']))
+        names.add(device['name'])
+        devices.append(device)
+
+    return devices
+
+
+def DeviceFileName(name):
+    '''
+    The device name as used in report, retry and journal file names, a port separator becomes an underscore.
+    '''
+
+    return re.sub(r'[^\w.\-]+', '_', name)
+
+
+def CombinedResults(results, order):
+    '''
+    Merges jinja2_results keyed by device or context into one jinja2_results style dictionary, in the order given.
+    Interfaces are keyed "<name>_<interface>" and full_stats are summed, names without results are left out.
+    '''
+
+    combined = {}
+    combined['full_stats'] = {'total': 0, 'skip': 0, 'pass': 0, 'fail': 0}
+
+    for name in order:
+        if name not in results:
+            continue
+
+        for interface, data in results[name].items():
+            if interface == 'full_stats':
+                for stat, value in data.items():
+                    combined['full_stats'][stat] = combined['full_stats'].get(stat, 0) + value
+            else:
+                combined['{}_{}'.format(name, interface)] = data
+
+    return combined
+
+
+class FleetControl(object):
+
+    '''
+    Class to execute one constructed testset against many firewalls concurrently
+    '''
+
+    def __init__(self, script_dir, context, devices, device_template, hostfile_status=False, hostfile_list=None,
+                 max_devices=8, sessions=1, parser='textfsm', cache=None, writers=None, resume=False,
+                 pipeline=1, transport='netmiko'):
+        '''
+        devices is the list returned by LoadInventory.
+        device_template is the netmiko device dictionary shared by every firewall, ip and port are set per device.
+        cache is the optional result cache path shared by every device.
+        writers are the streaming outputs shared by every device, rows carry their host.
+        resume replays each device's journal from an interrupted run.
+        pipeline is the number of commands kept in flight when each device has a single session.
+        transport is netmiko, or asyncssh to run every device's sessions on one event loop.
+        '''
+
+        self.script_dir = script_dir
+        self.context = context
+        self.devices = devices
+        self.device_template = device_template
+        self.hostfile_status = hostfile_status
+        self.hostfile_list = hostfile_list
+        self.max_devices = max_devices if max_devices > 0 else 1
+        self.sessions = sessions
+        self.parser = parser
+        self.cache = cache
+        self.writers = writers
+        self.resume = resume
+        self.pipeline = pipeline
+        self.transport = transport
+
+        # per device jinja2_results, keyed by device name
+        self.results = {}
+
+    def _execute_device(self, testset, inventory_item):
+        '''
+        Runs the testset against a single firewall and stores its jinja2_results.
+        '''
+
+        # two entries may share a host on different ports, everything is keyed by the device name
+        host = inventory_item['name']
+        filename = DeviceFileName(host)
+
+        device = dict(self.device_template)
+        device['ip'] = inventory_item['host']
+        if inventory_item['ssh_port'] != None:
+            device['port'] = inventory_item['ssh_port']
+
+        # every device gets its own result store and retry file
+        test_control = TestControl(self.script_dir, self.context, self.hostfile_status, self.hostfile_list,
+                                   retry_name='retry_{}.yml'.format(filename), parser=self.parser,
+                                   result_cache=ResultCache(self.cache, host) if self.cache else None)
+
+        try:
+            logger.info('Attempting connection to {}'.format(host))
+            with timer.stage('connect'):
+                if self.transport == 'asyncssh':
+                    connect = AsyncSessionPool(device, self.sessions).open()
+                elif self.sessions > 1:
+                    connect = SessionPool(device, self.sessions).open()
+                else:
+                    connect = ConnectHandler(**device)
+                    if self.pipeline > 1:
+                        connect = PipelinedSession(connect, self.pipeline)
+
+            try:
+                with ResultJournal('{}/tests/journal_{}.jsonl'.format(self.script_dir, filename), self.resume) as journal:
+                    self.results[host] = test_control.execute(testset, connect, writers=self.writers, host=host,
+                                                              journal=journal)
+            finally:
+                connect.disconnect()
+
+        except Exception:
+            logger.error('{}: {}: {}'.format(
+                host, sys.exc_info()[0], sys.exc_info()[1:]))
+
+    def execute(self, testset):
+        '''
+        Hands each device to a bounded set of workers, at most max_devices run at once.
+        Returns the per device results, devices that failed are omitted.
+        '''
+
+        work = queue.Queue()
+        for inventory_item in self.devices:
+            work.put(inventory_item)
+
+        def _worker():
+            while True:
+                try:
+                    inventory_item = work.get_nowait()
+                except queue.Empty:
+                    break
+                self._execute_device(testset, inventory_item)
+
+        threads = [threading.Thread(target=_worker)
+                   for _ in range(min(self.max_devices, len(self.devices)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return self.results
+
+    def combined_results(self):
+        '''
+        Merges the per device results into one jinja2_results style dictionary, see CombinedResults.
+        '''
+
+        # keep the inventory order in the report, devices that failed have no results
+        return CombinedResults(self.results, [inventory_item['name'] for inventory_item in self.devices
+                                              if inventory_item['name'] in self.results])
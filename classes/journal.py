@@ -0,0 +1,136 @@
+from logzero import logger
+import hashlib
+import json
+import os
+import time
+
+
+def TestletKey(test_data):
+    '''
+    Stable hash of a testlet, the same YAML builds the same keys on every run.
+    '''
+
+    identity = json.dumps([test_data['interface'], test_data['index'], test_data['command'],
+                           test_data['expected_result']], default=str)
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+class ResultJournal(object):
+
+    '''
+    Append-only journal of completed testlet results, so a run that dies part way can be resumed.
+    TestControl.execute grades testlets in testset order, so the journal is always a prefix of the testset.
+    Each line is {"key": TestletKey, "result": TraceResult fields}, lines are fsynced in batches,
+    a crash loses at most one batch.
+
+    With resume the journal is replayed lazily, one line per sent testlet while its key matches.
+    Replay stops at the first line that does not match, such as after the YAML was edited,
+    the journal is cut back to the last matching line and the remaining testlets run as normal.
+    A run that completes removes its journal.
+    '''
+
+    def __init__(self, path, resume=False, batch=100, interval=1.0):
+        self.path = path
+        self.batch = batch
+        self.interval = interval
+
+        self.replayed = 0
+        self.written = 0
+        self.unsynced = 0
+        self.synced = time.time()
+        self.file = None
+
+        if resume and os.path.isfile(path):
+            self.replay_file = open(path, 'r')
+            # offset just after the last replayed line, anything beyond it is cut before appending
+            self.replay_end = 0
+            logger.info('Resuming from journal "{}"'.format(path))
+        else:
+            if resume:
+                logger.error('No journal at "{}", nothing to resume'.format(path))
+            self.replay_file = None
+            self.file = open(path, 'w')
+
+    def replay(self, test_data):
+        '''
+        Returns the journaled result of the next testlet, or None once replay has stopped.
+        '''
+
+        if self.replay_file is None:
+            return None
+
+        line = self.replay_file.readline()
+        try:
+            record = json.loads(line) if line.endswith('\n') else None
+        except ValueError:
+            record = None
+
+        if record is None or record.get('key') != TestletKey(test_data):
+            if line:
+                logger.error('Journal does not match from testlet {}, running the rest again'.format(
+                    self.replayed + 1))
+            self._stop_replay()
+            return None
+
+        self.replay_end = self.replay_file.tell()
+        self.replayed += 1
+        return record['result']
+
+    def _stop_replay(self):
+        self.replay_file.close()
+        self.replay_file = None
+
+        self.file = open(self.path, 'r+')
+        self.file.truncate(self.replay_end)
+        self.file.seek(self.replay_end)
+        logger.info('{} results replayed from the journal'.format(self.replayed))
+
+    def append(self, test_data, result):
+        '''
+        Journals the result of a completed testlet, result is the TraceResult or its dictionary.
+        '''
+
+        if self.file is None:
+            self._stop_replay()
+
+        record = {'key': TestletKey(test_data), 'result': dict(result.items())}
+        self.file.write(json.dumps(record, default=str) + '\n')
+        self.written += 1
+        self.unsynced += 1
+
+        if self.unsynced >= self.batch or time.time() - self.synced >= self.interval:
+            self.sync()
+
+    def sync(self):
+        if self.file is None or not self.unsynced:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced = time.time()
+
+    def complete(self):
+        '''
+        Called once every testlet has a result, the journal is no longer needed.
+        '''
+
+        self.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def close(self):
+        if self.replay_file != None:
+            self.replay_file.close()
+            self.replay_file = None
+        if self.file != None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
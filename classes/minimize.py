@@ -0,0 +1,67 @@
+from bisect import bisect_right
+from logzero import logger
+from .offline import ShowAccessList, IPToInt
+
+
+class RuleClasses(object):
+
+    '''
+    Splits the values of an expanded YAML row into equivalence classes using the ACEs from "show access-list".
+    Two addresses (or ports) in the same class are inside or outside exactly the same ACEs,
+    so flows that only differ within their classes get the same verdict from every access-list.
+    Routing and NAT are not looked at.
+    '''
+
+    def __init__(self, output):
+        '''
+        output is the "show access-list" text.
+        '''
+
+        sources, destinations, ports = set(), set(), set()
+        self.entries = 0
+
+        for acl in ShowAccessList(output).values():
+            for entry in acl.entries:
+                self.entries += 1
+                sources.update((entry[3], entry[4] + 1))
+                destinations.update((entry[7], entry[8] + 1))
+                ports.update((entry[9], entry[10] + 1))
+
+        # the class of a value is the number of boundaries at or below it
+        self.bounds = {
+            'source_ip': sorted(sources),
+            'destination_ip': sorted(destinations),
+            'destination_port': sorted(ports),
+        }
+
+        logger.info('{} ACEs loaded for test minimization'.format(self.entries))
+
+    def _value_class(self, dimension, value):
+        try:
+            if dimension == 'destination_port':
+                return bisect_right(self.bounds[dimension], int(value))
+            return bisect_right(self.bounds[dimension], IPToInt(value))
+        except (OSError, TypeError, ValueError):
+            return None
+
+    def classify(self, dimension, values):
+        '''
+        Takes the values of one dimension of a row in the order they are expanded.
+        Returns a (class, first, boundary) tuple per value, first marks the first value of its class,
+        boundary the first or last one.
+        Values that cannot be classed, such as names that did not resolve, get a class of their own.
+        '''
+
+        classes = []
+        for position, value in enumerate(values):
+            value_class = self._value_class(dimension, value)
+            classes.append(value_class if value_class is not None else ('value', position))
+
+        first, last = {}, {}
+        for position, value_class in enumerate(classes):
+            first.setdefault(value_class, position)
+            last[value_class] = position
+
+        return [(value_class, first[value_class] == position,
+                 first[value_class] == position or last[value_class] == position)
+                for position, value_class in enumerate(classes)]
@@ -0,0 +1,943 @@
+'''
+Offline evaluation of packet-tracer testlets against a saved "show running-config".
+'''
+
+from bisect import bisect_right
+from logzero import logger
+import hashlib
+import socket
+import struct
+import re
+
+MAX_ADDRESS = 0xFFFFFFFF
+ANY_ADDRESS = (0, MAX_ADDRESS)
+ALL_PORTS = (0, 65535)
+
+# entries covering more addresses than this are checked for every flow instead of being indexed
+WIDE_RANGE = 1 << 24
+
+PROTOCOLS = {
+    'ip': None, 'icmp': 1, 'igmp': 2, 'tcp': 6, 'udp': 17, 'gre': 47, 'esp': 50, 'ah': 51,
+    'eigrp': 88, 'ospf': 89, 'pim': 103, 'sctp': 132,
+}
+
+PORTS = {
+    'aol': 5190, 'bgp': 179, 'chargen': 19, 'citrix-ica': 1494, 'cmd': 514, 'ctiqbe': 2748, 'daytime': 13,
+    'discard': 9, 'domain': 53, 'echo': 7, 'exec': 512, 'finger': 79, 'ftp': 21, 'ftp-data': 20, 'gopher': 70,
+    'h323': 1720, 'hostname': 101, 'http': 80, 'https': 443, 'ident': 113, 'imap4': 143, 'irc': 194,
+    'kerberos': 88, 'klogin': 543, 'kshell': 544, 'ldap': 389, 'ldaps': 636, 'login': 513, 'lotusnotes': 1352,
+    'lpd': 515, 'netbios-ssn': 139, 'nfs': 2049, 'nntp': 119, 'pcanywhere-data': 5631, 'pop2': 109,
+    'pop3': 110, 'pptp': 1723, 'rsh': 514, 'rtsp': 554, 'sip': 5060, 'smtp': 25, 'sqlnet': 1521, 'ssh': 22,
+    'sunrpc': 111, 'tacacs': 49, 'talk': 517, 'telnet': 23, 'uucp': 540, 'whois': 43, 'www': 80,
+    'biff': 512, 'bootpc': 68, 'bootps': 67, 'dnsix': 195, 'isakmp': 500, 'mobile-ip': 434, 'nameserver': 42,
+    'netbios-dgm': 138, 'netbios-ns': 137, 'ntp': 123, 'pcanywhere-status': 5632, 'radius': 1645,
+    'radius-acct': 1646, 'rip': 520, 'secureid-udp': 5510, 'snmp': 161, 'snmptrap': 162, 'syslog': 514,
+    'tftp': 69, 'time': 37, 'who': 513, 'xdmcp': 177, 'vxlan': 4789,
+}
+
+ICMP_TYPES = {
+    'echo-reply': 0, 'unreachable': 3, 'source-quench': 4, 'redirect': 5, 'echo': 8, 'router-advertisement': 9,
+    'router-solicitation': 10, 'time-exceeded': 11, 'parameter-problem': 12, 'timestamp-request': 13,
+    'timestamp-reply': 14, 'information-request': 15, 'information-reply': 16, 'mask-request': 17,
+    'mask-reply': 18, 'traceroute': 30,
+}
+
+PORT_OPERATORS = ('eq', 'lt', 'gt', 'neq', 'range')
+
+PROTOCOL_NAMES = dict((number, name) for name, number in PROTOCOLS.items() if number is not None)
+
+
+def IPToInt(address):
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def IntToIP(address):
+    return socket.inet_ntoa(struct.pack('!I', address))
+
+
+def MaskToLength(mask):
+    return bin(IPToInt(mask)).count('1')
+
+
+def NetworkRange(address, mask):
+    '''
+    Returns the (first, last) integers of a network given in dotted mask form.
+    '''
+
+    network = IPToInt(address) & IPToInt(mask)
+    return (network, network | (~IPToInt(mask) & MAX_ADDRESS))
+
+
+def PortNumber(port):
+    return int(port) if port.isdigit() else PORTS[port]
+
+
+def RangeToNetworks(first, last):
+    '''
+    Splits an address range into the fewest "address mask" pairs covering it.
+    '''
+
+    networks = []
+    while first <= last:
+        size = first & -first if first else 1 << 32
+        while first + size - 1 > last:
+            size >>= 1
+        networks.append((IntToIP(first), IntToIP(MAX_ADDRESS ^ (size - 1))))
+        first += size
+    return networks
+
+
+def ShowAccessList(output):
+    '''
+    Parses "show access-list" output into AccessLists keyed by name.
+    Lines naming objects are skipped, the ASA lists their expansion on the indented lines that follow.
+    '''
+
+    config = RunningConfig('')
+    for line in output.splitlines():
+        tokens = line.split()
+        if len(tokens) > 3 and tokens[0] == 'access-list' and 'object' not in tokens \
+                and 'object-group' not in tokens:
+            config._parse_ace(tokens)
+
+    config._compile()
+    return config.access_lists
+
+
+class PrefixTable(object):
+
+    '''
+    Longest prefix match table, one dictionary per prefix length checked from the longest down.
+    '''
+
+    def __init__(self):
+        self.tables = {}
+        self.lengths = []
+
+    def add(self, network, length, value):
+        '''
+        The first route added for a prefix wins, connected routes are added first.
+        '''
+
+        mask = (MAX_ADDRESS << (32 - length)) & MAX_ADDRESS
+        self.tables.setdefault(length, {}).setdefault(network & mask, value)
+        self.lengths = sorted(self.tables, reverse=True)
+
+    def lookup(self, address):
+        for length in self.lengths:
+            value = self.tables[length].get(address & ((MAX_ADDRESS << (32 - length)) & MAX_ADDRESS))
+            if value is not None:
+                return value
+        return None
+
+
+class IntervalIndex(object):
+
+    '''
+    Maps an address to the entries whose (first, last) range covers it, kept in configuration order.
+    Narrow ranges are split into elementary intervals found with bisect, wide ranges such as "any" are kept aside.
+    '''
+
+    def __init__(self, entries):
+        '''
+        entries is an ordered list of (first, last, entry), each entry's first item is its sequence number.
+        '''
+
+        narrow = [item for item in entries if item[1] - item[0] < WIDE_RANGE]
+        self.wide = tuple(item[2] for item in entries if item[1] - item[0] >= WIDE_RANGE)
+
+        bounds = set([0])
+        for first, last, entry in narrow:
+            bounds.add(first)
+            if last < MAX_ADDRESS:
+                bounds.add(last + 1)
+        self.starts = sorted(bounds)
+
+        buckets = [[] for _ in self.starts]
+        for first, last, entry in narrow:
+            for index in range(bisect_right(self.starts, first) - 1, bisect_right(self.starts, last)):
+                buckets[index].append(entry)
+
+        # identical buckets share one tuple
+        shared = {}
+        self.buckets = [shared.setdefault(tuple(id(entry) for entry in bucket), tuple(bucket))
+                        for bucket in buckets]
+
+    def candidates(self, address):
+        '''
+        Returns the narrow entries covering address and the wide entries, both in configuration order.
+        '''
+
+        return self.buckets[bisect_right(self.starts, address) - 1], self.wide
+
+
+class AccessList(object):
+
+    '''
+    A compiled extended access-list.
+    Each ACE is expanded into atomic entries of integer ranges:
+    (sequence, permit, protocol, src_first, src_last, sport_first, sport_last,
+     dst_first, dst_last, dport_first, dport_last, icmp_type, ace_text)
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.entries = []
+        self.index = None
+
+    def compile(self):
+        self.index = IntervalIndex([(entry[7], entry[8], entry) for entry in self.entries])
+
+    def match(self, protocol, src, sport, dst, dport):
+        '''
+        Returns the first matching entry or None when the implicit deny applies.
+        '''
+
+        narrow, wide = self.index.candidates(dst)
+        found = None
+
+        for entries in (narrow, wide):
+            for entry in entries:
+                if found is not None and entry[0] >= found[0]:
+                    break
+                if (entry[2] is None or entry[2] == protocol) and entry[3] <= src <= entry[4] \
+                        and entry[7] <= dst <= entry[8]:
+                    if protocol == 1:
+                        if entry[11] is not None and entry[11] != sport:
+                            continue
+                    elif not (entry[5] <= sport <= entry[6] and entry[9] <= dport <= entry[10]):
+                        continue
+                    found = entry
+                    break
+
+        return found
+
+
+class RunningConfig(object):
+
+    '''
+    Parses the parts of "show running-config" packet-tracer depends on:
+    interfaces, routes, objects, object-groups, access-lists, access-groups and NAT.
+    '''
+
+    def __init__(self, config):
+        '''
+        config is the running-config text.
+        '''
+
+        self.checksum = hashlib.md5(config.encode('utf-8')).hexdigest()
+
+        self.interfaces = {}
+        self.routes = PrefixTable()
+        self.network_objects = {}
+        self.network_groups = {}
+        self.service_objects = {}
+        self.service_groups = {}
+        self.port_groups = {}
+        self.protocol_groups = {}
+        self.icmp_groups = {}
+        self.access_lists = {}
+        self.access_groups = {'in': {}, 'out': {}, 'global': None}
+        self.same_security_inter = False
+        self.same_security_intra = False
+
+        # (section, order, real_if, mapped_if, kind, real ranges, mapped, text)
+        self.nat = []
+
+        self._parse(config.splitlines())
+        self._compile()
+
+    def _blocks(self, lines):
+        '''
+        Groups each top level line with its indented sub-commands.
+        '''
+
+        block = None
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('!') or line.startswith(':'):
+                continue
+            if line.startswith(' '):
+                if block is not None:
+                    block[1].append(line.strip())
+            else:
+                if block is not None:
+                    yield block
+                block = (line, [])
+        if block is not None:
+            yield block
+
+    def _parse(self, lines):
+        routes = []
+
+        for header, children in self._blocks(lines):
+            tokens = header.split()
+
+            if tokens[0] == 'interface':
+                self._parse_interface(children)
+            elif tokens[0] == 'route' and len(tokens) >= 5:
+                routes.append(tokens)
+            elif tokens[0] == 'object' and len(tokens) >= 3:
+                self._parse_object(tokens, children)
+            elif tokens[0] == 'object-group' and len(tokens) >= 3:
+                self._parse_object_group(tokens, children)
+            elif tokens[0] == 'access-list' and len(tokens) >= 3:
+                self._parse_ace(tokens)
+            elif tokens[0] == 'access-group':
+                self._parse_access_group(tokens)
+            elif tokens[0] == 'nat' and len(tokens) >= 2:
+                self._parse_twice_nat(tokens, header)
+            elif header.startswith('same-security-traffic permit inter-interface'):
+                self.same_security_inter = True
+            elif header.startswith('same-security-traffic permit intra-interface'):
+                self.same_security_intra = True
+
+        # connected networks before static routes
+        for nameif, interface in self.interfaces.items():
+            if interface['network'] is not None:
+                self.routes.add(interface['network'][0], interface['length'], nameif)
+        for tokens in routes:
+            try:
+                self.routes.add(IPToInt(tokens[2]), MaskToLength(tokens[3]), tokens[1])
+            except (OSError, ValueError):
+                pass
+
+    def _parse_interface(self, children):
+        interface = {'security_level': 0, 'address': None, 'network': None, 'length': None, 'shutdown': False}
+        nameif = None
+
+        for child in children:
+            tokens = child.split()
+            if tokens[0] == 'nameif':
+                nameif = tokens[1]
+            elif tokens[0] == 'security-level':
+                interface['security_level'] = int(tokens[1])
+            elif tokens[:2] == ['ip', 'address'] and len(tokens) >= 4:
+                try:
+                    interface['address'] = IPToInt(tokens[2])
+                    interface['network'] = NetworkRange(tokens[2], tokens[3])
+                    interface['length'] = MaskToLength(tokens[3])
+                except (OSError, ValueError):
+                    pass
+            elif tokens[0] == 'shutdown':
+                interface['shutdown'] = True
+
+        if nameif is not None:
+            self.interfaces[nameif] = interface
+
+    def _parse_object(self, tokens, children):
+        name = tokens[2]
+
+        if tokens[1] == 'network':
+            ranges = []
+            nats = []
+            for child in children:
+                parts = child.split()
+                if parts[0] == 'host':
+                    ranges.append((IPToInt(parts[1]), IPToInt(parts[1])))
+                elif parts[0] == 'subnet' and '.' in parts[1]:
+                    ranges.append(NetworkRange(parts[1], parts[2]))
+                elif parts[0] == 'range':
+                    ranges.append((IPToInt(parts[1]), IPToInt(parts[2])))
+                elif parts[0] == 'nat':
+                    nats.append((parts, child))
+
+            # a later block holding only the nat statement keeps the addresses
+            if ranges or name not in self.network_objects:
+                self.network_objects[name] = ranges
+
+            # the nat statements need the object's addresses, which may come from this same block
+            for parts, child in nats:
+                self._parse_object_nat(name, parts, child)
+
+        elif tokens[1] == 'service':
+            services = []
+            for child in children:
+                parts = child.split()
+                if parts[0] == 'service':
+                    services.extend(self._service_tokens(parts[1:]))
+            self.service_objects[name] = services
+
+    def _parse_object_group(self, tokens, children):
+        kind, name = tokens[1], tokens[2]
+
+        if kind == 'network':
+            ranges = []
+            for child in children:
+                parts = child.split()
+                if parts[0] == 'network-object':
+                    if parts[1] == 'host':
+                        ranges.append((IPToInt(parts[2]), IPToInt(parts[2])))
+                    elif parts[1] == 'object':
+                        ranges.extend(self.network_objects.get(parts[2], []))
+                    elif '.' in parts[1]:
+                        ranges.append(NetworkRange(parts[1], parts[2]))
+                elif parts[0] == 'group-object':
+                    ranges.extend(self.network_groups.get(parts[1], []))
+            self.network_groups[name] = ranges
+
+        elif kind == 'service' and len(tokens) >= 4:
+            # typed group, port-objects used in the port position of an ACE
+            protocols = [6, 17] if tokens[3] == 'tcp-udp' else [PROTOCOLS[tokens[3]]]
+            ports = []
+            for child in children:
+                parts = child.split()
+                if parts[0] == 'port-object':
+                    ports.extend(self._port_tokens(parts[1:])[0])
+                elif parts[0] == 'group-object':
+                    ports.extend(self.port_groups.get(parts[1], ([], []))[1])
+            self.port_groups[name] = (protocols, ports)
+
+        elif kind == 'service':
+            services = []
+            for child in children:
+                parts = child.split()
+                if parts[0] == 'service-object':
+                    if parts[1] == 'object':
+                        services.extend(self.service_objects.get(parts[2], []))
+                    else:
+                        services.extend(self._service_tokens(parts[1:]))
+                elif parts[0] == 'group-object':
+                    services.extend(self.service_groups.get(parts[1], []))
+            self.service_groups[name] = services
+
+        elif kind == 'protocol':
+            protocols = []
+            for child in children:
+                parts = child.split()
+                if parts[0] == 'protocol-object':
+                    protocols.append(self._protocol(parts[1]))
+                elif parts[0] == 'group-object':
+                    protocols.extend(self.protocol_groups.get(parts[1], []))
+            self.protocol_groups[name] = protocols
+
+        elif kind == 'icmp-type':
+            types = []
+            for child in children:
+                parts = child.split()
+                if parts[0] == 'icmp-object':
+                    types.append(self._icmp_type(parts[1]))
+                elif parts[0] == 'group-object':
+                    types.extend(self.icmp_groups.get(parts[1], []))
+            self.icmp_groups[name] = types
+
+    def _protocol(self, protocol):
+        return int(protocol) if protocol.isdigit() else PROTOCOLS[protocol]
+
+    def _icmp_type(self, icmp_type):
+        return int(icmp_type) if icmp_type.isdigit() else ICMP_TYPES.get(icmp_type)
+
+    def _port_tokens(self, tokens):
+        '''
+        Parses an optional port operator, returns the port ranges and the number of tokens used.
+        '''
+
+        if not tokens or tokens[0] not in PORT_OPERATORS:
+            return [ALL_PORTS], 0
+
+        if tokens[0] == 'range':
+            return [(PortNumber(tokens[1]), PortNumber(tokens[2]))], 3
+
+        port = PortNumber(tokens[1])
+        if tokens[0] == 'eq':
+            return [(port, port)], 2
+        if tokens[0] == 'lt':
+            return [(0, port - 1)], 2
+        if tokens[0] == 'gt':
+            return [(port + 1, 65535)], 2
+        return [(0, port - 1), (port + 1, 65535)], 2
+
+    def _service_tokens(self, tokens):
+        '''
+        Parses "tcp [source op] [destination op]", "icmp [type]" or a protocol,
+        returns (protocol, sport ranges, dport ranges, icmp_type) tuples.
+        '''
+
+        if tokens[0] == 'tcp-udp':
+            protocols = [6, 17]
+        else:
+            protocols = [self._protocol(tokens[0])]
+        tokens = tokens[1:]
+
+        sports, dports, icmp_type = [ALL_PORTS], [ALL_PORTS], None
+        if protocols[0] == 1 and tokens:
+            icmp_type = self._icmp_type(tokens[0])
+        while tokens:
+            if tokens[0] == 'source':
+                sports, used = self._port_tokens(tokens[1:])
+                tokens = tokens[used + 1:]
+            elif tokens[0] == 'destination':
+                dports, used = self._port_tokens(tokens[1:])
+                tokens = tokens[used + 1:]
+            elif tokens[0] in PORT_OPERATORS:
+                dports, used = self._port_tokens(tokens)
+                tokens = tokens[used:]
+            else:
+                tokens = tokens[1:]
+
+        return [(protocol, sports, dports, icmp_type) for protocol in protocols]
+
+    def _address_tokens(self, tokens):
+        '''
+        Parses an ACE address, returns the address ranges and the number of tokens used.
+        '''
+
+        if tokens[0] in ('any', 'any4'):
+            return [ANY_ADDRESS], 1
+        if tokens[0] == 'any6':
+            return [], 1
+        if tokens[0] == 'host':
+            return [(IPToInt(tokens[1]), IPToInt(tokens[1]))], 2
+        if tokens[0] == 'object':
+            return self.network_objects.get(tokens[1], []), 2
+        if tokens[0] == 'object-group':
+            return self.network_groups.get(tokens[1], []), 2
+        if tokens[0] == 'interface':
+            address = self.interfaces.get(tokens[1], {}).get('address')
+            return ([(address, address)] if address is not None else []), 2
+        return [NetworkRange(tokens[0], tokens[1])], 2
+
+    def _ace_ports(self, tokens):
+        '''
+        Parses an optional ACE port position, which may also be a typed service object-group.
+        '''
+
+        if len(tokens) >= 2 and tokens[0] == 'object-group' and tokens[1] in self.port_groups:
+            return self.port_groups[tokens[1]][1], 2
+        if tokens and tokens[0] in PORT_OPERATORS:
+            return self._port_tokens(tokens)
+        return None, 0
+
+    def _parse_ace(self, tokens):
+        name = tokens[1]
+        tokens = tokens[2:]
+
+        # access-list NAME [line N] extended ...
+        if tokens[0] == 'line':
+            tokens = tokens[2:]
+        if not tokens or tokens[0] != 'extended' or 'inactive' in tokens:
+            return
+        text = 'access-list {} {}'.format(name, ' '.join(tokens))
+        tokens = tokens[1:]
+
+        acl = self.access_lists.setdefault(name, AccessList(name))
+        sequence = len(acl.entries)
+
+        try:
+            permit = tokens[0] == 'permit'
+            tokens = tokens[1:]
+
+            # protocol position
+            if tokens[0] == 'object':
+                services = self.service_objects.get(tokens[1], [])
+                tokens = tokens[2:]
+            elif tokens[0] == 'object-group' and tokens[1] in self.protocol_groups:
+                services = [(protocol, [ALL_PORTS], [ALL_PORTS], None)
+                            for protocol in self.protocol_groups[tokens[1]]]
+                tokens = tokens[2:]
+            elif tokens[0] == 'object-group':
+                services = self.service_groups.get(tokens[1], [])
+                tokens = tokens[2:]
+            else:
+                services = [(self._protocol(tokens[0]), [ALL_PORTS], [ALL_PORTS], None)]
+                tokens = tokens[1:]
+
+            sources, used = self._address_tokens(tokens)
+            tokens = tokens[used:]
+            sports, used = self._ace_ports(tokens)
+            tokens = tokens[used:]
+
+            destinations, used = self._address_tokens(tokens)
+            tokens = tokens[used:]
+            dports, used = self._ace_ports(tokens)
+            tokens = tokens[used:]
+
+            # icmp type or icmp-type object-group after the destination
+            icmp_types = None
+            if tokens and tokens[0] == 'object-group' and tokens[1] in self.icmp_groups:
+                icmp_types = self.icmp_groups[tokens[1]]
+            elif tokens and tokens[0] not in ('log', 'time-range', 'inactive'):
+                icmp_type = self._icmp_type(tokens[0])
+                icmp_types = [icmp_type] if icmp_type is not None else None
+
+        except (IndexError, KeyError, OSError, ValueError):
+            logger.error('Offline: unable to parse "{}", skipped'.format(text))
+            return
+
+        for protocol, service_sports, service_dports, service_icmp in services:
+            types = icmp_types if icmp_types is not None else [service_icmp]
+            for src_first, src_last in sources:
+                for sport_first, sport_last in (sports if sports is not None else service_sports):
+                    for dst_first, dst_last in destinations:
+                        for dport_first, dport_last in (dports if dports is not None else service_dports):
+                            for icmp_type in types:
+                                acl.entries.append((sequence, permit, protocol, src_first, src_last,
+                                                    sport_first, sport_last, dst_first, dst_last,
+                                                    dport_first, dport_last, icmp_type, text))
+
+    def _parse_access_group(self, tokens):
+        if len(tokens) >= 3 and tokens[2] == 'global':
+            self.access_groups['global'] = tokens[1]
+        elif len(tokens) >= 5 and tokens[2] in ('in', 'out'):
+            self.access_groups[tokens[2]][tokens[4]] = tokens[1]
+
+    def _nat_interfaces(self, token):
+        real_if, mapped_if = token.strip('()').split(',')
+        return real_if, mapped_if
+
+    def _nat_mapped(self, token):
+        '''
+        The mapped side of a NAT rule, "interface", an object or an IP literal.
+        '''
+
+        if token == 'interface':
+            return 'interface'
+        if token in self.network_objects:
+            return self.network_objects[token]
+        if token in self.network_groups:
+            return self.network_groups[token]
+        return [(IPToInt(token), IPToInt(token))]
+
+    def _parse_object_nat(self, name, parts, text):
+        try:
+            real_if, mapped_if = self._nat_interfaces(parts[1])
+            kind = parts[2]
+            mapped = self._nat_mapped(parts[3])
+        except (IndexError, KeyError, OSError, ValueError):
+            return
+
+        real = self.network_objects.get(name, [])
+        if not real:
+            return
+
+        # object NAT sits between the two twice NAT sections, static first then the most specific
+        size = min(last - first for first, last in real)
+        order = (0 if kind == 'static' else 1, size)
+        self.nat.append((2, order, real_if, mapped_if, kind, real, mapped, text))
+
+    def _parse_twice_nat(self, tokens, text):
+        try:
+            real_if, mapped_if = self._nat_interfaces(tokens[1])
+            tokens = tokens[2:]
+            section = 1
+            if tokens and tokens[0] == 'after-auto':
+                section = 3
+                tokens = tokens[1:]
+            if tokens and tokens[0] == 'line':
+                tokens = tokens[2:]
+            if tokens[0] != 'source':
+                return
+            kind = tokens[1]
+            real = self._address_tokens(tokens[2:])[0] if tokens[2] in ('any', 'any4') \
+                else self._nat_mapped(tokens[2])
+            mapped = self._nat_mapped(tokens[3])
+        except (IndexError, KeyError, OSError, ValueError):
+            return
+
+        if real == 'interface':
+            return
+        self.nat.append((section, (len(self.nat),), real_if, mapped_if, kind, real, mapped, text))
+
+    def _compile(self):
+        for acl in self.access_lists.values():
+            acl.compile()
+        self.nat.sort(key=lambda rule: (rule[0], rule[1]))
+
+        # NAT rules indexed by real address for source translation, static rules by mapped address for un-NAT
+        self.source_nat = IntervalIndex([(first, last, (sequence, rule))
+                                         for sequence, rule in enumerate(self.nat) for first, last in rule[5]])
+        self.destination_nat = IntervalIndex([(first, last, (sequence, rule))
+                                              for sequence, rule in enumerate(self.nat)
+                                              if rule[4] == 'static' and rule[6] != 'interface'
+                                              for first, last in rule[6]])
+
+
+class OfflineASA(object):
+
+    '''
+    Evaluates testlets against a RunningConfig instead of a live ASA.
+    Also stands in for a netmiko session, send_command answers packet-tracer, show checksum and show access-list.
+    '''
+
+    def __init__(self, running_config):
+        self.config = running_config
+
+    def _translate(self, rule, address, mapped_if):
+        '''
+        Returns the address a NAT rule maps the real address to.
+        '''
+
+        if rule[6] == 'interface':
+            return self.config.interfaces.get(mapped_if, {}).get('address')
+
+        mapped_first, mapped_last = rule[6][0]
+        if rule[4] == 'static':
+            for real_first, real_last in rule[5]:
+                if real_first <= address <= real_last and mapped_last - mapped_first == real_last - real_first:
+                    return mapped_first + (address - real_first)
+        return mapped_first
+
+    def _first_rule(self, index, address, real_interface, mapped_interface):
+        '''
+        Returns the first NAT rule in the index covering address for the interface pair.
+        '''
+
+        found = None
+        for entries in index.candidates(address):
+            for sequence, rule in entries:
+                if found is not None and sequence >= found[0]:
+                    break
+                # a rule's interface of any matches every flow, un-NAT has no real interface to check
+                if real_interface is not None and rule[2] not in (real_interface, 'any'):
+                    continue
+                if rule[3] not in (mapped_interface, 'any'):
+                    continue
+                for first, last in (rule[5] if real_interface is not None else rule[6]):
+                    if first <= address <= last:
+                        found = (sequence, rule)
+                        break
+                if found is not None and found[1] is rule:
+                    break
+
+        return found[1] if found is not None else None
+
+    def _source_nat(self, input_interface, output_interface, src):
+        rule = self._first_rule(self.config.source_nat, src, input_interface, output_interface)
+        if rule is None:
+            return None, None
+        return rule, self._translate(rule, src, output_interface)
+
+    def _destination_unnat(self, input_interface, dst):
+        '''
+        Static rules whose mapped address is the destination, returns the rule and the real address.
+        '''
+
+        rule = self._first_rule(self.config.destination_nat, dst, None, input_interface)
+        if rule is None:
+            return None, None
+
+        for mapped_first, mapped_last in rule[6]:
+            if mapped_first <= dst <= mapped_last:
+                return rule, rule[5][0][0] + (dst - mapped_first)
+
+    def _access_list(self, name, protocol, src, sport, dst, dport):
+        acl = self.config.access_lists.get(name)
+        if acl is None:
+            return None
+        return acl.match(protocol, src, sport, dst, dport)
+
+    def _drop(self, input_interface, drop_reason=None):
+        return {
+            'nat_from': None, 'nat_to': None, 'nat_rule': None,
+            'input_interface': input_interface, 'input_interface_status': None,
+            'input_interface_line_status': None, 'output_interface': None, 'output_interface_status': None,
+            'output_interface_line_status': None, 'asa_action': 'drop', 'drop_reason': drop_reason
+        }
+
+    def evaluate(self, input_interface, protocol, src, sport, dst, dport):
+        '''
+        Returns the same dictionary as ASAPolicyTest.TestResult.
+        protocol is a name or number, for icmp sport carries the icmp type.
+        '''
+
+        result = self._drop(input_interface)
+
+        interface = self.config.interfaces.get(input_interface)
+        if interface is None:
+            result['drop_reason'] = '(ifc-unknown) Input interface {} is not in the running-config'.format(
+                input_interface)
+            return result
+
+        status = 'down' if interface['shutdown'] else 'up'
+        result['input_interface_status'] = status
+        result['input_interface_line_status'] = status
+        if interface['shutdown']:
+            result['drop_reason'] = '(ifc-down) Interface is down'
+            return result
+
+        protocol = protocol if isinstance(protocol, int) else PROTOCOLS.get(str(protocol).lower(), protocol)
+        src = IPToInt(src) if isinstance(src, str) else src
+        dst = IPToInt(dst) if isinstance(dst, str) else dst
+        sport = int(sport) if sport not in (None, '') else 0
+        dport = int(dport) if dport not in (None, '') else 0
+
+        # un-NAT the destination, a static rule diverts to its real interface
+        unnat_rule, real_dst = self._destination_unnat(input_interface, dst)
+        if unnat_rule is not None:
+            result['nat_from'] = '{}/{}'.format(IntToIP(dst), dport)
+            result['nat_to'] = '{}/{}'.format(IntToIP(real_dst), dport)
+            result['nat_rule'] = unnat_rule[7]
+            output_interface = unnat_rule[2] if unnat_rule[2] != 'any' else self.config.routes.lookup(real_dst)
+        else:
+            real_dst = dst
+            output_interface = self.config.routes.lookup(dst)
+
+        if output_interface is None or output_interface not in self.config.interfaces:
+            result['drop_reason'] = '(no-route) No route to host'
+            return result
+
+        egress = self.config.interfaces[output_interface]
+        egress_status = 'down' if egress['shutdown'] else 'up'
+        result['output_interface'] = output_interface
+        result['output_interface_status'] = egress_status
+        result['output_interface_line_status'] = egress_status
+
+        # inbound access-list, then global, else security levels decide
+        acl_name = self.config.access_groups['in'].get(input_interface)
+        entry = self._access_list(acl_name, protocol, src, sport, real_dst, dport) if acl_name else None
+        if entry is None and self.config.access_groups['global']:
+            entry = self._access_list(self.config.access_groups['global'], protocol, src, sport, real_dst, dport)
+            acl_name = acl_name or self.config.access_groups['global']
+
+        if acl_name:
+            permitted = entry is not None and entry[1]
+        elif input_interface == output_interface:
+            permitted = self.config.same_security_intra
+        elif interface['security_level'] == egress['security_level']:
+            permitted = self.config.same_security_inter
+        else:
+            permitted = interface['security_level'] > egress['security_level']
+
+        if not permitted:
+            result['drop_reason'] = '(acl-drop) Flow is denied by configured rule'
+            return result
+
+        # outbound access-list on the egress interface
+        out_acl = self.config.access_groups['out'].get(output_interface)
+        if out_acl:
+            entry = self._access_list(out_acl, protocol, src, sport, real_dst, dport)
+            if entry is None or not entry[1]:
+                result['drop_reason'] = '(acl-drop) Flow is denied by configured rule'
+                return result
+
+        if egress['shutdown']:
+            result['drop_reason'] = '(ifc-down) Interface is down'
+            return result
+
+        # source translation
+        nat_rule, mapped_src = self._source_nat(input_interface, output_interface, src)
+        if nat_rule is not None and mapped_src is not None:
+            result['nat_from'] = '{}/{}'.format(IntToIP(src), sport)
+            result['nat_to'] = '{}/{}'.format(IntToIP(mapped_src), sport)
+            result['nat_rule'] = nat_rule[7]
+
+        result['asa_action'] = 'allow'
+        return result
+
+    def evaluate_command(self, command):
+        '''
+        Evaluates a packet-tracer command as built by TestControl._append_testlet.
+        '''
+
+        tokens = command.split()
+        interface, protocol = tokens[2], tokens[3]
+
+        if protocol == 'raw':
+            return self.evaluate(interface, int(tokens[5]), tokens[4], 0, tokens[6], 0)
+        if protocol == 'icmp':
+            return self.evaluate(interface, 'icmp', tokens[4], tokens[5], tokens[7], 0)
+        return self.evaluate(interface, protocol, tokens[4], tokens[5], tokens[6], tokens[7])
+
+    def trace(self, command):
+        '''
+        Returns the evaluate dictionary for a packet-tracer command, TestControl uses it directly without
+        rendering and parsing any output. None for a command send_command would refuse.
+        Flows the model cannot evaluate, such as IPv6 addresses, are graded as an unsupported drop.
+        '''
+
+        if not command.startswith('packet-tracer input'):
+            return None
+        try:
+            return self.evaluate_command(command)
+        except (IndexError, KeyError, OSError, ValueError):
+            logger.error('Offline evaluation does not support "{}", graded as a drop'.format(command))
+            tokens = command.split()
+            return self._drop(tokens[2] if len(tokens) > 2 else None,
+                              '(unsupported) Offline evaluation covers IPv4 tcp, udp, icmp and esp flows only')
+
+    def send_command(self, command):
+        '''
+        Renders the evaluation as packet-tracer detail output, so execute and the parsers work unchanged.
+        '''
+
+        command = command.strip()
+        if command == 'show checksum':
+            return 'Cryptochecksum: {}\n'.format(self.config.checksum)
+        if command == 'show access-list':
+            return self.show_access_list()
+        result = self.trace(command)
+        if result is None:
+            return "ERROR: % Invalid input detected at '^' marker.\n"
+
+        lines = ['Phase: 1', 'Type: OFFLINE', 'Subtype: running-config',
+                 'Result: {}'.format(result['asa_action'].upper()), 'Config:']
+        if result['nat_rule']:
+            lines.append(' {}'.format(result['nat_rule']))
+        lines.append('Additional Information:')
+        if result['nat_from']:
+            lines.append('Offline translate {} to {}'.format(result['nat_from'], result['nat_to']))
+        lines += ['', 'Result:']
+        for field, key in (('input-interface', 'input_interface'), ('input-status', 'input_interface_status'),
+                           ('input-line-status', 'input_interface_line_status'),
+                           ('output-interface', 'output_interface'), ('output-status', 'output_interface_status'),
+                           ('output-line-status', 'output_interface_line_status')):
+            if result[key]:
+                lines.append('{}: {}'.format(field, result[key]))
+        lines.append('Action: {}'.format(result['asa_action']))
+        if result['drop_reason']:
+            lines.append('Drop-reason: {}'.format(result['drop_reason']))
+
+        return '\n'.join(lines) + '\n'
+
+    def show_access_list(self):
+        '''
+        Renders the compiled access-lists the way the ASA does, object references expanded on indented lines.
+        '''
+
+        def _address(first, last):
+            if (first, last) == ANY_ADDRESS:
+                return ['any']
+            return ['host {}'.format(address) if mask == '255.255.255.255' else '{} {}'.format(address, mask)
+                    for address, mask in RangeToNetworks(first, last)]
+
+        def _port(first, last):
+            if (first, last) == ALL_PORTS:
+                return ''
+            if first == last:
+                return ' eq {}'.format(first)
+            return ' range {} {}'.format(first, last)
+
+        lines = ['access-list cached ACL log flows: total 0, denied 0 (deny-flow-max 4096)']
+        for name, acl in self.config.access_lists.items():
+
+            lines.append('access-list {}; {} elements; name hash: 0x00000000'.format(name, len(acl.entries)))
+            shown = None
+            line = 0
+
+            for entry in acl.entries:
+                sequence, permit, protocol = entry[0], entry[1], entry[2]
+                text = entry[12].split(' ', 2)[2]
+                objects = 'object' in text.split() or 'object-group' in text.split()
+
+                if sequence != shown:
+                    shown = sequence
+                    line += 1
+                    lines.append('access-list {} line {} {} (hitcnt=0) 0x00000000'.format(name, line, text))
+                if not objects:
+                    continue
+
+                service = PROTOCOL_NAMES.get(protocol, str(protocol)) if protocol is not None else 'ip'
+                for src in _address(entry[3], entry[4]):
+                    for dst in _address(entry[7], entry[8]):
+                        ace = '{} {}{} {}'.format(service, src, _port(entry[5], entry[6]), dst)
+                        if protocol == 1:
+                            ace += ' {}'.format(entry[11]) if entry[11] is not None else ''
+                        elif protocol in (6, 17):
+                            ace += _port(entry[9], entry[10])
+                        lines.append('  access-list {} line {} extended {} {} (hitcnt=0) 0x00000000'.format(
+                            name, line, 'permit' if permit else 'deny', ace))
+
+        return '\n'.join(lines) + '\n'
+
+    def disconnect(self):
+        pass
@@ -0,0 +1,166 @@
+from abc import ABC, abstractmethod
+from logzero import logger
+from xml.sax.saxutils import escape, quoteattr
+import csv
+import json
+import threading
+import time
+from .records import TestRow
+
+
+def OpenWriters(jsonl=None, junit=None, csv_path=None):
+    '''
+    Returns the writers asked for on the command line, paths left as None are not opened.
+    '''
+
+    writers = []
+    if jsonl:
+        writers.append(JsonLinesWriter(jsonl))
+    if junit:
+        writers.append(JUnitWriter(junit))
+    if csv_path:
+        writers.append(CsvWriter(csv_path))
+    return writers
+
+
+class ResultWriter(ABC):
+
+    '''
+    Base for the streaming result outputs, subclasses implement _write() for one record.
+    TestControl.execute calls write() once per testlet as it finishes, nothing is kept in memory.
+    The file is flushed at most every flush_interval seconds so other tools can follow it during a run.
+    Fleet workers share one writer, writes are serialised with a lock.
+    '''
+
+    COLUMNS = ('host', 'interface', 'expected', 'index', 'grade') + tuple(
+        column for column in TestRow.FIELDS if column not in ('interface', 'index', 'grade'))
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.file = open(path, 'w', newline='')
+        self.lock = threading.Lock()
+        self.records = 0
+        self.flushed = time.time()
+        self._start()
+
+    def record(self, row, should, host=None):
+        '''
+        Flattens a result row into a dictionary of COLUMNS, the yaml_row is kept as a dictionary.
+        '''
+
+        record = {'host': host, 'expected': should}
+        for column in self.COLUMNS:
+            if column not in record:
+                record[column] = row[column]
+        return record
+
+    def write(self, row, should, host=None):
+        record = self.record(row, should, host)
+        with self.lock:
+            self._write(record)
+            self.records += 1
+            if time.time() - self.flushed >= self.flush_interval:
+                self.file.flush()
+                self.flushed = time.time()
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self._finish()
+            self.file.close()
+        logger.info('{} records written to "{}"'.format(self.records, self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start(self):
+        pass
+
+    @abstractmethod
+    def _write(self, record):
+        pass
+
+    def _finish(self):
+        pass
+
+
+class JsonLinesWriter(ResultWriter):
+
+    '''
+    One JSON object per line.
+    '''
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+
+class CsvWriter(ResultWriter):
+
+    '''
+    CSV with a header row, the yaml_row column holds the YAML row as JSON.
+    '''
+
+    def _start(self):
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.COLUMNS)
+
+    def _write(self, record):
+        record['yaml_row'] = json.dumps(record['yaml_row'], default=str)
+        self.writer.writerow([record[column] for column in self.COLUMNS])
+
+
+class JUnitWriter(ResultWriter):
+
+    '''
+    JUnit XML, one testcase per testlet, named after its packet-tracer command.
+    The testsuite counts are only known at the end, the testsuite line is written with room to spare
+    and rewritten in place by close(), so testcases can still be streamed.
+    '''
+
+    COUNTS = ('tests', 'failures', 'skipped')
+    WIDTH = 12
+
+    def _start(self):
+        self.counts = {count: 0 for count in self.COUNTS}
+
+        self.file.write('<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n')
+        self.counts_at = self.file.tell()
+        self.file.write(self._testsuite() + '\n')
+
+    def _testsuite(self):
+        counts = ' '.join('{}="{}"'.format(count, self.counts[count]) for count in self.COUNTS)
+        # padded after the attributes rather than inside them, so the line length never changes
+        padding = ' ' * sum(self.WIDTH - len(str(self.counts[count])) for count in self.COUNTS)
+        return '  <testsuite name="cisco-asa-policy-tester" {}{}>'.format(counts, padding)
+
+    def _write(self, record):
+        self.counts['tests'] += 1
+
+        classname = '.'.join(str(part) for part in (record['host'], record['interface'], record['expected'])
+                             if part != None)
+        self.file.write('    <testcase classname={} name={}>'.format(
+            quoteattr(classname), quoteattr(str(record['command']))))
+
+        details = escape('\n'.join('{}: {}'.format(column, record[column]) for column in self.COLUMNS))
+
+        if record['grade'] == '[FAIL]':
+            self.counts['failures'] += 1
+            self.file.write('\n      <failure message={}>{}</failure>\n    '.format(
+                quoteattr('expected {}, ASA reports {}'.format(record['expected_result'], record['asa_action'])),
+                details))
+        elif record['grade'] == '[SKIP]':
+            self.counts['skipped'] += 1
+            self.file.write('\n      <skipped message={}/>\n      <system-out>{}</system-out>\n    '.format(
+                quoteattr('unable to resolve address(es) or invalid port'), details))
+
+        self.file.write('</testcase>\n')
+
+    def _finish(self):
+        self.file.write('  </testsuite>\n</testsuites>\n')
+        self.file.seek(self.counts_at)
+        self.file.write(self._testsuite())
@@ -3,14 +3,28 @@ The TextFSM class for parsing CLI outputs.
 '''
 
 import textfsm
+import threading
+import io
+import re
 from logzero import logger
 
+# template text keyed by template path, read once per process
+_template_texts = {}
+_template_texts_lock = threading.Lock()
+
+# a TextFSM instance keeps its parse state, so every thread compiles its own from the cached text
+_compiled_templates = threading.local()
+
 def FileToMultiLineString(cli_output):
         
     '''
     Take the file and convert it to a mutliline string.
     '''
     
+    # netmiko already hands back a string, only join real line iterables
+    if isinstance(cli_output, str):
+        return cli_output
+
     data = ''.join(line for line in cli_output)
     return data
 
@@ -29,10 +43,24 @@ class TextFSMParser(object):
         
         '''
         Create the table and return headers and values.
+        The template is read once per process and compiled once per thread, each parse starts from a reset state.
+        Threads parse concurrently, the lock is only held while the template text is cached.
         '''
 
-        with open(self.template, 'r') as template:
-            re_table = textfsm.TextFSM(template)
+        tables = getattr(_compiled_templates, 'tables', None)
+        if tables is None:
+            tables = _compiled_templates.tables = {}
+
+        re_table = tables.get(self.template)
+        if re_table is None:
+            with _template_texts_lock:
+                text = _template_texts.get(self.template)
+                if text is None:
+                    with open(self.template, 'r') as template:
+                        text = _template_texts[self.template] = template.read()
+            re_table = tables[self.template] = textfsm.TextFSM(io.StringIO(text))
+
+        re_table.Reset()
         results = re_table.ParseText(self.cli_output)
         headers = ', '.join(re_table.header)
         
@@ -42,3 +70,108 @@ class TextFSMParser(object):
         }
         
         return  mydict
+
+
+class PacketTracerParser(object):
+
+    '''
+    Single pass parser for "packet-tracer ... detail" output.
+    Mirrors templates_textfsm/asa_packet_tracer rule for rule and returns the same table as TextFSMParser,
+    reading stops at Drop-reason or at the blank line ending the block holding Action.
+    The template keeps reading to the end of the output, so a nat or translate line after the Result block
+    only reaches the TextFSM results. packet-tracer prints nothing there, unittests/test_parser.py checks both agree.
+    '''
+
+    header = ['NAT_FROM', 'NAT_TO', 'NAT_RULE', 'INPUT_INTERFACE', 'INPUT_STATUS', 'INPUT_LINE_STATUS',
+              'OUTPUT_INTERFACE', 'OUTPUT_STATUS', 'OUTPUT_LINE_STATUS', 'ACTION', 'DROP_REASON']
+
+    nat_rule = re.compile(r'.+(nat\s.*)')
+    translate = re.compile(
+        r'.+translate (\d+\.\d+\.\d+\.\d+/\d+) to (\d+\.\d+\.\d+\.\d+/\d+)')
+    word = re.compile(r'\S+')
+
+    # line prefix and the column it fills, same order as the template
+    fields = (
+        ('input-interface: ', 3),
+        ('input-status: ', 4),
+        ('input-line-status: ', 5),
+        ('output-interface: ', 6),
+        ('output-status: ', 7),
+        ('output-line-status: ', 8),
+        ('Action: ', 9),
+    )
+
+    def __init__(self, cli_output):
+
+        '''
+        Initiate the variables.
+        '''
+
+        self.cli_output = cli_output
+
+    def Parser(self):
+
+        '''
+        Walk the output line by line and return headers and values.
+        '''
+
+        text = self.cli_output
+        record = [None] * len(self.header)
+        started = False
+        action_seen = False
+
+        start = 0
+        end = len(text)
+        while start < end:
+            stop = text.find('\n', start)
+            if stop == -1:
+                stop = end
+            line = text[start:stop].rstrip('\r')
+            start = stop + 1
+
+            # Start state, wait for the first phase or result
+            if not started:
+                if line.startswith('Phase: 1') or line.startswith('Result'):
+                    started = True
+                continue
+
+            # the Result block is over once Action has been read
+            if action_seen and not line:
+                break
+
+            if 'nat' in line:
+                match = self.nat_rule.match(line)
+                if match:
+                    record[2] = match.group(1)
+                    continue
+
+            if 'translate ' in line:
+                match = self.translate.match(line)
+                if match:
+                    record[0] = match.group(1)
+                    record[1] = match.group(2)
+                    continue
+
+            if line.startswith('Drop-reason: '):
+                record[10] = line[len('Drop-reason: '):]
+                break
+
+            for prefix, column in self.fields:
+                if line.startswith(prefix):
+                    match = self.word.match(line, len(prefix))
+                    if match:
+                        record[column] = match.group(0)
+                        action_seen = action_seen or column == 9
+                    break
+
+        # an all empty record is not output, same as TextFSM
+        results = []
+        if record.count(None) != len(record):
+            results.append([value if value is not None else '' for value in record])
+
+        mydict = {
+            'headers': ', '.join(self.header),
+            'results': results
+        }
+
+        return mydict
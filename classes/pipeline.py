@@ -0,0 +1,140 @@
+from logzero import logger
+from collections import deque
+import re
+import time
+
+
+def PromptPattern(prompt):
+    '''
+    Regex for the prompt at the start of a line, it ends the output of the command before it.
+    '''
+
+    return re.compile(r'(?:^|\n){}[ \t]*'.format(re.escape(prompt.strip())))
+
+
+def TakeOutput(state, command):
+    '''
+    Takes the output of command off the front of state['buffer'], without the echo and prompt.
+    Returns None until a whole output has arrived.
+    Segments that do not start with the echo of command, such as prompts left by find_prompt, are dropped.
+    '''
+
+    while True:
+        match = state['prompt'].search(state['buffer'])
+        if not match:
+            return None
+
+        segment = state['buffer'][:match.start()]
+        state['buffer'] = state['buffer'][match.end():]
+
+        echo, _, output = segment.partition('\n')
+        if echo.strip() == command:
+            return output
+
+
+def NormalizeLines(text):
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+class PipelinedSession(object):
+
+    '''
+    Wraps a single netmiko session and keeps up to window commands in flight on its channel.
+    send_command waits for the prompt before the next command can go, so every testlet costs a round trip.
+    Here the next commands are already queued in the channel while the ASA works on the current one,
+    the combined output is split back into one output per command on the prompt that ends each one.
+    '''
+
+    def __init__(self, connect, window=8, timeout=60):
+        '''
+        connect is an open netmiko session, timeout is how long a command may go without any output.
+        '''
+
+        self.connect = connect
+        self.window = window if window > 0 else 1
+        self.timeout = timeout
+
+        # seconds the ASA spent on the command whose output send_commands last yielded
+        self.last_latency = None
+
+    def send_command(self, command):
+        return self.connect.send_command(command)
+
+    def disconnect(self):
+        self.connect.disconnect()
+
+    def _next_output(self, state, command):
+        '''
+        Reads the channel until the output of command is complete.
+        '''
+
+        started = time.time()
+        while True:
+            output = TakeOutput(state, command)
+            if output is not None:
+                return output
+
+            data = self.connect.read_channel()
+            if data:
+                state['buffer'] += NormalizeLines(data)
+                started = time.time()
+            elif time.time() - started > self.timeout:
+                raise IOError('No output for "{}" from {} after {} seconds'.format(
+                    command, self.connect.host, self.timeout))
+            else:
+                time.sleep(0.005)
+
+    def send_commands(self, commands):
+        '''
+        Generator, yields the output of each command in the order given, None for a None command.
+        '''
+
+        prompt = self.connect.find_prompt()
+        state = {
+            'buffer': '',
+            'prompt': PromptPattern(prompt),
+        }
+        logger.info('Pipelining up to {} commands on the session to {}'.format(self.window, self.connect.host))
+
+        # (command, time written) sent or passed through, oldest first
+        pending = deque()
+        commands = iter(commands)
+        exhausted = False
+
+        # a command only starts once the output before it is complete
+        answered = time.time()
+
+        try:
+            while True:
+                while not exhausted and len(pending) < self.window:
+                    try:
+                        command = next(commands)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if command is not None:
+                        self.connect.write_channel(command + self.connect.RETURN)
+                    pending.append((command, time.time()))
+
+                if not pending:
+                    break
+
+                command, written = pending.popleft()
+                if command is None:
+                    self.last_latency = None
+                    yield None
+                    continue
+
+                output = self._next_output(state, command)
+                self.last_latency = time.time() - max(written, answered)
+                answered = time.time()
+                yield output
+
+        finally:
+            # leave the channel at a prompt if the run stops with commands still in flight
+            try:
+                for command, written in pending:
+                    if command is not None:
+                        self._next_output(state, command)
+            except Exception:
+                pass
@@ -0,0 +1,178 @@
+class ValueTable(object):
+
+    '''
+    Lookup table for values shared by many testlets.
+    shared() returns one canonical object for equal values, number() gives a value a small integer
+    so a spooled row can refer to its yaml_row instead of repeating it.
+    Values are held for the whole run, only low-cardinality ones such as interfaces, protocols and actions
+    are shared, never addresses.
+    '''
+
+    def __init__(self):
+        self.shared_values = {}
+
+        # number -> value, and id(value) -> number for the unhashable yaml rows
+        self.values = []
+        self.numbers = {}
+
+    def shared(self, value):
+        try:
+            return self.shared_values.setdefault(value, value)
+        except TypeError:
+            return value
+
+    def number(self, value):
+        number = self.numbers.get(id(value))
+        if number is None:
+            # the list keeps the value alive so its id is never reused
+            number = self.numbers[id(value)] = len(self.values)
+            self.values.append(value)
+        return number
+
+    def __getitem__(self, number):
+        return self.values[number]
+
+
+class Record(object):
+
+    '''
+    Base for the slotted records, gives dictionary style access so record['key'] keeps working.
+    Jinja2 reads the same fields as attributes.
+    '''
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return list(self.FIELDS)
+
+    def items(self):
+        return [(key, self[key]) for key in self.FIELDS]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        return self.items() == [(key, other[key]) for key in self.FIELDS] \
+            if hasattr(other, 'keys') else NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.to_dict())
+
+
+class Testlet(Record):
+
+    '''
+    A single packet-tracer test built from one YAML row.
+    '''
+
+    FIELDS = ('interface', 'index', 'protocol', 'source_ip', 'source_port', 'icmp_type', 'icmp_code',
+              'destination_ip', 'destination_port', 'expected_result', 'execute', 'yaml_row', 'command',
+              'duplicate', 'inferred')
+    __slots__ = FIELDS
+
+    def __init__(self, interface, index, protocol, source_ip, source_port, icmp_type, icmp_code,
+                 destination_ip, destination_port, expected_result, execute, yaml_row, command,
+                 duplicate=False, inferred=None):
+
+        self.interface = interface
+        self.index = index
+        self.protocol = protocol
+        self.source_ip = source_ip
+        self.source_port = source_port
+        self.icmp_type = icmp_type
+        self.icmp_code = icmp_code
+        self.destination_ip = destination_ip
+        self.destination_port = destination_port
+        self.expected_result = expected_result
+        self.execute = execute
+        self.yaml_row = yaml_row
+        self.command = command
+        self.duplicate = duplicate
+
+        # command of the ACE class representative this testlet's result is inferred from
+        self.inferred = inferred
+
+
+class TraceResult(Record):
+
+    '''
+    The parsed packet-tracer fields the report uses, one per unique command.
+    Repeated strings such as the action and interfaces come from the ValueTable, the NAT addresses do not.
+    '''
+
+    FIELDS = ('output_interface', 'asa_action', 'drop_reason', 'nat_from', 'nat_to', 'nat_rule')
+    SHARED = ('output_interface', 'asa_action', 'drop_reason', 'nat_rule')
+    __slots__ = FIELDS
+
+    def __init__(self, results, values=None):
+        '''
+        Takes the ASAPolicyTest.TestResult dictionary.
+        '''
+
+        for key in self.FIELDS:
+            value = results.get(key)
+            setattr(self, key, values.shared(value) if values != None and key in self.SHARED else value)
+
+
+class TestRow(Record):
+
+    '''
+    One report row, derives its columns from the testlet and the shared TraceResult.
+    A skipped testlet has no result and reports empty columns.
+    '''
+
+    FIELDS = ('command', 'index', 'interface', 'protocol', 'source_ip', 'source_port', 'icmp_type',
+              'icmp_code', 'output_interface', 'destination_ip', 'destination_port', 'expected_result',
+              'asa_action', 'drop_reason', 'nat_from', 'nat_to', 'nat_rule', 'yaml_row', 'grade', 'inferred')
+    __slots__ = ('testlet', 'result', 'grade')
+
+    def __init__(self, testlet, result, grade):
+        self.testlet = testlet
+        self.result = result
+        self.grade = grade
+
+    def __getattr__(self, key):
+
+        if key in ('source_port', 'destination_port'):
+            value = getattr(self.testlet, key)
+            return value if value is not None else ''
+
+        if key in ('icmp_type', 'icmp_code'):
+            value = getattr(self.testlet, key)
+            return value if isinstance(value, int) else ''
+
+        if key in ('command', 'index', 'interface', 'protocol', 'source_ip', 'destination_ip',
+                   'expected_result', 'yaml_row'):
+            return getattr(self.testlet, key)
+
+        if key == 'inferred':
+            return self.testlet.inferred if self.testlet.inferred is not None else ''
+
+        if key == 'output_interface':
+            return self.result.output_interface if self.result is not None else ''
+
+        if key in ('asa_action', 'drop_reason', 'nat_from', 'nat_to', 'nat_rule'):
+            value = getattr(self.result, key) if self.result is not None else None
+            return value if value is not None else ''
+
+        raise AttributeError(key)
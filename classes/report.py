@@ -4,52 +4,269 @@ from logzero import logger
 from os import unlink
 from os.path import isfile
 from glob import glob
+import json
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from .records import ValueTable, TestRow
+from .timing import timer
+
+
+# compiled Jinja2 environments shared by every report, keyed by template directory
+_environments = {}
+_environments_lock = threading.Lock()
+
+
+def ReportTemplate(script_dir, name='report.j2'):
+    '''
+    Returns the compiled template. The Environment is built once per template directory,
+    its templates are compiled on first use and not checked for changes afterwards.
+    '''
+
+    directory = '{}/jinja2_templates/'.format(script_dir)
+
+    with _environments_lock:
+        env = _environments.get(directory)
+        if env is None:
+            env = _environments[directory] = Environment(loader=FileSystemLoader(directory),
+                                                         trim_blocks=True, lstrip_blocks=True,
+                                                         auto_reload=False)
+
+    return env.get_template(name)
+
+
+class SpooledRows(object):
+
+    '''
+    Re-iterable view of one spool file, each iteration reads the rows back from disk.
+    '''
+
+    def __init__(self, path, yaml_rows):
+        self.path = path
+        self.yaml_rows = yaml_rows
+
+    def __iter__(self):
+        with open(self.path, 'r') as f:
+            for line in f:
+                number, *columns = json.loads(line)
+                row = dict(zip(ResultSpool.COLUMNS, columns))
+                row['yaml_row'] = self.yaml_rows[number]
+                yield row
+
+
+class ResultSpool(object):
+
+    '''
+    Spools result rows to disk as JSON lines, one file per interface and expected result.
+    TestControl.execute appends rows as testlets finish, the report and retry.yml read them back with rows().
+    Each line is a list of columns, the yaml_row is written as its number in a ValueTable.
+    '''
+
+    COLUMNS = tuple(column for column in TestRow.FIELDS if column != 'yaml_row')
+
+    def __init__(self, directory=None):
+
+        self.directory = tempfile.mkdtemp(prefix='asa_results_', dir=directory)
+
+        # (interface, expected result list) -> open file, in the order first seen
+        self.files = {}
+        self.paths = {}
+        self.yaml_rows = ValueTable()
+
+    def append(self, interface, should, row):
+        key = (interface, should)
+        f = self.files.get(key)
+        if f is None:
+            self.paths[key] = '{}/{}.jsonl'.format(self.directory, len(self.paths))
+            f = self.files[key] = open(self.paths[key], 'w')
+        columns = [self.yaml_rows.number(row['yaml_row'])] + [row[column] for column in self.COLUMNS]
+        f.write(json.dumps(columns, default=str) + '\n')
+
+    def keys(self):
+        return list(self.paths.keys())
+
+    def rows(self, interface, should):
+        self.files[(interface, should)].flush()
+        return SpooledRows(self.paths[(interface, should)], self.yaml_rows)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CompactRows(object):
+
+    '''
+    Encodes a report context for report_compact.j2.
+    The group column is the context key, "<host>_<interface>" in the combined fleet report.
+    Every column keeps a table of its distinct values and a row is written as a list of codes into those tables,
+    so repeated values such as interfaces, actions and yaml rows are stored once.
+    rows() streams the row lists while rendering, values() is called after it once every value has been seen.
+    The command column is the packet-tracer command as it was sent, a duplicate testlet shares its code.
+    Memory is bounded by max_values a column rather than the row count, once a table is full new values
+    are written into the row as text. The group, section and grade tables are always kept, the page filters on their codes.
+    '''
+
+    COLUMNS = ('group', 'section', 'interface', 'index', 'protocol', 'source_ip', 'source_port', 'icmp_type',
+               'icmp_code', 'destination_ip', 'destination_port', 'drop_reason', 'asa_action',
+               'expected_result', 'grade', 'nat_from', 'nat_to', 'nat_rule', 'output_interface',
+               'inferred', 'command', 'yaml_row')
+    FILTERED = ('group', 'section', 'grade')
+
+    def __init__(self, context, chunk_rows=500, max_values=4096):
+        self.context = context
+        self.chunk_rows = chunk_rows
+        self.max_values = max_values
+        self.codes = [{} for column in self.COLUMNS]
+
+        # yaml rows are unhashable, they are numbered by identity and turned into text at the end
+        self.yaml_rows = ValueTable()
+
+    def _encode(self, group, section, row):
+        encoded = []
+        for position, column in enumerate(self.COLUMNS):
+            if column == 'group':
+                value = group
+            elif column == 'section':
+                value = section
+            elif column == 'index':
+                encoded.append(row['index'])
+                continue
+            elif column == 'yaml_row':
+                value = self.yaml_rows.number(row['yaml_row'])
+            else:
+                value = row[column]
+                if value is None:
+                    value = ''
+
+            codes = self.codes[position]
+            code = codes.get(value)
+            if code is None:
+                if len(codes) >= self.max_values and column not in self.FILTERED:
+                    encoded.append(str(self.yaml_rows[value]) if column == 'yaml_row' else str(value))
+                    continue
+                code = codes[value] = len(codes)
+            encoded.append(code)
+        return encoded
+
+    def rows(self):
+        chunk, separator = [], ''
+        for interface, data in self.context.items():
+            if interface == 'full_stats':
+                continue
+            for section, rows in data.items():
+                if section == 'interface_stats':
+                    continue
+                for row in rows:
+                    chunk.append(json.dumps(self._encode(interface, section, row), separators=(',', ':')))
+                    if len(chunk) == self.chunk_rows:
+                        yield separator + ','.join(chunk)
+                        chunk, separator = [], ','
+        if chunk:
+            yield separator + ','.join(chunk)
+
+    def values(self):
+        values = []
+        for codes in self.codes:
+            table = [None] * len(codes)
+            for value, code in codes.items():
+                table[code] = value
+            values.append(table)
+        position = self.COLUMNS.index('yaml_row')
+        values[position] = [str(self.yaml_rows[number]) for number in values[position]]
+        return _ScriptJSON({'columns': self.COLUMNS, 'values': values})
+
+    def stats(self):
+        interfaces = OrderedDict()
+        for interface, data in self.context.items():
+            if interface != 'full_stats' and 'interface_stats' in data:
+                interfaces[interface] = data['interface_stats']
+
+        full = self.context.get('full_stats')
+        if full is None:
+            full = {key: sum(stats[key] for stats in interfaces.values())
+                    for key in ('total', 'pass', 'fail', 'skip')}
+
+        return _ScriptJSON({'interfaces': interfaces, 'full': full})
+
+
+def _ScriptJSON(data):
+    '''
+    JSON that is safe inside a <script> element, "<" only appears inside strings so it can be escaped.
+    '''
+
+    return json.dumps(data, default=str, separators=(',', ':')).replace('<', '\\u003c')
 
 
 class GenerateReport(object):
 
-    def __init__(self, context, script_dir, generated, reportname):
+    # "auto" switches to the compact report above this many rows
+    COMPACT_ROWS = 20000
+
+    def __init__(self, context, script_dir, generated, reportname, prefix=None, report_format='auto'):
 
         self.context = context
         self.script_dir = script_dir
         self.generated = generated
         self.reportname = reportname if reportname != None else 'html_report'
+        self.report_format = report_format
+
+        # optional prefix for the per-interface reports, keeps devices apart in fleet runs
+        self.prefix = '{}_'.format(prefix) if prefix != None else ''
         # self._cleanup()
 
-    def gen_report(self):
-        for interface, data in self.context.items():
+    def _compact(self):
+        if self.report_format != 'auto':
+            return self.report_format == 'compact'
 
-            if interface != 'full_stats':
+        full_stats = self.context.get('full_stats', {})
+        return full_stats.get('total', 0) + full_stats.get('skip', 0) > self.COMPACT_ROWS
+
+    def gen_report(self, per_interface=True):
+
+        with timer.stage('report'):
+            self._gen_report(per_interface)
+
+    def _gen_report(self, per_interface):
+
+        compact = self._compact()
+        template = ReportTemplate(self.script_dir, 'report_compact.j2' if compact else 'report.j2')
+        if compact:
+            logger.info('Writing the compact report, rows are rendered in the browser')
+
+        # each interface report renders only its own slice of the results
+        if per_interface:
+            for interface, data in self.context.items():
+                if interface != 'full_stats':
+                    filename = '{}/reports/{}{}.html'.format(self.script_dir, self.prefix, interface)
+                    self._render(template, filename, {interface: data})
+
+        # the timing covers the whole run, so only the main report shows it, not a fleet device's report
+        filename = '{}/reports/{}.html'.format(self.script_dir, self.reportname)
+        self._render(template, filename, self.context, timer.summary() if not self.prefix else None)
+
+    def _render(self, template, filename, context, timing=None):
+        '''
+        Streams the rendered template to disk chunk by chunk.
+        '''
+
+        if self._compact():
+            variables = {'report': CompactRows(context), 'generated': self.generated, 'timing': timing}
+        else:
+            variables = {'context': context, 'generated': self.generated, 'timing': timing}
 
-                # setup the Jinja2 environment conditions
-                file_loader = FileSystemLoader(
-                    '{}/jinja2_templates/'.format(self.script_dir))
-                env = Environment(loader=file_loader,
-                                trim_blocks=True, lstrip_blocks=True)
-
-                # Render template and print generated config to console
-                template = env.get_template('report.j2')
-                filename = '{}/reports/{}.html'.format(self.script_dir, interface)
-                HTML = template.render(context=self.context, generated=self.generated)
-                with open(filename, 'w') as f:
-                    f.write(HTML)
-                f.close()
-
-                logger.info(
-                    'HTML report output to "{}"'.format(filename))
-
-        file_loader=FileSystemLoader(
-            '{}/jinja2_templates/'.format(self.script_dir))
-        env=Environment(loader = file_loader,
-                        trim_blocks = True, lstrip_blocks = True)
-
-        # Render template and print generated config to console
-        template=env.get_template('report.j2')
-        filename='{}/reports/{}.html'.format(self.script_dir, self.reportname)
-        HTML=template.render(context=self.context, generated=self.generated)
         with open(filename, 'w') as f:
-            f.write(HTML)
-        f.close()
+            for chunk in template.generate(**variables):
+                f.write(chunk)
 
         logger.info(
             'HTML report output to "{}"'.format(filename))
@@ -79,6 +296,42 @@ class GenerateReport(object):
         logger.info('Total passed:   {}'.format(self.context['full_stats']['pass']))
         logger.info('Total failed:   {}'.format(self.context['full_stats']['fail']))
         logger.info('Total skipped:  {}'.format(self.context['full_stats']['skip']))
+        logger.info('SSH round-trips saved by duplicate commands: {}'.format(
+            self.context['full_stats'].get('saved', 0)))
+        logger.info('Results served from the result cache: {}'.format(
+            self.context['full_stats'].get('cached', 0)))
+        logger.info('Results inferred from an ACE class representative: {}'.format(
+            self.context['full_stats'].get('inferred', 0)))
+        logger.info('Results replayed from the journal: {}'.format(
+            self.context['full_stats'].get('resumed', 0)))
+
+        timing = timer.summary()
+
+        print('\n')
+        logger.info('# ---------- TIMING ---------- #')
+        for stage, data in timing['stages'].items():
+            logger.info('{:<10} {:>10.3f}s  {}'.format(stage, data['seconds'], data['count']))
+        logger.info('{:<10} {:>10.3f}s'.format('wall', timing['wall_seconds']))
+
+        for breakdown in ('all', 'interface', 'protocol'):
+            histograms = {'all': timing['latency']['all']} if breakdown == 'all' else timing['latency'][breakdown]
+            for key, data in histograms.items():
+                if data['count']:
+                    logger.info('latency {:<24} n={:<8} p50 {:.2f}ms  p95 {:.2f}ms  p99 {:.2f}ms  max {:.2f}ms'.format(
+                        key if breakdown == 'all' else '{} {}'.format(breakdown, key),
+                        data['count'], data['p50_ms'], data['p95_ms'], data['p99_ms'], data['max_ms']))
+
+    def gen_timing(self):
+        '''
+        Writes the timing summary as JSON next to the report, for comparing runs.
+        '''
+
+        filename = '{}/reports/{}_timing.json'.format(self.script_dir, self.reportname)
+        with open(filename, 'w') as f:
+            json.dump(timer.summary(), f, indent=2)
+            f.write('\n')
+
+        logger.info('Timing output to "{}"'.format(filename))
 
 
     # def _cleanup(self):
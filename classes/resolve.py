@@ -1,43 +1,166 @@
 import sys
+import time
+import threading
+import queue
 from logzero import logger
 from socket import gethostbyname
 from ipaddr import IPAddress
 
 
+class DNSCache(object):
+
+    '''
+    Memoizes DNS answers for the run, failed lookups are kept too for a shorter TTL.
+    resolve_all looks up many names concurrently with a bounded number of workers.
+    '''
+
+    def __init__(self, ttl=300, negative_ttl=60, workers=16, timeout=5):
+
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.workers = workers
+        self.timeout = timeout
+
+        # name -> (results dictionary, expiry time)
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def get(self, host):
+        '''
+        Returns the cached results for host, or None when missing or expired.
+        '''
+
+        with self.lock:
+            entry = self.cache.get(str(host).lower())
+
+        if entry != None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def put(self, host, results):
+        ttl = self.ttl if results['lookup'] == 'success' else self.negative_ttl
+        with self.lock:
+            self.cache[str(host).lower()] = (results, time.monotonic() + ttl)
+
+    def lookup(self, host):
+        '''
+        Resolves a single name, giving up after the timeout.
+        gethostbyname cannot be interrupted so it runs in a daemon thread that is left behind on timeout.
+        '''
+
+        answer = {}
+
+        def _gethostbyname():
+            try:
+                answer['ip_address'] = gethostbyname(host)
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=_gethostbyname, daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+
+        if 'ip_address' in answer:
+            results = { 'lookup': 'success', 'ip_address': answer['ip_address'], 'lookup_type': 'dns' }
+        else:
+            results = { 'lookup': 'failed', 'ip_address': host, 'lookup_type': 'dns' }
+
+        self.put(host, results)
+        return results
+
+    def resolve_all(self, hosts):
+        '''
+        Resolves every name not already cached, at most self.workers at once.
+        '''
+
+        work = queue.Queue()
+        for host in set(str(host).lower() for host in hosts):
+            if self.get(host) == None:
+                work.put(host)
+
+        pending = work.qsize()
+        if pending == 0:
+            return
+
+        logger.info('Resolving {} names via DNS with {} workers'.format(
+            pending, min(self.workers, pending)))
+
+        def _worker():
+            while True:
+                try:
+                    host = work.get_nowait()
+                except queue.Empty:
+                    break
+                self.lookup(host)
+
+        threads = [threading.Thread(target=_worker)
+                   for _ in range(min(self.workers, pending))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+# answers shared by every Resolve for the rest of the run
+dns_cache = DNSCache()
+
+
 class Resolve(object):
 
     def load_hostfile(self, hostfile):
 
+        '''
+        Reads the hostfile and returns the name to IP index built by index_hostfile.
+        '''
+
         with open(hostfile, 'r') as lookup:
-            alist = [line.rstrip() for line in lookup]
+            index = self.index_hostfile(lookup)
 
-        return alist
+        return index
 
-    def hostfile_lookup(self, host, hostfile=None):
+    def index_hostfile(self, lines):
 
         '''
-        Parses the hostfile, if the object is found retuns the address, otherwise returns 'invalid'.
+        Builds a case-insensitive name to IP dictionary in a single pass.
+        Accepts ASA style "name <ip> <name> [description]" lines and /etc/hosts style "<ip> <name> [aliases...]" lines.
+        Comments and blank lines are ignored, the first line to define a name wins.
         '''
 
-        # try:
+        index = {}
 
-        # search for the object
-        for index, lookup_line in enumerate(hostfile):
+        for line in lines:
 
-            look_elements = lookup_line.split(' ')
-            lookup_object = look_elements[2].lower()
+            elements = line.split('#', 1)[0].split()
+            if len(elements) < 2:
+                continue
 
-            if str(host.lower()) == str(lookup_object.lower()):
-                b_elembers = lookup_line.split(' ')
-                object_ip = b_elembers[1]
-                object_ip_found = True
-                logger.info('Found: {}, on line {}'.format(
-                    lookup_line, index + 1))
-                break
+            if elements[0] == 'name':
+                if len(elements) < 3:
+                    continue
+                object_ip = elements[1]
+                names = elements[2:3]
             else:
-                object_ip_found = False
+                object_ip = elements[0]
+                names = elements[1:]
+
+            for name in names:
+                index.setdefault(name.lower(), object_ip)
+
+        return index
 
-        if object_ip_found:
+    def hostfile_lookup(self, host, hostfile=None):
+
+        '''
+        Looks the object up in the hostfile index, if the object is found retuns the address, otherwise returns 'invalid'.
+        '''
+
+        # a raw list of lines is indexed on the fly
+        if not isinstance(hostfile, dict):
+            hostfile = self.index_hostfile(hostfile if hostfile != None else [])
+
+        object_ip = hostfile.get(str(host).lower())
+
+        if object_ip != None:
             logger.info('Object: {}, IP: {}'.format(host, object_ip))
             return { 'lookup': 'success', 'ip_address': object_ip, 'lookup_type': 'hostfile' }
         else:
@@ -45,23 +168,21 @@ class Resolve(object):
             object_ip = 'invalid'  # Need to return a string as ipaddr resolves False to 0.0.0.0
             return { 'lookup': 'failed', 'ip_address': object_ip, 'lookup_type': 'hostfile' }
 
-
-        # except:
-        #     logger.error('{}: {}'.format(
-        #         sys.exc_info()[0], sys.exc_info()[1]))
-
     def dns(self, host):
 
         '''
         Returns the resoolved address or 'invalid' if resolution fails.
         '''
 
-        try:
-            resolved_address = gethostbyname(host)
+        results = dns_cache.get(host)
+        if results == None:
+            results = dns_cache.lookup(host)
+
+        if results['lookup'] == 'success':
             logger.info(
-                'DNS resovled object "{}" to "{}"'.format(host, resolved_address))
-            return { 'lookup': 'success', 'ip_address': resolved_address, 'lookup_type': 'dns' }
-        except Exception:
+                'DNS resovled object "{}" to "{}"'.format(host, results['ip_address']))
+            return results
+        else:
             logger.info(
                 'DNS resolution failed for object "{}"'.format(host))
             return { 'lookup': 'failed', 'ip_address': host, 'lookup_type': 'dns' }
@@ -117,7 +238,7 @@ class Lookup(object):
                 results = resolv.hostfile_lookup(self.validate_address, self.hostfile_list)
 
             # check results
-            if results['lookup'] == 'success':
+            if results.get('lookup') == 'success':
                 pass
             else:
                 # fallback to dns
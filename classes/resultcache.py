@@ -0,0 +1,110 @@
+from logzero import logger
+import sqlite3
+import threading
+import json
+import time
+import re
+
+
+class ResultCache(object):
+
+    '''
+    On-disk cache of parsed packet-tracer results, keyed by device, configuration fingerprint and command.
+    Packet-tracer is deterministic for a given running-config, so an unchanged firewall can be served from disk.
+    '''
+
+    def __init__(self, path, device, max_entries=1000000, max_age=7):
+        '''
+        path is the sqlite file, device names the firewall.
+        Entries older than max_age days are evicted, then the oldest beyond max_entries.
+        '''
+
+        self.path = path
+        self.device = device
+        self.max_entries = max_entries
+        self.max_age = max_age * 86400
+
+        self.db = None
+        self.fingerprint = None
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+
+        # lookups may come from the SessionPool feeder thread while results are stored
+        self.lock = threading.Lock()
+
+    def open(self, connect):
+        '''
+        Reads the configuration fingerprint from the ASA and opens the cache.
+        Returns False, leaving the cache disabled, when no fingerprint could be read.
+        '''
+
+        output = connect.send_command('show checksum')
+        match = re.search(r'Cryptochecksum:\s*(.+)', output)
+        if not match:
+            logger.error('Unable to read the configuration checksum, result cache disabled')
+            return False
+
+        self.fingerprint = match.group(1).strip()
+        logger.info('Configuration checksum {}'.format(self.fingerprint))
+
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS results ('
+                        'device TEXT, fingerprint TEXT, command TEXT, result TEXT, created REAL, '
+                        'PRIMARY KEY (device, fingerprint, command))')
+        self.db.execute('CREATE INDEX IF NOT EXISTS results_created ON results (created)')
+        return True
+
+    def get(self, command):
+        '''
+        Returns the cached parsed result for the command, or None.
+        '''
+
+        if self.db is None:
+            return None
+
+        with self.lock:
+            row = self.db.execute(
+                'SELECT result FROM results WHERE device = ? AND fingerprint = ? AND command = ? AND created > ?',
+                (self.device, self.fingerprint, command, time.time() - self.max_age)).fetchone()
+
+        if row:
+            self.hits += 1
+            return json.loads(row[0])
+
+        self.misses += 1
+        return None
+
+    def store(self, command, result):
+        if self.db is None or result is None:
+            return
+
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                            (self.device, self.fingerprint, command, json.dumps(result), time.time()))
+
+            # commit in batches so a failed run keeps most of its results
+            self.pending += 1
+            if self.pending >= 500:
+                self.db.commit()
+                self.pending = 0
+
+    def close(self):
+        '''
+        Evicts expired and excess entries, then commits.
+        '''
+
+        if self.db is None:
+            return
+
+        logger.info('{} of {} commands served from the result cache'.format(
+            self.hits, self.hits + self.misses))
+
+        self.db.execute('DELETE FROM results WHERE created < ?',
+                        (time.time() - self.max_age,))
+        self.db.execute('DELETE FROM results WHERE rowid IN '
+                        '(SELECT rowid FROM results ORDER BY created DESC LIMIT -1 OFFSET ?)',
+                        (self.max_entries,))
+        self.db.commit()
+        self.db.close()
+        self.db = None
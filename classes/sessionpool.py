@@ -0,0 +1,161 @@
+from logzero import logger
+from netmiko import ConnectHandler
+import threading
+import queue
+import time
+
+
+def ChangeTo(connect, context):
+    '''
+    Switches a netmiko session to a security context of a multiple-context ASA.
+    netmiko's cisco_asa driver picks up the context's prompt as the new base prompt.
+    '''
+
+    output = connect.send_command('changeto context {}'.format(context))
+    if 'ERROR' in output:
+        raise ValueError('Unable to change to context "{}": {}'.format(context, output.strip()))
+
+
+class SessionPool(object):
+
+    '''
+    Class to run packet-tracer commands over a bounded pool of SSH sessions.
+    Each session pulls commands from a shared work queue, outputs are handed back in submission order.
+    '''
+
+    def __init__(self, device, sessions=1, context=None):
+        '''
+        Takes the netmiko device dictionary and the number of sessions to open.
+        With context every session changes to that security context after login.
+        '''
+
+        self.device = device
+        self.sessions = sessions if sessions > 0 else 1
+        self.context = context
+        self.connections = []
+
+        # seconds the command whose output send_commands last yielded took on its session
+        self.last_latency = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disconnect()
+
+    def open(self):
+        '''
+        Opens every session in parallel, a failed login fails the whole pool.
+        '''
+
+        errors = []
+        lock = threading.Lock()
+
+        def _connect(number):
+            try:
+                connect = ConnectHandler(**self.device)
+                with lock:
+                    self.connections.append(connect)
+                if self.context != None:
+                    ChangeTo(connect, self.context)
+                logger.info('Session {} connected to {}'.format(
+                    number, self.device['ip']))
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=_connect, args=(number,))
+                   for number in range(1, self.sessions + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            self.disconnect()
+            raise errors[0]
+
+        return self
+
+    def disconnect(self):
+        for connect in self.connections:
+            try:
+                connect.disconnect()
+            except Exception:
+                pass
+        self.connections = []
+
+    def send_command(self, command):
+        '''
+        Runs a single command on the first session.
+        '''
+
+        if not self.connections:
+            self.open()
+
+        return self.connections[0].send_command(command)
+
+    def send_commands(self, commands):
+        '''
+        Generator, hands each command to the first free session and yields the outputs in the order the commands were given.
+        A None command is passed through as a None output without using a session.
+        At most two commands per session are in flight or waiting to be collected.
+        '''
+
+        if not self.connections:
+            self.open()
+
+        work = queue.Queue()
+        window = threading.Semaphore(len(self.connections) * 2)
+        done = threading.Condition()
+        state = {'results': {}, 'total': None}
+
+        def _feed():
+            count = 0
+            for count, command in enumerate(commands, 1):
+                window.acquire()
+                work.put((count - 1, command))
+            for _ in self.connections:
+                work.put(None)
+            with done:
+                state['total'] = count
+                done.notify_all()
+
+        def _worker(connect):
+            while True:
+                item = work.get()
+                if item is None:
+                    break
+                sequence, command = item
+                started = time.time()
+                try:
+                    output = connect.send_command(command) if command is not None else None
+                except Exception as e:
+                    output = e
+                with done:
+                    state['results'][sequence] = (output, time.time() - started)
+                    done.notify_all()
+
+        threads = [threading.Thread(target=_feed, daemon=True)]
+        threads += [threading.Thread(target=_worker, args=(connect,), daemon=True)
+                    for connect in self.connections]
+        for thread in threads:
+            thread.start()
+
+        sequence = 0
+        while True:
+            with done:
+                while sequence not in state['results'] and \
+                        (state['total'] is None or sequence < state['total']):
+                    done.wait()
+                if sequence not in state['results']:
+                    break
+                output, latency = state['results'].pop(sequence)
+
+            window.release()
+            if isinstance(output, Exception):
+                raise output
+
+            self.last_latency = latency if output is not None else None
+            yield output
+            sequence += 1
@@ -1,4 +1,4 @@
-from .parser import TextFSMParser, FileToMultiLineString
+from .parser import TextFSMParser, PacketTracerParser, FileToMultiLineString
 from logzero import logger
 import re
 
@@ -10,9 +10,10 @@ class ASAPolicyTest(object):
     Uses TextFSM template to render text to YAML.
     '''
 
-    def __init__(self, script_dir, cli_output):
+    def __init__(self, script_dir, cli_output, parser='textfsm'):
         '''
         Input is the raw text output from Cisco IOS cli.
+        parser selects the TextFSM template or the native single pass parser.
         '''
 
         self.name = 'asa_packet_tracer'
@@ -22,7 +23,10 @@ class ASAPolicyTest(object):
         self.cli_output = FileToMultiLineString(cli_output)
 
         # prep the data for parser processing
-        self.parsed_data = TextFSMParser(self.cli_output, self.template)
+        if parser == 'native':
+            self.parsed_data = PacketTracerParser(self.cli_output)
+        else:
+            self.parsed_data = TextFSMParser(self.cli_output, self.template)
 
     def TestResult(self):
 
@@ -0,0 +1,156 @@
+from logzero import logger
+from .timing import timer
+from collections import OrderedDict
+import glob
+import os
+import yaml
+
+# libyaml's loader is many times faster than the pure Python one, PyYAML is not always built with it
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
+
+def SuiteFiles(path, base=None):
+    '''
+    Expands a suite path to its files, in order.
+    A directory gives every .yml and .yaml file below it sorted by path, a glob its matching files sorted,
+    anything else is taken as a single file. Relative paths are relative to base.
+    '''
+
+    if base != None:
+        path = os.path.join(base, path)
+
+    if os.path.isdir(path):
+        return sorted(os.path.join(root, name) for root, dirs, names in os.walk(path)
+                      for name in names if name.endswith(('.yml', '.yaml')))
+
+    if any(character in path for character in '*?['):
+        return sorted(name for name in glob.glob(path, recursive=True) if os.path.isfile(name))
+
+    return [path]
+
+
+def DocumentItems(document):
+    '''
+    Generator, yields the (interface, rows) of one document, an interface without rows has an empty list.
+    '''
+
+    for interface, rows in document.items():
+        yield interface, rows if rows != None else []
+
+
+class TestSuite(object):
+
+    '''
+    A test suite kept in one or many YAML files, read one document at a time while the testset is built.
+    path is a file, a directory or a glob, a file may hold several documents separated by "---".
+
+    A document may list more suite paths under an include key, relative to its own file.
+    They are read in place of the key, before the rest of the document.
+
+    items() yields (interface, rows) as a dictionary loaded from a single file would,
+    except an interface may come up again in a later document, TestControl numbers its rows on.
+    Only the document being expanded is held, not the whole tree.
+
+    For a multiple-context ASA each document names its security context under a context key,
+    documents it includes without a context key of their own are in the same context.
+    contexts() splits such a suite by context, each context reads the suite again and keeps only its own documents.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.files = SuiteFiles(path)
+        if not self.files:
+            raise IOError('No YAML files match "{}"'.format(path))
+
+        # every file read so far, includes too, in the order they were opened
+        self.read = []
+
+        # (pattern, directory, files) of every include expanded so far
+        self.includes = []
+
+    def _documents(self, filename, including=(), context=None):
+        '''
+        Generator, yields (context, document) for the file and the files it includes.
+        '''
+
+        realpath = os.path.realpath(filename)
+        if realpath in including:
+            raise ValueError('"{}" includes itself'.format(filename))
+
+        with open(filename, 'r') as yml:
+            self.read.append(filename)
+            logger.info('Reading tests from "{}"'.format(filename))
+
+            for document in timer.iterate('load', yaml.load_all(yml, Loader=YAMLLoader)):
+                if not document:
+                    continue
+
+                document_context = document.pop('context', context)
+                includes = document.pop('include', None) or []
+                if not isinstance(includes, list):
+                    includes = [includes]
+
+                for pattern in includes:
+                    base = os.path.dirname(filename)
+                    files = SuiteFiles(pattern, base)
+                    self.includes.append((pattern, base, files))
+                    for included in files:
+                        for included_document in self._documents(included, including + (realpath,),
+                                                                  document_context):
+                            yield included_document
+
+                yield document_context, document
+
+    def documents(self):
+        '''
+        Generator, yields (context, document) for each document of the suite in order, includes expanded.
+        '''
+
+        self.read = []
+        self.includes = []
+        for filename in self.files:
+            for document in self._documents(filename):
+                yield document
+
+    def items(self):
+        for context, document in self.documents():
+            if context != None:
+                raise ValueError('The suite is grouped by security context "{}", run it with -G'.format(context))
+            for item in DocumentItems(document):
+                yield item
+
+    def contexts(self):
+        '''
+        Reads the suite once for its context names, returns an OrderedDict of context name to ContextSuite
+        in the order first seen. No document is kept, each ContextSuite streams its own.
+        '''
+
+        contexts = OrderedDict()
+        for context, document in self.documents():
+            if context is None:
+                raise ValueError('Every document needs a context key when the suite is grouped by security context')
+            if str(context) not in contexts:
+                contexts[str(context)] = ContextSuite(str(context), self.path)
+        return contexts
+
+
+class ContextSuite(object):
+
+    '''
+    The documents of one security context, items() as TestSuite.
+    Contexts are built concurrently, each one reads the suite with its own TestSuite and skips the other contexts.
+    '''
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    def items(self):
+        for context, document in TestSuite(self.path).documents():
+            if str(context) != self.name:
+                continue
+            for item in DocumentItems(document):
+                yield item
@@ -1,10 +1,17 @@
 from logzero import logger
-from .search import RecursiveSearch
-from .resolve import Lookup, Resolve
+from .resolve import Lookup, Resolve, dns_cache
+from ipaddr import IPAddress
 from classes.structuredata import ASAPolicyTest
+from .records import ValueTable, Testlet, TraceResult, TestRow
+from .minimize import RuleClasses
+from .offline import OfflineASA
+from .expand import Expansion, PortRange, PrefixHosts, ParsePortRange, ParsePrefix, ValidPort
+from .timing import timer
+from collections import OrderedDict, deque
 import re
 import sys
 import os
+import time
 
 
 class TestControl(object):
@@ -13,7 +20,11 @@ class TestControl(object):
     Class to construct and execute tests
     '''
 
-    def __init__(self, script_dir, context, hostfile_status=False, hostfile_list=None):
+    # number of recent unique commands remembered for duplicate reuse
+    DUPLICATE_WINDOW = 10000
+
+    def __init__(self, script_dir, context, hostfile_status=False, hostfile_list=None, retry_name='retry.yml', parser='textfsm',
+                 result_cache=None, max_expansion=65536, compiled=None):
         '''
         Initiate the class, allow any method to call the relevant source context data.
         '''
@@ -33,11 +44,8 @@ class TestControl(object):
         # jinja2 expects a dictionary or anything
         self.jinja2_results = {}
 
-        # setup the top level interface dictionaries
-        # add this to the jinja2_results dictionary
-        for interface, test_item in self.context.items():
-            self.jinja2_results[interface] = {}
-            # logger.debug('Dictionary for "{}" created.'.format(interface))
+        # the top level interface dictionaries are added as each interface is first seen,
+        # the context may be a TestSuite that is only read while the testset is built
 
         # grab the hostfile information
         self.hostfile_status = hostfile_status
@@ -45,173 +53,118 @@ class TestControl(object):
 
         self.script_dir = script_dir
 
-    def _host_lookup(self, test_data):
-        '''
-        Resolves names hosts to IP Address and/or validates provided strings are IP Addresses.
-        Return dictionary of dictionaries
-        '''
-
-        if isinstance(test_data['source_ip'], list) and isinstance(test_data['destination_ip'], str):
-
-            # logger.debug('List detect in destination_ip')
-
-            # setup the dict and list
-            ip_information = {}
-
-            # record the source_ip
-            destination_ip = Lookup(
-                test_data['destination_ip'], self.hostfile_status, self.hostfile_list)
-            ip_information['destination'] = destination_ip.get_ip()
-
-            # setup list
-            ip_information['sources'] = []
-
-            for host in test_data['source_ip']:
-
-                # store the destination_ip
-                source_ip = Lookup(
-                    host, self.hostfile_status, self.hostfile_list)
-                ip_information['sources'].append(source_ip.get_ip())
-
-        if isinstance(test_data['destination_ip'], list) and isinstance(test_data['source_ip'], str):
-
-            # logger.debug('List detect in destination_ip')
-
-            # setup the dict and list
-            ip_information = {}
+        # name of the retry file written to tests/ for failed testlets
+        self.retry_name = retry_name
 
-            # record the source_ip
-            source_ip = Lookup(
-                test_data['source_ip'], self.hostfile_status, self.hostfile_list)
-            ip_information['source'] = source_ip.get_ip()
+        # packet-tracer output parser, textfsm or native
+        self.parser = parser
 
-            # setup list
-            ip_information['destinations'] = []
+        # optional ResultCache, serves commands unchanged since an earlier run
+        self.result_cache = result_cache
 
-            for host in test_data['destination_ip']:
+        # shared interface, protocol and result strings, addresses are too many to keep for the whole run
+        self.values = ValueTable()
 
-                # store the destination_ip
-                destination_ip = Lookup(
-                    host, self.hostfile_status, self.hostfile_list)
-                ip_information['destinations'].append(destination_ip.get_ip())
+        # most testlets a single YAML row may expand to
+        self.max_expansion = max_expansion
 
-        if isinstance(test_data['source_ip'], list) and isinstance(test_data['destination_ip'], list):
+        # ACE equivalence classes, set by minimize()
+        self.rule_classes = None
 
-            # logger.debug('List detect in destination_ip')
+        # optional CompiledTestset, an unchanged suite is loaded from it rather than built
+        self.compiled = compiled
 
-            # setup the dict and list
-            ip_information = {}
+    def _host_lookup(self, test_data):
+        '''
+        Resolves names hosts to IP Address and/or validates provided strings are IP Addresses.
+        source_ip and destination_ip may be a single host or a list, a prefix such as 10.1.0.0/28 expands to its hosts.
+        Return dictionary of sources and destinations, each an Expansion of Lookup.get_ip style dictionaries
+        '''
 
-            # setup list
-            ip_information['sources'] = []
+        ip_information = {}
 
-            for host in test_data['source_ip']:
+        for key, name in (('source_ip', 'sources'), ('destination_ip', 'destinations')):
 
-                # store the destination_ip
-                source_ip = Lookup(
-                    host, self.hostfile_status, self.hostfile_list)
-                ip_information['sources'].append(source_ip.get_ip())
+            hosts = test_data[key] if isinstance(test_data[key], list) else [test_data[key]]
+            parts = []
 
-            # setup list
-            ip_information['destinations'] = []
+            for host in hosts:
 
-            for host in test_data['destination_ip']:
+                # prefixes are expanded lazily, every host address is valid
+                network = ParsePrefix(host)
+                if network != None:
+                    parts.append(PrefixHosts(network))
+                    continue
 
-                # store the destination_ip
-                destination_ip = Lookup(
-                    host, self.hostfile_status, self.hostfile_list)
-                ip_information['destinations'].append(destination_ip.get_ip())
+                lookup = Lookup(host, self.hostfile_status, self.hostfile_list)
+                parts.append(lookup.get_ip())
 
-        # it's not a list so move on to standard processing
-        if isinstance(test_data['source_ip'], str) and isinstance(test_data['destination_ip'], str):
+            ip_information[name] = Expansion(parts)
 
-            source_ip = Lookup(
-                test_data['source_ip'], self.hostfile_status, self.hostfile_list)
-            destination_ip = Lookup(
-                test_data['destination_ip'], self.hostfile_status, self.hostfile_list)
+        return ip_information
 
-            ip_information = {
-                'source': source_ip.get_ip(),
-                'destination': destination_ip.get_ip()
-            }
+    def _resolve_names(self, item):
+        '''
+        Collects every unique name in the rows that is neither an IP Address nor in the hostfile,
+        then resolves them concurrently into the DNS cache before they are constructed.
+        '''
 
-        return ip_information
+        names = set()
+
+        for test_data in item:
+            for key in ('source_ip', 'destination_ip'):
+                hosts = test_data[key] if isinstance(test_data[key], list) else [test_data[key]]
+                for host in hosts:
+                    if not isinstance(host, str) or ParsePrefix(host) != None:
+                        continue
+                    try:
+                        IPAddress(host)
+                        continue
+                    except ValueError:
+                        pass
+                    if self.hostfile_status == True and self.hostfile_list != None and \
+                            Resolve().hostfile_lookup(host, self.hostfile_list)['lookup'] == 'success':
+                        continue
+                    names.add(host)
+
+        dns_cache.resolve_all(names)
 
     def _port_information(self, test_data):
         '''
-        Takes test data and returns either a deictionary of port strings or a dictionary of list of ports for command construction to use.
-        Current stores all sources and destinations.
+        Takes test data and returns the source port and an Expansion of destination ports for command construction to use.
+        destination_port may be a port, a "8000-8100" range or a list of either.
         '''
 
         # setup the dict and list
         port_information = {}
 
-        if isinstance(test_data['source_port'], list):
-
-            # logger.debug('List detect in source_port')
-
-            # setup the ports list
-            port_information['sources'] = []
-
-            for port in test_data['source_port']:
-
-                # store the source_ports
-                # validate that the ports lies within the range 0-65535
-                if port <= 65535 and port >= 0:
-                    port_information['sources'].append(
-                        {'valid': True, 'port': port})
-                else:
-                    port_information['sources'].append(
-                        {'valid': False, 'port': port})
-
-        if isinstance(test_data['destination_port'], list):
+        # validate that the ports lies within the range 0-65535
+        # ports are optional for icmp and esp
+        port = test_data['source_port']
+        port_information['source'] = {
+            'valid': port is None or ValidPort(port), 'port': port}
 
-            # logger.debug('List detect in destination_port')
+        ports = test_data['destination_port'] if isinstance(test_data['destination_port'], list) \
+            else [test_data['destination_port']]
+        parts = []
 
-            # setup the ports list
-            port_information['destinations'] = []
+        for port in ports:
 
-            for port in test_data['destination_port']:
-
-                # store the destination_ports
-                # validate that the ports lies within the range 0-65535
-                if port <= 65535 and port >= 0:
-                    port_information['destinations'].append(
-                        {'valid': True, 'port': port})
-                else:
-                    port_information['destinations'].append(
-                        {'valid': False, 'port': port})
-
-        # now check for integer/string fields
-        if isinstance(test_data['source_port'], str) or isinstance(test_data['source_port'], int):
-
-            # logger.debug('String or integer detect in source_port')
-
-            # validate that the ports lies within the range 0-65535
-            if test_data['source_port'] <= 65535 and test_data['source_port'] >= 0:
-                port_information['source'] = {
-                    'valid': True, 'port': test_data['source_port']}
+            port_range = ParsePortRange(port)
+            if port_range != None:
+                parts.append(PortRange(*port_range))
+            elif isinstance(port, str) and port.strip().isdigit():
+                parts.append({'valid': ValidPort(int(port)), 'port': int(port)})
             else:
-                port_information['source'] = {
-                    'valid': False, 'port': test_data['source_port']}
-
-        if isinstance(test_data['destination_port'], str) or isinstance(test_data['destination_port'], int):
+                parts.append({'valid': port is None or ValidPort(port), 'port': port})
 
-            # logger.debug('String or integer detect in destination_port')
-
-            # validate that the ports lies within the range 0-65535
-            if test_data['destination_port'] <= 65535 and test_data['destination_port'] >= 0:
-                port_information['destination'] = {
-                    'valid': True, 'port': test_data['destination_port']}
-            else:
-                port_information['destination'] = {
-                    'valid': False, 'port': test_data['destination_port']}
+        port_information['destinations'] = Expansion(parts)
 
         return port_information
 
-    def _append_testlet(self, **kwargs):
+    def _build_testlet(self, **kwargs):
         '''
-        Takes a single testlet and appends it to the testset
+        Takes a single testlet and returns it as a Testlet record with its command
         '''
 
         # logger.debug('-------- RECEIVED DATA -----------')
@@ -266,295 +219,183 @@ class TestControl(object):
         #     'command': command
         # })
 
-        self.testset.append({
-            'interface': kwargs.get('interface'),
-            'index': kwargs.get('index'),
-            'protocol': kwargs.get('protocol'),
-            'source_ip': kwargs.get('source_ip'),
-            'source_port': kwargs.get('source_port') if kwargs.get('source_port') is not None else '',
-            'icmp_type': kwargs.get('icmp_type') if kwargs.get('icmp_type') is not None else '',
-            'icmp_code': kwargs.get('icmp_code') if kwargs.get('icmp_code') is not None else '',
-            'destination_ip': kwargs.get('destination_ip'),
-            'destination_port': kwargs.get('destination_port') if kwargs.get('destination_port') is not None else '',
-            'expected_result': kwargs.get('expected_result'),
-            'execute': kwargs.get('execute'),
-            'yaml_row': kwargs.get('yaml_row'),
-            'command': command
-        })
+        values = self.values
+        return Testlet(
+            interface=values.shared(kwargs.get('interface')),
+            index=kwargs.get('index'),
+            protocol=values.shared(kwargs.get('protocol')),
+            source_ip=kwargs.get('source_ip'),
+            source_port=kwargs.get('source_port') if kwargs.get('source_port') is not None else '',
+            icmp_type=kwargs.get('icmp_type') if kwargs.get('icmp_type') is not None else '',
+            icmp_code=kwargs.get('icmp_code') if kwargs.get('icmp_code') is not None else '',
+            destination_ip=kwargs.get('destination_ip'),
+            destination_port=kwargs.get('destination_port') if kwargs.get('destination_port') is not None else '',
+            expected_result=values.shared(kwargs.get('expected_result')),
+            execute=kwargs.get('execute'),
+            yaml_row=kwargs.get('yaml_row'),
+            command=command
+        )
 
     def _construct_testlet(self, index, interface, ip_information, port_information, test_data, yaml_row):
         '''
-        Builds the testset and returns it
-        pushes the testlet into _append_testlet
+        Generator, expands one YAML row into its testlets
+        Every source is tested against every destination and destination port, in that order.
+        Rows expanding to more than max_expansion testlets are skipped.
+        When minimizing, testlets inside an ACE equivalence class are inferred from the class representative.
         '''
 
-        # setup the logic variables
-        multiple_src_ips = True if RecursiveSearch(
-            ip_information, 'sources') else False
-        multiple_dest_ips = True if RecursiveSearch(
-            ip_information, 'destinations') else False
-        multiple_dest_ports = True if RecursiveSearch(
-            port_information, 'destinations') else False
+        sources = ip_information['sources']
+        destinations = ip_information['destinations']
+        ports = port_information['destinations']
 
-        # logger.debug('Multiples: {} {} {}'.format(multiple_src_ips,multiple_dest_ips,multiple_dest_ports))
+        count = sources.size() * destinations.size() * ports.size()
+        if count > self.max_expansion:
+            logger.error('Skipping test record "{}" for interface "{}", it expands to {} testlets, more than the limit of {}.\n'.format(
+                yaml_row, interface, count, self.max_expansion))
+            return
 
-        # logger.debug('-------- TEST DATA -----------')
-        # for k,v in test_data.items():
-        #     logger.debug('{}: {}'.format(k,v))
+        # the equivalence class of every value in each dimension, see minimize()
+        classes = None
+        if self.rule_classes != None:
+            classes = (
+                self.rule_classes.classify('source_ip', [src_ip['ip_address'] for src_ip in sources]),
+                self.rule_classes.classify('destination_ip', [dest_ip['ip_address'] for dest_ip in destinations]),
+                self.rule_classes.classify('destination_port', [dest_port['port'] for dest_port in ports]))
+            representatives = {}
 
-        # ------------------------------------------------------------------------------------------------------------------------- #
-        # 0 0 0
-        if multiple_src_ips == False and multiple_dest_ips == False and multiple_dest_ports == False:
-
-            # if the source and destination IP are valid flag testlet for execution
-            execute = True if ip_information['source']['result'] != False and ip_information[
-                'destination']['result'] != False else False
-
-            # Setup ICMP Type and Code
-
-            testlet = {
-                'index': index,
-                'interface': interface,
-                'protocol': test_data['protocol'],
-                'source_ip': ip_information['source']['ip_address'],
-                'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
-                'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
-                'source_port': test_data['source_port'] if test_data['source_port'] else '',
-                'destination_ip': ip_information['destination']['ip_address'] if ip_information['destination']['ip_address'] else '',
-                'destination_port': test_data['destination_port'] if test_data['destination_port'] else '',
-                'expected_result': test_data['expected_result'],
-                'yaml_row': yaml_row,
-                'execute': execute
-            }
-            self._append_testlet(**testlet)
-
-        # ------------------------------------------------------------------------------------------------------------------------- #
-        # 0 0 1
-        if multiple_src_ips == False and multiple_dest_ips == False and multiple_dest_ports == True:
-
-            # ensure the destinations key is a list
-            if isinstance(port_information['destinations'], list):
-
-                for dest_port in port_information['destinations']:
-
-                    # if the source and destination IP are valid flag testlet for executution
-                    execute = True if ip_information['source']['result'] != False and ip_information[
-                        'destination']['result'] != False else False
+        for src_position, src_ip in enumerate(sources):
 
-                    testlet = {
-                        'index': index,
-                        'interface': interface,
-                        'protocol': test_data['protocol'],
-                        'source_ip': ip_information['source']['ip_address'],
-                        'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
-                        'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
-                        'source_port': test_data['source_port'] if test_data['source_port'] else '',
-                        'destination_ip': ip_information['destination']['ip_address'] if ip_information['destination']['ip_address'] else '',
-                        'destination_port': dest_port['port'] if dest_port['port'] else '',
-                        'expected_result': test_data['expected_result'],
-                        'yaml_row': yaml_row,
-                        'execute': execute
-                    }
-                    self._append_testlet(**testlet)
-
-        # ------------------------------------------------------------------------------------------------------------------------- #
-        # 0 1 0
-        if multiple_src_ips == False and multiple_dest_ips == True and multiple_dest_ports == False:
-
-            # ensure the destinations key is a list
-            if isinstance(ip_information['destinations'], list):
+            for dest_position, dest_ip in enumerate(destinations):
 
-                for dest_ip in ip_information['destinations']:
+                # if the source and destination IP and ports are valid flag testlet for execution
+                execute = True if src_ip['result'] != False and dest_ip['result'] != False and \
+                    port_information['source']['valid'] else False
 
-                    # if the source and destination IP are valid flag testlet for executution
-                    execute = True if ip_information['source']['result'] != False and dest_ip['result'] != False else False
+                for port_position, dest_port in enumerate(ports):
 
                     testlet = {
                         'index': index,
                         'interface': interface,
                         'protocol': test_data['protocol'],
-                        'source_ip': ip_information['source']['ip_address'],
+                        'source_ip': src_ip['ip_address'],
                         'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
                         'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
                         'source_port': test_data['source_port'] if test_data['source_port'] else '',
                         'destination_ip': dest_ip['ip_address'] if dest_ip['ip_address'] else '',
-                        'destination_port': test_data['destination_port'] if test_data['destination_port'] else '',
+                        'destination_port': dest_port['port'] if dest_port['port'] else '',
                         'expected_result': test_data['expected_result'],
                         'yaml_row': yaml_row,
-                        'execute': execute
+                        'execute': execute and dest_port['valid']
                     }
+                    testlet = self._build_testlet(**testlet)
 
-                    self._append_testlet(**testlet)
+                    if classes != None and testlet['execute'] == True:
+                        self._minimize_testlet(testlet, representatives, classes[0][src_position],
+                                               classes[1][dest_position], classes[2][port_position])
 
-        # ------------------------------------------------------------------------------------------------------------------------- #
-        # 0 1 1
-        if multiple_src_ips == False and multiple_dest_ips == True and multiple_dest_ports == True:
+                    yield testlet
 
-            if isinstance(ip_information['destinations'], list):
+    def _minimize_testlet(self, testlet, representatives, source, destination, port):
+        '''
+        Takes the (class, first, boundary) of each of the testlet's values.
+        The first testlet of a class is its representative, testlets on the class boundary run as well,
+        every other testlet is flagged to reuse the representative's result.
+        '''
 
-                for dest_ip in ip_information['destinations']:
+        key = (source[0], destination[0], port[0])
 
-                    # if the source and destination IP are valid flag testlet for executution
-                    execute = True if ip_information['source']['result'] != False and dest_ip['result'] != False else False
+        if source[1] and destination[1] and port[1]:
+            representatives[key] = testlet['command']
+        elif not (source[2] and destination[2] and port[2]):
+            testlet['inferred'] = representatives.get(key)
 
-                    # ensure the destinations key is a list
-                    if isinstance(port_information['destinations'], list):
+    def minimize(self, connect):
+        '''
+        Fetches "show access-list" once, rows are then split into ACE equivalence classes as they are constructed
+        and only one representative plus the boundary values of each class are executed.
+        Without any ACE every value would share one class, so minimization is turned off instead.
+        '''
 
-                        for dest_port in port_information['destinations']:
+        output = connect.send_command('show access-list')
+        if 'ERROR' in output:
+            logger.error('"show access-list" failed, tests will not be minimized: {}'.format(output.strip()))
+            self.rule_classes = None
+            return
 
-                            testlet = {
-                                'index': index,
-                                'interface': interface,
-                                'protocol': test_data['protocol'],
-                                'source_ip': ip_information['source']['ip_address'],
-                                'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
-                                'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
-                                'source_port': test_data['source_port'] if test_data['source_port'] else '',
-                                'destination_ip': dest_ip['ip_address'] if dest_ip['ip_address'] else '',
-                                'destination_port': dest_port['port'] if dest_port['port'] else '',
-                                'expected_result': test_data['expected_result'],
-                                'yaml_row': yaml_row,
-                                'execute': execute
-                            }
-                            self._append_testlet(**testlet)
-        # ------------------------------------------------------------------------------------------------------------------------- #
-        # 1 0 0
-        if multiple_src_ips == True and multiple_dest_ips == False and multiple_dest_ports == False:
+        rule_classes = RuleClasses(output)
+        if not rule_classes.entries:
+            logger.error('No ACEs found in "show access-list", tests will not be minimized')
+            self.rule_classes = None
+            return
 
-            if isinstance(ip_information['sources'], list):
+        self.rule_classes = rule_classes
 
-                for src_ip in ip_information['sources']:
 
-                    # if the source and destination IP are valid flag testlet for executution
-                    execute = True if ip_information['destination'][
-                        'result'] != False and src_ip['result'] != False else False
+    def iter_testset(self):
+        '''
+        Generator version of construct_testset, yields each testlet as its YAML row is expanded.
+        Only one row's testlets are held at a time, execute can consume them as they arrive.
+        With a CompiledTestset that matched the suite the testlets are read back from it,
+        otherwise they are compiled to it as they are built.
+        '''
 
-                    testlet = {
-                        'index': index,
-                        'interface': interface,
-                        'protocol': test_data['protocol'],
-                        'source_ip': src_ip['ip_address'],
-                        'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
-                        'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
-                        'source_port': test_data['source_port'] if test_data['source_port'] else '',
-                        'destination_ip': ip_information['destination']['ip_address'] if ip_information['destination']['ip_address'] else '',
-                        'destination_port': test_data['destination_port'] if test_data['destination_port'] else '',
-                        'expected_result': test_data['expected_result'],
-                        'yaml_row': yaml_row,
-                        'execute': execute
-                    }
+        self.duplicates = 0
+        self.inferred = 0
 
-                    self._append_testlet(**testlet)
-        # ------------------------------------------------------------------------------------------------------------------------- #
-        # 1 0 1
-        if multiple_src_ips == True and multiple_dest_ips == False and multiple_dest_ports == True:
-
-            if isinstance(ip_information['sources'], list):
-
-                for src_ip in ip_information['sources']:
-
-                    # if the source and destination IP are valid flag testlet for executution
-                    execute = True if ip_information['destination'][
-                        'result'] != False and src_ip['result'] != False else False
-
-                    # ensure the destinations key is a list
-                    if isinstance(port_information['destinations'], list):
-
-                        for dest_port in port_information['destinations']:
-
-                            testlet = {
-                                'index': index,
-                                'interface': interface,
-                                'protocol': test_data['protocol'],
-                                'source_ip': src_ip['ip_address'],
-                                'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
-                                'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
-                                'source_port': test_data['source_port'] if test_data['source_port'] else '',
-                                'destination_ip': ip_information['destination']['ip_address'] if ip_information['destination']['ip_address'] else '',
-                                'destination_port': dest_port['port'] if dest_port['port'] else '',
-                                'expected_result': test_data['expected_result'],
-                                'yaml_row': yaml_row,
-                                'execute': execute
-                            }
-                            self._append_testlet(**testlet)
-        # ------------------------------------------------------------------------------------------------------------------------- #
-        # 1 1 0
-        if multiple_src_ips == True and multiple_dest_ips == True and multiple_dest_ports == False:
-
-            if isinstance(ip_information['sources'], list) and isinstance(ip_information['destinations'], list):
-
-                for src_ip in ip_information['sources']:
-
-                    for dest_ip in ip_information['destinations']:
-
-                        # if the source and destination IP are valid flag testlet for executution
-                        execute = True if src_ip['result'] != False and dest_ip['result'] != False else False
-
-                        testlet = {
-                            'index': index,
-                            'interface': interface,
-                            'protocol': test_data['protocol'],
-                            'source_ip': src_ip['ip_address'],
-                            'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
-                            'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
-                            'source_port': test_data['source_port'] if test_data['source_port'] else '',
-                            'destination_ip': dest_ip['ip_address'] if dest_ip['ip_address'] else '',
-                            'destination_port': test_data['destination_port'] if test_data['destination_port'] else '',
-                            'expected_result': test_data['expected_result'],
-                            'yaml_row': yaml_row,
-                            'execute': execute
-                        }
-                        self._append_testlet(**testlet)
-        # ------------------------------------------------------------------------------------------------------------------------- #
-        # 1 1 1
-        if multiple_src_ips == True and multiple_dest_ips == True and multiple_dest_ports == True:
-
-            if isinstance(ip_information['sources'], list) and isinstance(ip_information['destinations'], list):
-
-                for src_ip in ip_information['sources']:
-
-                    for dest_ip in ip_information['destinations']:
-
-                        # if the source and destination IP are valid flag testlet for executution
-                        execute = True if src_ip['result'] != False and dest_ip['result'] != False else False
-
-                        # ensure the destinations key is a list
-                        if isinstance(port_information['destinations'], list):
-
-                            for dest_port in port_information['destinations']:
-
-                                testlet = {
-                                    'index': index,
-                                    'interface': interface,
-                                    'protocol': test_data['protocol'],
-                                    'source_ip': src_ip['ip_address'],
-                                    'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
-                                    'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
-                                    'source_port': test_data['source_port'] if test_data['source_port'] else '',
-                                    'destination_ip': dest_ip['ip_address'] if dest_ip['ip_address'] else '',
-                                    'destination_port': dest_port['port'] if dest_port['port'] else '',
-                                    'expected_result': test_data['expected_result'],
-                                    'yaml_row': yaml_row,
-                                    'execute': execute
-                                }
-                                self._append_testlet(**testlet)
-        # ------------------------------------------------------------------------------------------------------------------------- #
+        # minimized testlets depend on the ASA's access-lists, they are never compiled
+        compiled = self.compiled if self.rule_classes is None else None
+        if compiled is None and self.compiled != None:
+            # load() may have opened the compiled testset, it is not read
+            self.compiled.close()
 
-    def construct_testset(self):
+        try:
+            if compiled != None and compiled.loaded:
+                for testlet in compiled.testlets(self.values):
+                    if testlet['duplicate']:
+                        self.duplicates += 1
+                    yield testlet
+            elif compiled != None:
+                compiled.create()
+                for testlet in self._expand_testset():
+                    compiled.add(testlet)
+                    yield testlet
+                compiled.complete()
+            else:
+                for testlet in self._expand_testset():
+                    yield testlet
+        finally:
+            if compiled != None:
+                compiled.close()
+
+        if self.duplicates:
+            logger.info('{} duplicate commands will reuse earlier results'.format(self.duplicates))
+        if self.inferred:
+            logger.info('{} testlets will be inferred from their ACE class representative'.format(self.inferred))
+
+    def _expand_testset(self):
+        '''
+        Generator, resolves and expands every YAML row into its testlets.
         '''
-        Takes the contaxt YAML data and constructs commandset with expected outcomes for each test.
 
-        Accepts lists for:
-          - Destination IP
+        # recently seen commands, see _mark_duplicate
+        window = OrderedDict()
 
-        Returns the testset for use un exectute method.
-        '''
+        # an interface may come up again in a later document of a TestSuite, its rows are numbered on
+        indexes = {}
 
         # iterate through the interface dictionary and actions list
         for interface, item in self.context.items():
 
+            self.jinja2_results.setdefault(interface, {})
+            first = indexes.get(interface, 0)
+            indexes[interface] = first + len(item)
+
+            # resolve the DNS names of these rows up front, _host_lookup then hits the cache
+            with timer.stage('resolve'):
+                self._resolve_names(item)
+
             # iterate through the action list
-            for index, test_data in enumerate(item):
+            for index, test_data in enumerate(item, first):
 
                 # logger.debug('Processing test item {}'.format(index))
 
@@ -566,29 +407,88 @@ class TestControl(object):
 
                 # logger.debug('item {} data: {}'.format(index,self.yaml_row))
 
-                ip_information = self._host_lookup(test_data)
+                with timer.stage('resolve'):
+                    ip_information = self._host_lookup(test_data)
                 port_information = self._port_information(test_data)
 
-                self._construct_testlet(index,
-                                        interface, ip_information, port_information, test_data, self.yaml_row)
+                for testlet in self._construct_testlet(index,
+                                                       interface, ip_information, port_information, test_data, self.yaml_row):
+                    self._mark_duplicate(window, testlet)
+                    yield testlet
+
+    def construct_testset(self):
+        '''
+        Takes the contaxt YAML data and constructs commandset with expected outcomes for each test.
+
+        Accepts lists, prefixes and port ranges for:
+          - Source IP
+          - Destination IP
+          - Destination port
+
+        Returns the testset for use un exectute method.
+        '''
+
+        testset = list(timer.iterate('construct', self.iter_testset()))
+        self.testset = testset
 
         return self.testset
 
-    def execute(self, testset, connect):
+    def _mark_duplicate(self, window, testlet):
+        '''
+        Flags a runnable testlet whose command was seen within the last DUPLICATE_WINDOW unique commands.
+        Duplicates are not sent to the ASA, they reuse the earlier testlet's parsed result.
+        execute keeps a window of results updated in the same order, so every flagged command is still held there.
+        '''
+
+        testlet['duplicate'] = False
+        if testlet['execute'] != True:
+            return
+
+        # inferred testlets reuse their representative's result the same way
+        if testlet['inferred'] != None:
+            if testlet['inferred'] in window:
+                window.move_to_end(testlet['inferred'])
+                self.inferred += 1
+                return
+            testlet['inferred'] = None
+
+        command = testlet['command']
+        if command in window:
+            testlet['duplicate'] = True
+            window.move_to_end(command)
+            self.duplicates += 1
+        else:
+            window[command] = None
+            if len(window) > self.DUPLICATE_WINDOW:
+                window.popitem(last=False)
+
+    def _interface_results(self, test_data):
+        '''
+        Sets up the expected_result list and interface test_stats the first time an interface is seen.
+        '''
+
+        results = self.jinja2_results.setdefault(test_data['interface'], {})
+        should = 'should_{}'.format(test_data['expected_result'])
+
+        if should not in results:
+            results[should] = []
+        if 'interface_stats' not in results:
+            results['interface_stats'] = {'total': 0, 'skip': 0, 'pass': 0, 'fail': 0}
+
+        return results, should
+
+    def execute(self, testset, connect, spool=None, writers=None, host=None, journal=None):
         '''
         The main brains of the operation.
         Called after the contruct methods
-        '''
 
-        # first setup each dictionary for expected_results and interface test_stats
-        for test_data in testset:
-            self.jinja2_results[test_data['interface']]['should_{}'.format(
-                test_data['expected_result'])] = []
-            self.jinja2_results[test_data['interface']]['interface_stats'] = {}
-            self.jinja2_results[test_data['interface']]['interface_stats']['total'] = 0
-            self.jinja2_results[test_data['interface']]['interface_stats']['skip'] = 0
-            self.jinja2_results[test_data['interface']]['interface_stats']['pass'] = 0
-            self.jinja2_results[test_data['interface']]['interface_stats']['fail'] = 0
+        testset may be a list or the iter_testset generator, testlets are executed as they arrive.
+        With a ResultSpool the result rows are written to disk instead of being kept in memory,
+        the returned jinja2_results then reads them back lazily.
+        writers are the streaming outputs from OpenWriters, each row is written as soon as it is graded,
+        host labels those rows in fleet runs.
+        With a ResultJournal every new result is journaled, and a resumed journal answers testlets it already holds.
+        '''
 
         # setup total play teststats dictionary
         self.jinja2_results['full_stats'] = {}
@@ -596,23 +496,111 @@ class TestControl(object):
         self.jinja2_results['full_stats']['skip'] = 0
         self.jinja2_results['full_stats']['pass'] = 0
         self.jinja2_results['full_stats']['fail'] = 0
-
-        for index, test_data in enumerate(testset):
+        self.jinja2_results['full_stats']['saved'] = 0
+        self.jinja2_results['full_stats']['cached'] = 0
+        self.jinja2_results['full_stats']['inferred'] = 0
+        self.jinja2_results['full_stats']['resumed'] = 0
+
+        # results of recently run commands, kept in step with the window in _mark_duplicate
+        window = OrderedDict()
+
+        # results of earlier runs against the same configuration
+        result_cache = self.result_cache
+        if result_cache != None and not result_cache.open(connect):
+            result_cache = None
+
+        # testlets handed to the connection and waiting for their output, in testset order
+        pending = deque()
+
+        # a streamed testset is built while it runs, a list was timed by construct_testset
+        if not isinstance(testset, list):
+            testset = timer.iterate('construct', testset)
+
+        def _commands():
+            '''
+            Decides how each testlet is answered, in testset order, and yields the command to send or None.
+            Runs in the SessionPool feeder thread when sessions are pooled.
+            '''
+
+            for test_data in testset:
+                cached = replayed = None
+                send = test_data['execute'] == True and not test_data.get('duplicate') and not test_data.get('inferred')
+                if send and journal != None:
+                    replayed = journal.replay(test_data)
+                    send = replayed is None
+                if send and result_cache != None:
+                    cached = result_cache.get(test_data['command'])
+                    send = cached is None
+
+                pending.append((test_data, cached, replayed))
+                yield test_data['command'] if send else None
+
+        # outputs come back in testset order, None for testlets that were not sent
+        for cli_output, latency in timer.iterate('send', self._send_commands(connect, _commands())):
+
+            test_data, cached, replayed = pending.popleft()
+            results, should = self._interface_results(test_data)
 
             # process only tasks flagged for execution (True)
             # items flagged as False could not have IP Addresses resolved
             if test_data['execute'] == True:
 
                 self.jinja2_results['full_stats']['total'] += 1
-                self.jinja2_results[test_data['interface']]['interface_stats']['total'] += 1
+                results['interface_stats']['total'] += 1
 
                 logger.info('Excuting interface {}'.format(
                     test_data['interface']))
                 logger.info('Command: {}'.format(test_data['command']))
 
-                cli_output = connect.send_command(test_data['command'])
-                ParseData = ASAPolicyTest(self.script_dir, cli_output)
-                test_results = ParseData.TestResult()
+                if test_data.get('inferred'):
+                    logger.info('Same ACE class as "{}", result inferred'.format(test_data['inferred']))
+                    self.jinja2_results['full_stats']['inferred'] += 1
+                    test_results = window[test_data['inferred']]
+                    window.move_to_end(test_data['inferred'])
+                elif test_data.get('duplicate'):
+                    logger.info('Duplicate command, reusing earlier result')
+                    self.jinja2_results['full_stats']['saved'] += 1
+                    test_results = window[test_data['command']]
+                    window.move_to_end(test_data['command'])
+                else:
+                    unparsed = False
+                    if replayed != None:
+                        logger.info('Result replayed from the journal')
+                        self.jinja2_results['full_stats']['resumed'] += 1
+                        test_results = TraceResult(replayed, self.values)
+                    elif cached != None:
+                        logger.info('Unchanged configuration, result served from cache')
+                        self.jinja2_results['full_stats']['cached'] += 1
+                        test_results = TraceResult(cached, self.values)
+                    else:
+                        if latency != None:
+                            timer.command(test_data['interface'], test_data['protocol'], latency)
+                        if isinstance(cli_output, dict):
+                            # evaluated offline, already in TestResult form
+                            parsed = cli_output
+                        else:
+                            with timer.stage('parse'):
+                                ParseData = ASAPolicyTest(self.script_dir, cli_output, self.parser)
+                                parsed = ParseData.TestResult()
+
+                        # output without a result, such as an invalid input error, fails the testlet
+                        # it is neither cached nor journaled, so a later run sends the command again
+                        if parsed is None:
+                            unparsed = True
+                            logger.error('No packet-tracer result in the output: {}'.format(
+                                str(cli_output).strip()))
+                            parsed = {'asa_action': 'error', 'drop_reason': '(unparsed) {}'.format(
+                                ' '.join(str(cli_output).split())[:200])}
+                        elif result_cache != None:
+                            result_cache.store(test_data['command'], parsed)
+                        test_results = TraceResult(parsed, self.values)
+
+                    if replayed is None and journal != None and not unparsed:
+                        journal.append(test_data, test_results)
+
+                    window[test_data['command']] = test_results
+                    if len(window) > self.DUPLICATE_WINDOW:
+                        window.popitem(last=False)
 
                 # log to terminal the overall ASA action
                 logger.info('Expecting: {}'.format(
@@ -637,103 +625,100 @@ class TestControl(object):
                     logger.info('Test passed!\n')
                     grade = '[PASS]'
                     self.jinja2_results['full_stats']['pass'] += 1
-                    self.jinja2_results[test_data['interface']]['interface_stats']['pass'] += 1
+                    results['interface_stats']['pass'] += 1
             
                 else:
                     logger.error('Test failed!\n')
                     grade = '[FAIL]'
                     self.jinja2_results['full_stats']['fail'] += 1
-                    self.jinja2_results[test_data['interface']]['interface_stats']['fail'] += 1
-
-                self.jinja2_results[test_data['interface']]['should_{}'.format(test_data['expected_result'])].append({
-                    'command': test_data['command'],
-                    'index': test_data['index'],
-                    'interface': test_data['interface'],
-                    'protocol': test_data['protocol'],
-                    'source_ip': test_data['source_ip'],
-                    'source_port': test_data['source_port'] if test_data['source_port'] is not None else '',
-                    'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
-                    'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
-                    'output_interface': test_results['output_interface'],
-                    'destination_ip': test_data['destination_ip'],
-                    'destination_port': test_data['destination_port'] if test_data['destination_port'] is not None else '',
-                    'expected_result': test_data['expected_result'],
-                    'asa_action': test_results['asa_action'] if test_results['asa_action'] is not None else '',
-                    'drop_reason': test_results['drop_reason'] if test_results['drop_reason'] is not None else '',
-                    'nat_from': test_results['nat_from'] if test_results['nat_from'] is not None else '',
-                    'nat_to': test_results['nat_to'] if test_results['nat_to'] is not None else '',
-                    'nat_rule': test_results['nat_rule'] if test_results['nat_rule'] is not None else '',
-                    'yaml_row': test_data['yaml_row'],
-                    'grade': grade
-                })
+                    results['interface_stats']['fail'] += 1
+
+                row = TestRow(test_data, test_results, grade)
             else:
                 self.jinja2_results['full_stats']['skip'] += 1
-                self.jinja2_results[test_data['interface']]['interface_stats']['skip'] += 1
-                self.jinja2_results[test_data['interface']]['should_{}'.format(test_data['expected_result'])].append({
-                    'command': test_data['command'],
-                    'index': test_data['index'],
-                    'interface': test_data['interface'],
-                    'protocol': test_data['protocol'],
-                    'source_ip': test_data['source_ip'],
-                    'source_port': test_data['source_port'] if test_data['source_port'] is not None else '',
-                    'icmp_type': test_data['icmp_type'] if isinstance(test_data['icmp_type'], int) else '',
-                    'icmp_code': test_data['icmp_code'] if isinstance(test_data['icmp_code'], int) else '',
-                    'output_interface': test_results['output_interface'],
-                    'destination_ip': test_data['destination_ip'],
-                    'destination_port': test_data['destination_port'] if test_data['destination_port'] is not None else '',
-                    'expected_result': test_data['expected_result'],
-                    'asa_action': '',
-                    'drop_reason': '',
-                    'nat_from': '',
-                    'nat_to': '',
-                    'nat_rule': '',
-                    'yaml_row': test_data['yaml_row'],
-                    'grade': '[SKIP]'
-                })
-                logger.error('Skipping test record "{}" for interface "{}", unable to resolve address(es) from this testlet.\n'.format(
+                results['interface_stats']['skip'] += 1
+                row = TestRow(test_data, None, '[SKIP]')
+                logger.error('Skipping test record "{}" for interface "{}", unable to resolve address(es) or invalid port in this testlet.\n'.format(
                     test_data['yaml_row'], test_data['interface']))
 
-        # # append the loops test results to the jinja2 dictionary and return jinja2 dictionary to main.
-        # self.jinja2_results[test_data['interface']]['should_{}'.format(
-        #     test_data['expected_result'])] = self.test_results
+            for writer in writers or ():
+                writer.write(row, should, host)
+
+            if spool != None:
+                spool.append(test_data['interface'], should, row)
+            else:
+                results[should].append(row)
+
+        # swap the spooled rows in, they are read back from disk by the report and retry.yml
+        if spool != None:
+            for interface, should in spool.keys():
+                self.jinja2_results[interface][should] = spool.rows(interface, should)
+
+        if result_cache != None:
+            result_cache.close()
 
-        # Look for failed tests, call method to generate retry.yml if found
-        if RecursiveSearch(self.jinja2_results, 'grade', 'FAIL'):
-            # delete any retry file before starting
-            self._delete_retry()
+        # every testlet has its result, the journal is not needed any more
+        if journal != None:
+            journal.complete()
 
-            logger.info('tests/retry.yml generated for failed items reruns')
+        # Look for failed or skipped tests, call method to generate retry.yml if found
+        # delete any retry file before starting
+        self._delete_retry()
+        if self.jinja2_results['full_stats']['fail'] or self.jinja2_results['full_stats']['skip']:
+            logger.info('tests/{} generated for failed items reruns'.format(self.retry_name))
             self._retry_tests()
 
         # return the results for report processing
         return self.jinja2_results
 
+    def _send_commands(self, connect, commands):
+        '''
+        Generator, yields (cli output, seconds the command took) in order, (None, None) for a None command.
+        Accepts a single netmiko session or anything with send_commands, such as a SessionPool,
+        those report the time each command took as last_latency.
+        An OfflineASA yields its evaluated result dictionary in place of the output, there is nothing to parse.
+        '''
+
+        if isinstance(connect, OfflineASA):
+            for command in commands:
+                if command is None:
+                    yield None, None
+                    continue
+                started = time.time()
+                result = connect.trace(command)
+                yield result if result is not None else connect.send_command(command), time.time() - started
+        elif hasattr(connect, 'send_commands'):
+            for cli_output in connect.send_commands(commands):
+                yield cli_output, getattr(connect, 'last_latency', None)
+        else:
+            for command in commands:
+                if command is None:
+                    yield None, None
+                    continue
+                started = time.time()
+                cli_output = connect.send_command(command)
+                yield cli_output, time.time() - started
+
     def _delete_retry(self):
         import os
 
         try:
-            os.unlink('{}/tests/retry.yml'.format(self.script_dir))
+            os.unlink('{}/tests/{}'.format(self.script_dir, self.retry_name))
         except Exception:
-            logger.info('tests/retry.yml missing, moving on')
+            logger.info('tests/{} missing, moving on'.format(self.retry_name))
             pass
 
     def _retry_tests(self):
         '''
         Parses self.jinja2_results and extracts failed tests.
-        Generates tests/retry.yml
+        Generates tests/retry.yml, or the retry_name given to the class
+        Rows are written one at a time as JSON flow mappings, which YAML loads as is.
         '''
 
-        import yaml
-
-        # setup the retry dictionary
-        testset = {}
-
-        # setup the interface dictionarys keys
-        for interface, result in self.jinja2_results.items():
-            testset[interface] = []
+        import json
 
         # open the file for appending
-        with open('{}/tests/retry.yml'.format(self.script_dir), 'a') as outfile:
+        with open('{}/tests/{}'.format(self.script_dir, self.retry_name), 'a') as outfile:
 
             # iterate through the test results
             for interface, result in self.jinja2_results.items():
@@ -741,6 +726,9 @@ class TestControl(object):
                 # omit processing full test suite test_stats
                 if interface != 'full_stats':
 
+                    outfile.write('{}:'.format(json.dumps(interface)))
+                    count = 0
+
                     for item, data in result.items():
 
                         # omit processing interface test_stats
@@ -763,7 +751,7 @@ class TestControl(object):
 
                                         # logger.debug('apending {}'.format(retry_dict))
 
-                                        testset[interface].append(retry_dict)
+                                        outfile.write('\n- {}'.format(json.dumps(retry_dict, sort_keys=True)))
+                                        count += 1
 
-            yaml.dump(testset, outfile, default_flow_style=True)
-            outfile.close()
+                    outfile.write('\n' if count else ' []\n')
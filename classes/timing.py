@@ -0,0 +1,167 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+
+class LatencyHistogram(object):
+
+    '''
+    Log scaled latency histogram, 16 buckets per doubling, so percentiles come back within about 4%.
+    A percentile is interpolated inside its bucket, so close latencies still give p50 < p95 < p99.
+    Memory does not grow with the number of samples.
+    '''
+
+    BUCKETS_PER_DOUBLING = 16
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        seconds = max(seconds, 1e-6)
+        bucket = int(math.floor(math.log2(seconds) * self.BUCKETS_PER_DOUBLING))
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+
+        target = percent / 100.0 * self.count
+        running = 0
+        for bucket in sorted(self.counts):
+            count = self.counts[bucket]
+            if running + count >= target:
+                # interpolated by rank between the bucket edges, kept inside the observed range
+                # the buckets are log scaled so the step is too, samples in one bucket still spread out
+                lower = max(2 ** (bucket / float(self.BUCKETS_PER_DOUBLING)), self.min)
+                upper = min(2 ** ((bucket + 1) / float(self.BUCKETS_PER_DOUBLING)), self.max)
+                return lower * (upper / lower) ** ((target - running) / float(count))
+            running += count
+        return self.max
+
+    def summary(self):
+        '''
+        Count and milliseconds rounded to 0.01.
+        '''
+
+        if not self.count:
+            return {'count': 0}
+
+        def ms(seconds):
+            return round(seconds * 1000, 2)
+
+        return OrderedDict([
+            ('count', self.count),
+            ('mean_ms', ms(self.total / self.count)),
+            ('min_ms', ms(self.min)),
+            ('p50_ms', ms(self.percentile(50))),
+            ('p95_ms', ms(self.percentile(95))),
+            ('p99_ms', ms(self.percentile(99))),
+            ('max_ms', ms(self.max)),
+        ])
+
+
+class StageTimer(object):
+
+    '''
+    Wall time per stage of a run plus packet-tracer latency histograms by interface and protocol.
+    Stage times are exclusive, time spent in a stage nested inside another is only counted once.
+    Stages in different threads, such as testlets built in the SessionPool feeder, can overlap.
+    '''
+
+    # the order stages are reported in, others follow in the order first seen
+    STAGES = ('load', 'resolve', 'construct', 'connect', 'send', 'parse', 'report')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.stages = OrderedDict((name, [0.0, 0]) for name in self.STAGES)
+            self.latency = {'all': LatencyHistogram(), 'interface': OrderedDict(), 'protocol': OrderedDict()}
+
+    def _stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def add(self, name, seconds, count=1):
+        with self.lock:
+            stage = self.stages.setdefault(name, [0.0, 0])
+            stage[0] += seconds
+            stage[1] += count
+
+    @contextmanager
+    def stage(self, name):
+        stack = self._stack()
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.add(name, elapsed - nested)
+
+    def iterate(self, name, iterable):
+        '''
+        Generator, times every step of iterable as the stage name.
+        '''
+
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def command(self, interface, protocol, seconds):
+        '''
+        Records the latency of one packet-tracer command.
+        '''
+
+        protocol = str(protocol).lower()
+        with self.lock:
+            self.latency['all'].add(seconds)
+            self.latency['interface'].setdefault(interface, LatencyHistogram()).add(seconds)
+            self.latency['protocol'].setdefault(protocol, LatencyHistogram()).add(seconds)
+
+    def summary(self):
+        '''
+        Machine readable summary, stages that never ran are left out.
+        '''
+
+        with self.lock:
+            return OrderedDict([
+                ('wall_seconds', round(time.time() - self.started, 3)),
+                ('stages', OrderedDict((name, {'seconds': round(seconds, 3), 'count': count})
+                                       for name, (seconds, count) in self.stages.items() if count)),
+                ('latency', OrderedDict([
+                    ('all', self.latency['all'].summary()),
+                    ('interface', OrderedDict((key, histogram.summary())
+                                              for key, histogram in self.latency['interface'].items())),
+                    ('protocol', OrderedDict((key, histogram.summary())
+                                             for key, histogram in self.latency['protocol'].items())),
+                ])),
+            ])
+
+
+# shared by every stage of the run, like the dns_cache
+timer = StageTimer()
@@ -15,16 +15,26 @@ python_version  : 3.5.2
 
 import sys
 import os
-import yaml
-import re
 import datetime
 from netmiko import ConnectHandler
 from logzero import logger
 
-from classes.report import GenerateReport
+from classes.report import GenerateReport, ResultSpool
+from classes.outputs import OpenWriters
+from classes.journal import ResultJournal
 from classes.resolve import Resolve
 from classes.testcontrol import TestControl
 from classes.checkargs import CheckArgs
+from classes.sessionpool import SessionPool
+from classes.pipeline import PipelinedSession
+from classes.asyncsession import AsyncSessionPool
+from classes.timing import timer
+from classes.fleet import FleetControl, LoadInventory, DeviceFileName
+from classes.contexts import ContextControl
+from classes.resultcache import ResultCache
+from classes.compiled import CompiledTestset, CompiledPath
+from classes.suite import TestSuite
+from classes.offline import OfflineASA, RunningConfig
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
 
@@ -33,7 +43,7 @@ if __name__ == "__main__":
     os.system('cls' if os.name == 'nt' else 'clear')
 
     # capture the passed arguments
-    HOST, SSH_PORT, YAML_FILE, USERNAME, PASSWORD, ENABLE_PASSWORD, HOSTFILE, REPORTNAME = CheckArgs(
+    HOST, SSH_PORT, YAML_FILE, USERNAME, PASSWORD, ENABLE_PASSWORD, HOSTFILE, REPORTNAME, SESSIONS, INVENTORY, MAX_DEVICES, PARSER, CACHE, OFFLINE, MAX_EXPANSION, MINIMIZE, REPORT_FORMAT, JSONL, JUNIT, CSV, RESUME, PIPELINE, TRANSPORT, COMPILE, CONTEXTS = CheckArgs(
         sys.argv[1:])
 
     reportname = REPORTNAME if REPORTNAME else None
@@ -60,29 +70,149 @@ if __name__ == "__main__":
         hostfile_status = False
         pass
 
+    writers = []
+
     try:
-        # store the yaml tests
-        with open('{}/tests/{}'.format(script_dir, YAML_FILE), 'r') as yml:
-            yaml_data = yaml.safe_load(yml)
+        # a file, directory or glob under tests/, read a document at a time as the testset is built
+        yaml_data = TestSuite('{}/tests/{}'.format(script_dir, YAML_FILE))
+
+        # an unchanged suite comes back from its compiled testset
+        compiled = None
+        if COMPILE and CONTEXTS:
+            logger.error('Compiled testsets are not kept for suites grouped by security context, ignored')
+        elif COMPILE:
+            with timer.stage('load'):
+                compiled = CompiledTestset(CompiledPath('{}/tests'.format(script_dir), YAML_FILE), yaml_data,
+                                           HOSTFILE, MAX_EXPANSION)
+                compiled.load()
 
         logger.info('! ---------- CONSTRUCTING TESTS ---------- !\n')
 
         test_control = TestControl(
-            script_dir, yaml_data, hostfile_status, hostfile_list)  # call TestControl
-        testset = test_control.construct_testset()   # Build testset
+            script_dir, yaml_data, hostfile_status, hostfile_list, parser=PARSER,
+            result_cache=ResultCache(CACHE, HOST) if CACHE and HOST else None,
+            max_expansion=MAX_EXPANSION, compiled=compiled)  # call TestControl
+
+        # the fleet runs one list against every device, a single device streams testlets from the YAML
+        # each security context builds its own testset from its part of the suite
+        if INVENTORY:
+            testset = test_control.construct_testset()   # Build testset
+        elif CONTEXTS:
+            contexts = yaml_data.contexts()
+            logger.info('Suite covers {} security contexts: {}'.format(len(contexts), ', '.join(contexts)))
+        else:
+            testset = test_control.iter_testset()
 
         print('\n')
         logger.info('! ----------   EXECUTING TESTS  ---------- !\n')
-        logger.info('Attempting connection to {}'.format(device['ip']))
-
-        connect = ConnectHandler(**device)
-        if connect:
-            results = test_control.execute(testset, connect)
 
-        report = GenerateReport(results, script_dir, datetime.datetime.now().strftime(
-            "%d/%m/%Y @ %H:%M:%S"), REPORTNAME)  
-        report.gen_report()
-        report.cli_stats()
+        generated = datetime.datetime.now().strftime("%d/%m/%Y @ %H:%M:%S")
+
+        # machine readable outputs, written as each testlet is graded
+        writers = OpenWriters(JSONL, JUNIT, CSV)
+
+        if PIPELINE > 1 and SESSIONS > 1:
+            logger.error('Pipelining runs on a single session, ignored with {} sessions'.format(SESSIONS))
+        if PIPELINE > 1 and TRANSPORT == 'asyncssh':
+            logger.error('Pipelining is for netmiko sessions, ignored with the asyncssh transport')
+
+        if INVENTORY:
+
+            # run the same testset against every device in the inventory
+            if MINIMIZE:
+                logger.error('Test minimization is per device, ignored for inventory runs')
+
+            fleet = FleetControl(script_dir, yaml_data, LoadInventory(INVENTORY), device,
+                                 hostfile_status, hostfile_list, MAX_DEVICES, SESSIONS, PARSER, CACHE, writers,
+                                 RESUME, PIPELINE, TRANSPORT)
+            fleet_results = fleet.execute(testset)
+
+            # one report per device plus the combined report
+            for host, results in fleet_results.items():
+                filename = DeviceFileName(host)
+                report = GenerateReport(results, script_dir, generated, filename, prefix=filename,
+                                        report_format=REPORT_FORMAT)
+                report.gen_report()
+
+            report = GenerateReport(fleet.combined_results(), script_dir, generated, REPORTNAME,
+                                    report_format=REPORT_FORMAT)
+            report.gen_report(per_interface=False)
+            report.cli_stats()
+            report.gen_timing()
+
+        elif CONTEXTS:
+
+            # every context of the ASA on its own sessions
+            chassis = ContextControl(script_dir, contexts, device, hostfile_status, hostfile_list, MAX_DEVICES,
+                                     SESSIONS, PARSER, CACHE, writers, RESUME, PIPELINE, TRANSPORT, MAX_EXPANSION,
+                                     MINIMIZE)
+            context_results = chassis.execute()
+
+            # one report per context plus the combined report
+            for name, results in context_results.items():
+                filename = DeviceFileName(name)
+                report = GenerateReport(results, script_dir, generated, filename, prefix=filename,
+                                        report_format=REPORT_FORMAT)
+                report.gen_report()
+
+            report = GenerateReport(chassis.combined_results(), script_dir, generated, REPORTNAME,
+                                    report_format=REPORT_FORMAT)
+            report.gen_report(per_interface=False)
+            report.cli_stats()
+            report.gen_timing()
+
+        else:
+
+            with timer.stage('connect'):
+
+                # evaluate against the saved running-config, no ASA required
+                if OFFLINE:
+                    logger.info('Evaluating against running-config "{}"'.format(OFFLINE))
+                    with open(OFFLINE, 'r') as running_config:
+                        connect = OfflineASA(RunningConfig(running_config.read()))
+
+                # every session on the shared event loop
+                elif TRANSPORT == 'asyncssh':
+                    logger.info('Attempting connection to {}'.format(device['ip']))
+                    logger.info('Opening {} asyncssh sessions'.format(SESSIONS))
+                    connect = AsyncSessionPool(device, SESSIONS).open()
+
+                # open a pool of sessions when asked, otherwise a single session
+                elif SESSIONS > 1:
+                    logger.info('Attempting connection to {}'.format(device['ip']))
+                    logger.info('Opening {} sessions'.format(SESSIONS))
+                    connect = SessionPool(device, SESSIONS).open()
+                else:
+                    logger.info('Attempting connection to {}'.format(device['ip']))
+                    connect = ConnectHandler(**device)
+                    if PIPELINE > 1:
+                        connect = PipelinedSession(connect, PIPELINE)
+
+            # the sessions are closed whether or not the run completes
+            try:
+
+                # split rows into ACE equivalence classes before any testlet is built
+                if MINIMIZE:
+                    test_control.minimize(connect)
+
+                # results are spooled to disk as they finish and read back while rendering
+                # completed results are journaled so an interrupted run can be resumed with -z
+                with ResultSpool() as spool, \
+                        ResultJournal('{}/tests/journal.jsonl'.format(script_dir), RESUME) as journal:
+                    results = test_control.execute(testset, connect, spool, writers, HOST, journal)
+
+                    report = GenerateReport(results, script_dir, generated, REPORTNAME,
+                                            report_format=REPORT_FORMAT)
+                    report.gen_report()
+                    report.cli_stats()
+                    report.gen_timing()
+
+            finally:
+                connect.disconnect()
 
     except Exception:
         logger.error('{}: {}'.format(sys.exc_info()[0], sys.exc_info()[1:]))
+
+    finally:
+        for writer in writers:
+            writer.close()
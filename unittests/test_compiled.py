@@ -0,0 +1,64 @@
+'''
+Test the compiled testset reads back the testlets it was built with.
+'''
+
+import os
+import sys
+import tempfile
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes import testcontrol
+from classes.compiled import CompiledTestset
+from classes.suite import TestSuite as Suite
+from classes.minimize import RuleClasses
+
+SUITE = '''
+INSIDE:
+  - {protocol: tcp, icmp_type: , icmp_code: , source_ip: 192.168.1.0/30, source_port: 12345,
+     destination_ip: 10.1.1.1, destination_port: [80, 443], expected_result: allow}
+  - {protocol: icmp, icmp_type: 8, icmp_code: 0, source_ip: 192.168.1.5, source_port: ,
+     destination_ip: 10.1.2.7, destination_port: , expected_result: drop}
+'''
+
+
+def _testset(directory, compiled=True, rule_classes=None):
+    suite = Suite(os.path.join(directory, 'suite.yml'))
+    testset = CompiledTestset(os.path.join(directory, 'suite.testset'), suite) if compiled else None
+    if testset != None:
+        testset.load()
+    test_control = testcontrol.TestControl(directory, suite, compiled=testset)
+    test_control.rule_classes = rule_classes
+    return testset, [testlet.to_dict() for testlet in test_control.iter_testset()]
+
+
+def test_compiled_testlets_match_the_suite():
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, 'suite.yml'), 'w') as f:
+        f.write(SUITE)
+
+    _, expected = _testset(directory, compiled=False)
+    built, testlets = _testset(directory)
+    assert not built.loaded
+    assert testlets == expected
+
+    loaded, testlets = _testset(directory)
+    assert loaded.loaded
+    assert testlets == expected
+
+    # plain JSON lines, the offset of the file hashes first
+    with open(os.path.join(directory, 'suite.testset'), 'rb') as f:
+        assert f.readline().strip().isdigit()
+
+
+def test_unused_compiled_testset_is_closed():
+    directory = tempfile.mkdtemp()
+    with open(os.path.join(directory, 'suite.yml'), 'w') as f:
+        f.write(SUITE)
+    _testset(directory)
+
+    # minimized testlets are never read from the compiled testset
+    loaded, _ = _testset(directory, rule_classes=RuleClasses(''))
+    assert loaded.loaded
+    assert loaded.reader is None
@@ -0,0 +1,111 @@
+'''
+Test security context suites and their names in file names.
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes.contexts import ContextControl
+from classes.suite import TestSuite as Suite
+
+OUTPUT = '''Phase: 1
+Type: ACCESS-LIST
+Result: ALLOW
+
+Result:
+input-interface: INSIDE
+input-status: up
+input-line-status: up
+output-interface: OUTSIDE
+output-status: up
+output-line-status: up
+Action: allow
+
+'''
+
+
+class FixedSession(object):
+
+    def send_command(self, command):
+        return OUTPUT
+
+    def disconnect(self):
+        pass
+
+
+class FixedContexts(ContextControl):
+
+    '''
+    Every context answers with the same allowed packet-tracer output, no ASA required.
+    '''
+
+    def _connect(self, name):
+        return FixedSession()
+
+
+ROW = '''  - protocol: tcp
+    icmp_type:
+    icmp_code:
+    source_ip: 192.168.1.5
+    source_port: 1234
+    destination_ip: {}
+    destination_port: 443
+    expected_result: drop
+'''
+
+
+def _suite(directory, *names):
+    '''
+    Writes a suite with a document for each name, every context has one row of its own destination.
+    '''
+
+    path = os.path.join(directory, 'suite.yml')
+    with open(path, 'w') as f:
+        f.write('---\n'.join('context: "{}"\nINSIDE:\n{}'.format(name, ROW.format('10.1.1.{}'.format(number)))
+                             for number, name in enumerate(names, 1)))
+    return Suite(path).contexts()
+
+
+def test_context_name_in_file_names():
+    workdir = tempfile.mkdtemp()
+    try:
+        os.symlink(os.path.join(script_dir, 'templates_textfsm'), os.path.join(workdir, 'templates_textfsm'))
+        os.mkdir(os.path.join(workdir, 'tests'))
+
+        chassis = FixedContexts(workdir, _suite(workdir, '../admin ctx'), {'ip': '192.0.2.1'})
+        results = chassis.execute()
+
+        assert results['../admin ctx']['full_stats']['fail'] == 1
+        # the journal is removed once the context completes
+        assert os.listdir(os.path.join(workdir, 'tests')) == ['retry_.._admin_ctx.yml']
+        assert sorted(os.listdir(workdir)) == ['suite.yml', 'templates_textfsm', 'tests']
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_context_file_name_clash():
+    workdir = tempfile.mkdtemp()
+    try:
+        with pytest.raises(ValueError):
+            ContextControl(script_dir, _suite(workdir, 'admin ctx', 'admin_ctx'), {'ip': '192.0.2.1'})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_contexts_stream_their_own_documents():
+    workdir = tempfile.mkdtemp()
+    try:
+        contexts = _suite(workdir, 'admin', 'web', 'admin')
+
+        assert list(contexts) == ['admin', 'web']
+        rows = [[row['destination_ip'] for interface, rows in suite.items() for row in rows]
+                for suite in contexts.values()]
+        assert rows == [['10.1.1.1', '10.1.1.3'], ['10.1.1.2']]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,71 @@
+'''
+Test execute grades testlets whose output carries no packet-tracer result instead of stopping the run.
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes import testcontrol
+from classes.offline import RunningConfig, OfflineASA
+
+
+class FixedOutput(object):
+
+    '''
+    Stands in for a netmiko session that answers every command with the same output.
+    '''
+
+    def __init__(self, output):
+        self.output = output
+
+    def send_command(self, command):
+        return self.output
+
+
+def _row(source_ip, destination_ip):
+    return {'protocol': 'tcp', 'icmp_type': None, 'icmp_code': None, 'source_ip': source_ip,
+            'source_port': 1234, 'destination_ip': destination_ip, 'destination_port': 443,
+            'expected_result': 'allow'}
+
+
+def _execute(context, connect):
+    '''
+    Runs in a throwaway script directory, the retry file lands in its tests/.
+    '''
+
+    workdir = tempfile.mkdtemp()
+    try:
+        os.symlink(os.path.join(script_dir, 'templates_textfsm'), os.path.join(workdir, 'templates_textfsm'))
+        os.mkdir(os.path.join(workdir, 'tests'))
+        test_control = testcontrol.TestControl(workdir, context)
+        return test_control.execute(test_control.iter_testset(), connect)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_unparsed_output_fails_the_testlet():
+    results = _execute({'INSIDE': [_row('192.168.1.5', '10.1.1.1')]},
+                       FixedOutput("ERROR: % Invalid input detected at '^' marker.\n"))
+
+    assert results['full_stats']['fail'] == 1
+    row = results['INSIDE']['should_allow'][0]
+    assert row['grade'] == '[FAIL]'
+    assert row['drop_reason'].startswith('(unparsed)')
+
+
+def test_offline_ipv6_testlet_is_graded():
+    with open(os.path.join(script_dir, 'benchmarks', 'running-config.txt'), 'r') as f:
+        asa = OfflineASA(RunningConfig(f.read()))
+
+    results = _execute({'INSIDE': [_row('2001:db8::1', '2001:db8::2'), _row('192.168.1.5', '10.1.1.1')]}, asa)
+
+    assert results['full_stats']['total'] == 2
+    assert results['full_stats']['pass'] == 1
+    assert results['full_stats']['fail'] == 1
+    assert asa.trace('packet-tracer input INSIDE tcp 2001:db8::1 1234 2001:db8::2 443 detail')['drop_reason'] \
+        .startswith('(unsupported)')
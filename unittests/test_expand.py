@@ -0,0 +1,41 @@
+'''
+Test prefixes and port ranges are sized without being expanded, so oversized rows are skipped.
+'''
+
+import os
+import sys
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes import testcontrol
+from classes.expand import Expansion, PortRange, PrefixHosts, ParsePrefix
+
+
+def _row(source_ip, destination_ip, destination_port):
+    return {'protocol': 'tcp', 'icmp_type': None, 'icmp_code': None, 'source_ip': source_ip,
+            'source_port': 1234, 'destination_ip': destination_ip, 'destination_port': destination_port,
+            'expected_result': 'allow'}
+
+
+def test_size():
+    assert PrefixHosts(ParsePrefix('10.1.0.0/28')).size() == 14
+    assert PrefixHosts(ParsePrefix('10.1.0.0/31')).size() == 2
+    assert PortRange(8000, 8100).size() == 101
+    assert PortRange(8100, 8000).size() == 1
+    assert Expansion([{'result': True, 'ip_address': '10.0.0.1'}, PrefixHosts(ParsePrefix('10.1.0.0/30'))]).size() == 3
+
+    # more hosts than len() can return
+    assert PrefixHosts(ParsePrefix('2001:db8::/64')).size() == 2 ** 64 - 2
+
+
+def test_ipv6_64_row_is_skipped():
+    test_control = testcontrol.TestControl(script_dir, {'INSIDE': [
+        _row('2001:db8::/64', '2001:db8:1::1', 443),
+        _row('10.1.0.0/30', '10.2.0.1', '8000-8001')]})
+
+    testlets = list(test_control.iter_testset())
+
+    # only the IPv4 row, two sources by two ports
+    assert len(testlets) == 4
+    assert set(testlet['source_ip'] for testlet in testlets) == set(['10.1.0.1', '10.1.0.2'])
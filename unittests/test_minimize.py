@@ -0,0 +1,59 @@
+'''
+Test minimization against "show access-list" output.
+'''
+
+import os
+import sys
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes import testcontrol
+from classes.minimize import RuleClasses
+from classes.offline import RunningConfig, OfflineASA
+
+
+class FixedOutput(object):
+
+    '''
+    Stands in for a netmiko session that answers every command with the same output.
+    '''
+
+    def __init__(self, output):
+        self.output = output
+
+    def send_command(self, command):
+        return self.output
+
+
+def _offline_asa():
+    with open(os.path.join(script_dir, 'benchmarks', 'running-config.txt'), 'r') as f:
+        return OfflineASA(RunningConfig(f.read()))
+
+
+def test_error_output_turns_minimization_off():
+    test_control = testcontrol.TestControl(script_dir, {})
+    test_control.minimize(FixedOutput("ERROR: % Invalid input detected at '^' marker.\n"))
+    assert test_control.rule_classes is None
+
+
+def test_no_aces_turns_minimization_off():
+    test_control = testcontrol.TestControl(script_dir, {})
+    test_control.minimize(FixedOutput('access-list cached ACL log flows: total 0, denied 0 (deny-flow-max 4096)\n'))
+    assert test_control.rule_classes is None
+
+    test_control.minimize(FixedOutput(''))
+    assert test_control.rule_classes is None
+
+
+def test_aces_turn_minimization_on():
+    test_control = testcontrol.TestControl(script_dir, {})
+    test_control.minimize(_offline_asa())
+    assert test_control.rule_classes is not None
+    assert test_control.rule_classes.entries > 0
+
+
+def test_ports_either_side_of_an_ace_are_separate_classes():
+    rule_classes = RuleClasses(_offline_asa().show_access_list())
+    classes = rule_classes.classify('destination_port', [80, 81])
+    assert classes[0][0] != classes[1][0]
@@ -0,0 +1,165 @@
+'''
+Test the offline evaluation of packet-tracer flows against a running-config.
+'''
+
+import os
+import sys
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes.offline import RunningConfig, OfflineASA, IPToInt
+
+CONFIG = '''
+interface GigabitEthernet0/0
+ nameif OUTSIDE
+ security-level 0
+ ip address 203.0.113.2 255.255.255.0
+!
+interface GigabitEthernet0/1
+ nameif INSIDE
+ security-level 100
+ ip address 192.168.1.254 255.255.255.0
+!
+interface GigabitEthernet0/2
+ nameif DMZ
+ security-level 50
+ ip address 172.16.1.254 255.255.255.0
+!
+object network WEB01
+ host 172.16.1.10
+ nat (DMZ,OUTSIDE) static 203.0.113.10
+object network INSIDE_NET
+ subnet 192.168.1.0 255.255.255.0
+ nat (INSIDE,OUTSIDE) dynamic interface
+object network PC_STATIC
+ host 192.168.1.50
+ nat (INSIDE,OUTSIDE) static 203.0.113.50
+object network PC_MANUAL
+ host 192.168.1.60
+object network PC_MANUAL_MAPPED
+ host 203.0.113.60
+object network PC_AFTER
+ host 192.168.1.70
+object network PC_AFTER_MAPPED
+ host 203.0.113.70
+object network DMZ_HOST
+ host 172.16.1.20
+ nat (any,OUTSIDE) dynamic interface
+object network APP_STATIC
+ host 192.168.1.80
+ nat (INSIDE,any) static 203.0.113.80
+object-group network APP_SERVERS
+ network-object host 10.1.1.1
+ network-object 10.1.2.0 255.255.255.0
+ network-object object WEB01
+object-group service WEB_PORTS tcp
+ port-object eq www
+ port-object range 8000 8100
+object-group service MGMT
+ service-object tcp destination eq ssh
+ service-object icmp echo
+access-list INSIDE_access_in extended deny tcp any host 10.1.1.1 eq 8080
+access-list INSIDE_access_in extended permit tcp object INSIDE_NET object-group APP_SERVERS object-group WEB_PORTS
+access-list INSIDE_access_in extended permit object-group MGMT host 192.168.1.10 any
+access-list INSIDE_access_in extended permit tcp any any eq 9999 inactive
+access-list INSIDE_access_in extended permit tcp any host 203.0.113.99 eq https
+access-list OUTSIDE_access_in extended permit tcp any object WEB01 eq https
+access-list OUTSIDE_access_in extended permit tcp any host 192.168.1.80 eq https
+nat (INSIDE,OUTSIDE) source static PC_MANUAL PC_MANUAL_MAPPED
+nat (INSIDE,OUTSIDE) after-auto source static PC_AFTER PC_AFTER_MAPPED
+access-group INSIDE_access_in in interface INSIDE
+access-group OUTSIDE_access_in in interface OUTSIDE
+route OUTSIDE 0.0.0.0 0.0.0.0 203.0.113.1 1
+route INSIDE 10.1.0.0 255.255.0.0 192.168.1.1 1
+route DMZ 10.1.2.0 255.255.255.0 172.16.1.1 1
+'''
+
+
+def _asa():
+    return OfflineASA(RunningConfig(CONFIG))
+
+
+def test_acl_object_group_addresses_and_ports():
+    asa = _asa()
+    for destination, port in (('10.1.1.1', 80), ('10.1.2.7', 8050), ('172.16.1.10', 8100)):
+        assert asa.evaluate('INSIDE', 'tcp', '192.168.1.5', 1234, destination, port)['asa_action'] == 'allow'
+
+    # just outside the port range and outside the groups
+    assert asa.evaluate('INSIDE', 'tcp', '192.168.1.5', 1234, '10.1.2.7', 8101)['asa_action'] == 'drop'
+    assert asa.evaluate('INSIDE', 'tcp', '192.168.1.5', 1234, '10.1.3.7', 80)['asa_action'] == 'drop'
+
+
+def test_acl_first_match_inactive_and_implicit_deny():
+    asa = _asa()
+
+    # the deny comes before the group permit covering 8080
+    result = asa.evaluate('INSIDE', 'tcp', '192.168.1.5', 1234, '10.1.1.1', 8080)
+    assert result['asa_action'] == 'drop'
+    assert result['drop_reason'].startswith('(acl-drop)')
+
+    # an inactive ACE never matches
+    assert asa.evaluate('INSIDE', 'tcp', '192.168.1.5', 1234, '10.1.5.5', 9999)['asa_action'] == 'drop'
+
+    # a service object-group as the protocol
+    assert asa.evaluate('INSIDE', 'tcp', '192.168.1.10', 1234, '10.1.5.5', 22)['asa_action'] == 'allow'
+    assert asa.evaluate('INSIDE', 'icmp', '192.168.1.10', 8, '10.1.5.5', 0)['asa_action'] == 'allow'
+    assert asa.evaluate('INSIDE', 'icmp', '192.168.1.10', 0, '10.1.5.5', 0)['asa_action'] == 'drop'
+
+
+def test_object_nat_in_the_same_block_as_its_host():
+    asa = _asa()
+    result = asa.evaluate('OUTSIDE', 'tcp', '8.8.8.8', 1234, '203.0.113.10', 443)
+    assert result['asa_action'] == 'allow'
+    assert result['output_interface'] == 'DMZ'
+    assert result['nat_to'] == '172.16.1.10/443'
+
+
+def test_nat_order():
+    asa = _asa()
+
+    def _mapped(source):
+        return asa.evaluate('INSIDE', 'tcp', source, 1234, '203.0.113.99', 443)['nat_to']
+
+    # object NAT, static before dynamic whatever the prefix
+    assert _mapped('192.168.1.5') == '203.0.113.2/1234'
+    assert _mapped('192.168.1.50') == '203.0.113.50/1234'
+
+    # twice NAT comes before object NAT, after-auto twice NAT after it
+    assert _mapped('192.168.1.60') == '203.0.113.60/1234'
+    assert _mapped('192.168.1.70') == '203.0.113.2/1234'
+
+
+def test_nat_any_interface():
+    asa = _asa()
+
+    # any real interface, source translation from the DMZ
+    result = asa.evaluate('DMZ', 'tcp', '172.16.1.20', 1234, '8.8.8.8', 443)
+    assert result['asa_action'] == 'allow'
+    assert result['nat_to'] == '203.0.113.2/1234'
+
+    # any mapped interface, the destination is un-NATed on its way in from OUTSIDE
+    result = asa.evaluate('OUTSIDE', 'tcp', '8.8.8.8', 1234, '203.0.113.80', 443)
+    assert result['asa_action'] == 'allow'
+    assert result['output_interface'] == 'INSIDE'
+    assert result['nat_to'] == '192.168.1.80/443'
+
+
+def test_route_lookup():
+    config = RunningConfig(CONFIG)
+    assert config.routes.lookup(IPToInt('10.1.2.7')) == 'DMZ'
+    assert config.routes.lookup(IPToInt('10.1.3.7')) == 'INSIDE'
+    assert config.routes.lookup(IPToInt('192.168.1.9')) == 'INSIDE'
+    assert config.routes.lookup(IPToInt('8.8.8.8')) == 'OUTSIDE'
+
+    result = _asa().evaluate('INSIDE', 'tcp', '192.168.1.5', 1234, '10.1.2.7', 80)
+    assert result['output_interface'] == 'DMZ'
+
+
+def test_no_route_and_unknown_interface():
+    config = RunningConfig(CONFIG.replace('route OUTSIDE 0.0.0.0 0.0.0.0 203.0.113.1 1\n', ''))
+    result = OfflineASA(config).evaluate('INSIDE', 'tcp', '192.168.1.5', 1234, '8.8.8.8', 80)
+    assert result['drop_reason'].startswith('(no-route)')
+
+    result = _asa().evaluate('NOPE', 'tcp', '192.168.1.5', 1234, '8.8.8.8', 80)
+    assert result['drop_reason'].startswith('(ifc-unknown)')
@@ -0,0 +1,98 @@
+'''
+Test the streaming JSON lines, CSV and JUnit result writers.
+'''
+
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import xml.etree.ElementTree as ElementTree
+import pytest
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes.outputs import ResultWriter, JsonLinesWriter, CsvWriter, JUnitWriter
+
+GRADES = ['[PASS]'] * 9 + ['[FAIL]'] * 2 + ['[SKIP]']
+
+
+def _row(index, grade):
+    return {
+        'command': 'packet-tracer input INSIDE tcp 10.0.0.{} 1234 10.1.1.1 443 detail'.format(index),
+        'index': index, 'interface': 'INSIDE', 'protocol': 'tcp', 'source_ip': '10.0.0.{}'.format(index),
+        'source_port': 1234, 'icmp_type': '', 'icmp_code': '', 'output_interface': 'OUTSIDE',
+        'destination_ip': '10.1.1.1', 'destination_port': 443, 'expected_result': 'allow',
+        'asa_action': 'drop' if grade == '[FAIL]' else 'allow', 'drop_reason': '<acl-drop> & more',
+        'nat_from': '', 'nat_to': '', 'nat_rule': '', 'yaml_row': {'source_ip': '10.0.0.0/28'},
+        'grade': grade, 'inferred': ''}
+
+
+@pytest.fixture
+def directory():
+    path = tempfile.mkdtemp()
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _write(writer_class, path):
+    with writer_class(path) as writer:
+        for index, grade in enumerate(GRADES):
+            writer.write(_row(index, grade), 'should_allow', host='asa1')
+    return writer
+
+
+def test_base_class_is_abstract(directory):
+    with pytest.raises(TypeError):
+        ResultWriter(os.path.join(directory, 'out'))
+
+
+def test_jsonl(directory):
+    path = os.path.join(directory, 'results.jsonl')
+    assert _write(JsonLinesWriter, path).records == len(GRADES)
+
+    with open(path, 'r') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['grade'] for record in records] == GRADES
+    assert records[0]['host'] == 'asa1' and records[0]['expected'] == 'should_allow'
+    assert records[0]['yaml_row'] == {'source_ip': '10.0.0.0/28'}
+    assert set(records[0]) == set(ResultWriter.COLUMNS)
+
+
+def test_csv(directory):
+    path = os.path.join(directory, 'results.csv')
+    _write(CsvWriter, path)
+
+    with open(path, 'r', newline='') as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == ResultWriter.COLUMNS
+    assert len(rows) == len(GRADES) + 1
+
+    record = dict(zip(rows[0], rows[1]))
+    assert record['command'] == _row(0, '[PASS]')['command']
+    assert json.loads(record['yaml_row']) == {'source_ip': '10.0.0.0/28'}
+
+
+def test_junit_counts_rewritten_in_place(directory):
+    path = os.path.join(directory, 'results.xml')
+    _write(JUnitWriter, path)
+
+    with open(path, 'r') as f:
+        lines = f.read().split('\n')
+    # the testsuite line keeps its length when the counts are rewritten, twelve tests needs a second digit
+    with JUnitWriter(os.path.join(directory, 'empty.xml')) as empty:
+        assert len(lines[2]) == len(empty._testsuite())
+
+    suite = ElementTree.parse(path).getroot().find('testsuite')
+    assert suite.get('tests') == '12'
+    assert suite.get('failures') == '2'
+    assert suite.get('skipped') == '1'
+
+    testcases = suite.findall('testcase')
+    assert len(testcases) == len(GRADES)
+    assert testcases[0].get('classname') == 'asa1.INSIDE.should_allow'
+    assert testcases[9].find('failure').get('message') == 'expected allow, ASA reports drop'
+    assert '<acl-drop> & more' in testcases[9].find('failure').text
+    assert testcases[11].find('skipped') is not None
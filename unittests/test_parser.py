@@ -0,0 +1,82 @@
+'''
+Test the native packet-tracer parser returns the same results as the TextFSM template.
+'''
+
+import os
+import sys
+import threading
+import pytest
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes.parser import TextFSMParser, PacketTracerParser
+from classes.structuredata import ASAPolicyTest
+from benchmarks.bench_parser import LoadCorpus, GenerateCorpus
+
+TEMPLATE = '{}/templates_textfsm/asa_packet_tracer'.format(script_dir)
+CORPUS = LoadCorpus()
+
+
+def _parsers_agree(cli_output):
+    return TextFSMParser(cli_output, TEMPLATE).Parser() == PacketTracerParser(cli_output).Parser()
+
+
+@pytest.mark.parametrize('filename', sorted(CORPUS))
+def test_corpus_output(filename):
+    cli_output = CORPUS[filename]
+    assert _parsers_agree(cli_output)
+    assert ASAPolicyTest(script_dir, cli_output).TestResult() == \
+        ASAPolicyTest(script_dir, cli_output, 'native').TestResult()
+
+
+@pytest.mark.parametrize('filename', sorted(CORPUS))
+def test_truncated_corpus_output(filename):
+    '''
+    A session that drops part way hands back a partial output, cut after every character.
+    '''
+
+    cli_output = CORPUS[filename]
+    mismatched = [length for length in range(len(cli_output)) if not _parsers_agree(cli_output[:length])]
+    assert mismatched == []
+
+
+def test_generated_outputs():
+    mismatched = [cli_output for cli_output in GenerateCorpus(300) if not _parsers_agree(cli_output)]
+    assert mismatched == []
+
+
+def test_native_stops_after_the_action_block():
+    '''
+    The native parser stops at the blank line after Action, the template reads to the end of the output,
+    so text after the Result block only reaches the TextFSM results.
+    '''
+
+    cli_output = ('Phase: 1\nType: ACCESS-LIST\nResult: ALLOW\n\nResult:\ninput-interface: INSIDE\n'
+                  'Action: allow\n\nOffline translate 10.0.0.1/80 to 192.0.2.1/80\n')
+
+    assert TextFSMParser(cli_output, TEMPLATE).Parser()['results'][0][:2] == ['10.0.0.1/80', '192.0.2.1/80']
+    assert PacketTracerParser(cli_output).Parser()['results'][0][:2] == ['', '']
+
+
+def test_threads_parse_concurrently():
+    '''
+    Every thread has its own TextFSM instance, interleaved parses keep their own state.
+    '''
+
+    expected = dict((filename, TextFSMParser(cli_output, TEMPLATE).Parser()) for filename, cli_output in CORPUS.items())
+    failures = []
+
+    def _parse():
+        for _ in range(50):
+            for filename, cli_output in CORPUS.items():
+                if TextFSMParser(cli_output, TEMPLATE).Parser() != expected[filename]:
+                    failures.append(filename)
+
+    threads = [threading.Thread(target=_parse) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
@@ -0,0 +1,67 @@
+'''
+Test the compact report encoding decodes back to the rows and keeps its value tables bounded.
+'''
+
+import json
+import os
+import sys
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes.report import CompactRows
+
+
+def _context(count):
+    yaml_row = {'source_ip': '10.0.0.0/24', 'destination_ip': '10.1.1.1', 'destination_port': 443}
+    rows = []
+    for index in range(count):
+        rows.append({
+            'command': 'packet-tracer input INSIDE tcp 10.0.0.{} 1234 10.1.1.1 443 detail'.format(index),
+            'index': index, 'interface': 'INSIDE', 'protocol': 'tcp', 'source_ip': '10.0.0.{}'.format(index),
+            'source_port': 1234, 'icmp_type': '', 'icmp_code': '', 'output_interface': 'OUTSIDE',
+            'destination_ip': '10.1.1.1', 'destination_port': 443, 'expected_result': 'allow',
+            'asa_action': 'allow', 'drop_reason': None, 'nat_from': '', 'nat_to': '', 'nat_rule': '',
+            'yaml_row': yaml_row, 'grade': '[PASS]' if index % 2 else '[FAIL]', 'inferred': ''})
+    return {'INSIDE': {'should_allow': rows, 'interface_stats': {'total': count, 'pass': 0, 'fail': 0, 'skip': 0}}}
+
+
+def _decode(report):
+    '''
+    The same lookup as value() in report_compact.j2.
+    '''
+
+    rows = json.loads('[{}]'.format(''.join(report.rows())))
+    data = json.loads(str(report.values()))
+    decoded = []
+    for row in rows:
+        values = {}
+        for position, column in enumerate(data['columns']):
+            code = row[position]
+            values[column] = code if column == 'index' or isinstance(code, str) else data['values'][position][code]
+        decoded.append(values)
+    return decoded
+
+
+def test_rows_decode():
+    context = _context(50)
+    decoded = _decode(CompactRows(context))
+    original = context['INSIDE']['should_allow']
+
+    assert len(decoded) == 50
+    for row, expected in zip(decoded, original):
+        assert row['command'] == expected['command']
+        assert row['grade'] == expected['grade']
+        assert row['group'] == 'INSIDE' and row['section'] == 'should_allow'
+        assert row['yaml_row'] == str(expected['yaml_row'])
+
+
+def test_value_tables_are_bounded():
+    context = _context(200)
+    report = CompactRows(context, max_values=16)
+    decoded = _decode(report)
+
+    # every column table stops at max_values, the unique commands past it are written into their rows
+    assert max(len(codes) for codes in report.codes) == 16
+    assert [row['command'] for row in decoded] == [row['command'] for row in context['INSIDE']['should_allow']]
+    assert [row['source_ip'] for row in decoded] == [row['source_ip'] for row in context['INSIDE']['should_allow']]
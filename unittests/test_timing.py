@@ -0,0 +1,38 @@
+'''
+Test latency percentiles are interpolated from the histogram buckets.
+'''
+
+import os
+import sys
+
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, script_dir)
+
+from classes.timing import LatencyHistogram
+
+
+def test_percentiles_inside_one_bucket():
+    histogram = LatencyHistogram()
+
+    # 10.0 to 10.3 ms, all in the same bucket
+    for sample in range(100):
+        histogram.add(0.010 + sample * 0.000003)
+
+    p50, p95, p99 = histogram.percentile(50), histogram.percentile(95), histogram.percentile(99)
+    assert histogram.min < p50 < p95 < p99 < histogram.max
+    assert abs(p50 - 0.01015) / 0.01015 < 0.01
+
+
+def test_percentiles_across_buckets():
+    histogram = LatencyHistogram()
+    samples = [0.001 * (sample + 1) for sample in range(1000)]
+    for sample in samples:
+        histogram.add(sample)
+
+    for percent in (50, 95, 99):
+        expected = samples[int(percent / 100.0 * len(samples)) - 1]
+        assert abs(histogram.percentile(percent) - expected) / expected < 0.05
+
+    assert histogram.percentile(0) == histogram.min
+    assert histogram.percentile(100) == histogram.max
+    assert LatencyHistogram().percentile(50) is None